@@ -1,10 +1,54 @@
-from flask import Flask, request, jsonify
-import sys
-from model import get_recommendations, get_all_users
+from flask import Flask, Response, g, request, jsonify
+import time
+import threading
+from model import (
+    search_users, get_recommendation_system, engine_reloader, ingest_reviews, is_engine_loaded,
+    review_ingest_log
+)
+import json
+import os
+import http.client
+from urllib.parse import urlencode
+from sharding import create_shard_router, FORWARDED_REQUEST_HEADERS, FORWARDED_RESPONSE_HEADERS
+from recommendation_cache import (
+    create_recommendation_cache, SingleFlight, PrecomputedResponses, response_etag
+)
+from text_preprocessing import TextCleanerUnavailable
+from observability import metrics_registry, log_sampled, log_error
 
 # Initialize Flask web application
 web_app = Flask(__name__)
 
+USERNAME_PAGE_SIZE = 50
+MAX_USERNAME_PAGE_SIZE = 200
+MAX_BATCH_USERS = int(os.environ.get('RECOMMENDER_MAX_BATCH_USERS', '1000'))
+DEFAULT_RECOMMENDATION_COUNT = 5
+PERSONALIZED_SOURCE = 'personalized'
+FALLBACK_SOURCE = 'popular_fallback'
+
+# Shared result cache for /recommend; None when RECOMMENDER_CACHE_BACKEND=none
+recommendation_cache = create_recommendation_cache()
+
+# Router mode (RECOMMENDER_SHARD_URLS): this process loads no artifacts and forwards
+# each request to the shard processes that own its users
+shard_router = create_shard_router()
+
+# Identical concurrent /recommend requests share one computation and one serialization
+recommendation_flight = SingleFlight()
+# Ready-made /recommend bodies for this many of the most active users; 0 disables them
+PRECOMPUTED_USERS = int(os.environ.get('RECOMMENDER_PRECOMPUTED_USERS', '0'))
+PRECOMPUTED_REFRESH_SECONDS = float(os.environ.get('RECOMMENDER_PRECOMPUTED_REFRESH_SECONDS', '60'))
+
+# Load shedding for the engine-backed endpoints; 0 in-flight slots disables it
+MAX_IN_FLIGHT = int(os.environ.get('RECOMMENDER_MAX_IN_FLIGHT', '0'))
+MAX_QUEUED = int(os.environ.get('RECOMMENDER_MAX_QUEUED', '0'))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('RECOMMENDER_QUEUE_TIMEOUT_SECONDS', '1'))
+SHEDDABLE_ENDPOINTS = {
+    'handle_recommendation_request',
+    'handle_batch_recommendation_request',
+    'handle_username_request'
+}
+
 # Embedded HTML template
 HTML_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
@@ -263,17 +307,41 @@ HTML_TEMPLATE = """<!DOCTYPE html>
     
     <script>
         $(document).ready(function() {
-            // Initialize Select2 for searchable dropdown
+            // Initialize Select2 for searchable dropdown, querying the server as the user types
+            let nextUsernameCursor = null;
             $('#username-select').select2({
                 theme: 'bootstrap-5',
                 placeholder: '-- Search and select a username --',
                 allowClear: true,
-                width: '100%'
+                width: '100%',
+                ajax: {
+                    url: '/get_usernames',
+                    dataType: 'json',
+                    delay: 150,
+                    data: function(params) {
+                        return {
+                            q: params.term || '',
+                            limit: 50,
+                            cursor: (params.page || 1) > 1 && nextUsernameCursor !== null ? nextUsernameCursor : 0
+                        };
+                    },
+                    processResults: function(response) {
+                        if (!response.success) {
+                            showAlert('danger', 'Error loading usernames: ' + response.error);
+                            return { results: [] };
+                        }
+                        
+                        nextUsernameCursor = response.next_cursor;
+                        return {
+                            results: response.usernames.map(function(username) {
+                                return { id: username, text: username };
+                            }),
+                            pagination: { more: response.next_cursor !== null }
+                        };
+                    }
+                }
             });
             
-            // Load usernames on page load
-            loadUsernames();
-            
             // Recommend button click handler
             $('#recommend-btn').click(function() {
                 const username = $('#username-select').val();
@@ -293,30 +361,6 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 $('#alert-container').empty();
             });
             
-            // Load usernames function
-            function loadUsernames() {
-                $.ajax({
-                    url: '/get_usernames',
-                    method: 'GET',
-                    success: function(response) {
-                        if (response.success) {
-                            // Clear existing options except the first one
-                            $('#username-select').find('option:not(:first)').remove();
-                            
-                            // Add usernames to dropdown
-                            response.usernames.forEach(function(username) {
-                                $('#username-select').append(new Option(username, username));
-                            });
-                        } else {
-                            showAlert('danger', 'Error loading usernames: ' + response.error);
-                        }
-                    },
-                    error: function(xhr, status, error) {
-                        showAlert('danger', 'Failed to load usernames. Please refresh the page.');
-                    }
-                });
-            }
-            
             // Get recommendations function
             function getRecommendations(username) {
                 // Show loading spinner
@@ -334,6 +378,9 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                         
                         if (response.success && response.recommendations.length > 0) {
                             displayRecommendations(username, response.recommendations);
+                            if (response.recommendation_source === 'popular_fallback') {
+                                showAlert('info', 'No purchase history for this user yet, so these are popular, well-reviewed products rather than personalized picks.');
+                            }
                         } else {
                             showAlert('info', response.error || 'No recommendations found for this user.');
                         }
@@ -387,10 +434,27 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 class APIResponseHandler: 
     @staticmethod
     def success_response(data_payload):
-        return jsonify({
-            'success': True,
-            **data_payload
-        })
+        with metrics_registry.time_stage('json_serialization', path='api'):
+            return jsonify({
+                'success': True,
+                **data_payload
+            })
+    
+    @staticmethod
+    def success_body(data_payload):
+        # The serialized success envelope, for responses that are shared or stored as bytes
+        with metrics_registry.time_stage('json_serialization', path='api'):
+            return web_app.json.dumps({
+                'success': True,
+                **data_payload
+            }, separators=(',', ':')).encode('utf-8')
+    
+    @staticmethod
+    def conditional_response(body, etag):
+        # GET requests that send the ETag back in If-None-Match get an empty 304
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
     
     @staticmethod
     def error_response(error_details):
@@ -401,39 +465,411 @@ class APIResponseHandler:
 
 class UserRepository:
     @staticmethod
-    def retrieve_all_usernames():
+    def search_usernames(search_term=None, page_size=USERNAME_PAGE_SIZE, cursor=0):
         try:
-            username_collection = get_all_users()
-            return username_collection
+            return search_users(search_term, page_size, cursor)
         except Exception as retrieval_error:
-            print(f"Username retrieval failed: {retrieval_error}", file=sys.stderr)
-            return []
+            log_error('username_retrieval_failed', error=str(retrieval_error))
+            return [], None
 
 class RecommendationService:
     @staticmethod
-    def generate_for_user(target_username):
+    def generate_for_user(target_username, brand=None):
+        # Returns (recommendations, error message, recommendation source)
         if not target_username or target_username.strip() == '':
-            return None, "Username parameter is required"
+            return None, "Username parameter is required", None
         
         try:
-            print(f"\n{'='*50}")
-            print(f"Processing recommendation request")
-            print(f"Target User: {target_username}")
-            print(f"{'='*50}")
+            # Hold one engine for the whole request so a reload cannot split it
+            serving_engine = get_recommendation_system()
             
-            recommendation_results = get_recommendations(target_username)
+            if not serving_engine.is_known_user(target_username):
+                # New visitors get the precomputed popularity ranking, labelled as such
+                metrics_registry.increment('recommender_fallback_responses_total')
+                log_sampled('fallback_recommendations', username=target_username, brand=brand)
+                return serving_engine.build_fallback_set(
+                    DEFAULT_RECOMMENDATION_COUNT, brand
+                ), None, FALLBACK_SOURCE
             
-            print(f"Result: Generated {len(recommendation_results)} recommendations")
-            print(f"{'='*50}\n")
+            if recommendation_cache is None:
+                recommendation_results = serving_engine.build_recommendation_set(
+                    target_username, DEFAULT_RECOMMENDATION_COUNT
+                )
+            else:
+                recommendation_results = recommendation_cache.get_or_compute(
+                    target_username,
+                    DEFAULT_RECOMMENDATION_COUNT,
+                    serving_engine.model_version,
+                    lambda: serving_engine.build_recommendation_set(
+                        target_username, DEFAULT_RECOMMENDATION_COUNT
+                    )
+                )
             
-            return recommendation_results, None
+            log_sampled(
+                'recommendation_request',
+                username=target_username,
+                count=len(recommendation_results)
+            )
+            
+            return recommendation_results, None, PERSONALIZED_SOURCE
         
         except Exception as processing_error:
             error_message = f"Recommendation generation failed: {processing_error}"
-            print(error_message, file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-            return None, error_message
+            log_error('recommendation_request_failed', exc_info=True, username=target_username)
+            return None, error_message, None
+    
+    @staticmethod
+    def validate_batch(target_usernames, recommendation_count):
+        if not isinstance(target_usernames, list) or not target_usernames:
+            return "A non-empty 'usernames' list is required"
+        
+        if len(target_usernames) > MAX_BATCH_USERS:
+            return f"At most {MAX_BATCH_USERS} usernames can be requested at once"
+        
+        if not all(isinstance(username, str) and username.strip() for username in target_usernames):
+            return "Every username must be a non-empty string"
+        
+        # bool is an int subclass, so true/false would otherwise pass as 1 and 0
+        if (
+            not isinstance(recommendation_count, int)
+            or isinstance(recommendation_count, bool)
+            or recommendation_count < 1
+        ):
+            return "'top_n' must be a positive integer"
+        
+        return None
+    
+    @staticmethod
+    def read_batch_payload(request_payload):
+        # (usernames, top_n, None) from a valid /recommend/batch body, (None, None, error) otherwise
+        if not isinstance(request_payload, dict):
+            return None, None, "The body must be a JSON object with a 'usernames' list"
+        
+        target_usernames = request_payload.get('usernames')
+        recommendation_count = request_payload.get('top_n', 5)
+        validation_error = RecommendationService.validate_batch(target_usernames, recommendation_count)
+        if validation_error:
+            return None, None, validation_error
+        return target_usernames, recommendation_count, None
+    
+    @staticmethod
+    def generate_for_users(target_usernames, recommendation_count=5):
+        # Expects values already checked by read_batch_payload
+        try:
+            serving_engine = get_recommendation_system()
+            recommendation_sets = serving_engine.build_recommendation_sets(
+                target_usernames, recommendation_count
+            )
+            
+            fallback_users = [
+                username for username, recommendations in recommendation_sets.items()
+                if not recommendations and not serving_engine.is_known_user(username)
+            ]
+            if fallback_users:
+                fallback_set = serving_engine.build_fallback_set(recommendation_count)
+                for username in fallback_users:
+                    recommendation_sets[username] = fallback_set
+                metrics_registry.increment('recommender_fallback_responses_total', len(fallback_users))
+            
+            return recommendation_sets, None, fallback_users
+        
+        except Exception as processing_error:
+            error_message = f"Batch recommendation generation failed: {processing_error}"
+            log_error('batch_recommendation_failed', exc_info=True, user_count=len(target_usernames))
+            return None, error_message, None
+
+# Router mode handlers: /recommend goes to the user's shard, batches and username search fan out
+class ShardRoutingService:
+    @staticmethod
+    def forward_recommendation():
+        request_payload = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+        target_user = request_payload.get('username')
+        status, shard_headers, response_body = shard_router.request(
+            shard_router.shard_for(target_user or ''),
+            request.method,
+            request.full_path if request.query_string else request.path,
+            request.get_data(),
+            {header: request.headers[header] for header in FORWARDED_REQUEST_HEADERS if header in request.headers}
+        )
+        
+        routed_response = Response(response_body, status=status)
+        for header in FORWARDED_RESPONSE_HEADERS:
+            if header in shard_headers:
+                routed_response.headers[header] = shard_headers[header]
+        return routed_response
+    
+    @staticmethod
+    def forward_batch():
+        # Checked like the unsharded endpoint, so malformed bodies get the same JSON 400
+        target_usernames, recommendation_count, validation_error = RecommendationService.read_batch_payload(
+            request.get_json(silent=True)
+        )
+        if validation_error:
+            return APIResponseHandler.error_response(validation_error), 400
+        
+        shard_usernames = {}
+        for username in dict.fromkeys(target_usernames):
+            shard_usernames.setdefault(shard_router.shard_for(username), []).append(username)
+        shard_results = shard_router.map_shards([
+            (shard_index, 'POST', '/recommend/batch', {'usernames': usernames, 'top_n': recommendation_count})
+            for shard_index, usernames in shard_usernames.items()
+        ])
+        
+        recommendation_sets = {}
+        fallback_users = set()
+        for status, shard_payload in shard_results:
+            if not shard_payload or not shard_payload.get('success'):
+                shard_error = (shard_payload or {}).get('error', f'Shard answered with status {status}')
+                return APIResponseHandler.error_response(shard_error), (status if status >= 400 else 200)
+            recommendation_sets.update(shard_payload['recommendations'])
+            fallback_users.update(shard_payload['fallback_users'])
+        
+        recommendation_sets = {username: recommendation_sets[username] for username in dict.fromkeys(target_usernames)}
+        return APIResponseHandler.success_response({
+            'recommendations': recommendation_sets,
+            'fallback_users': [username for username in recommendation_sets if username in fallback_users],
+            'users_without_recommendations': [
+                username for username, recommendations in recommendation_sets.items()
+                if not recommendations
+            ]
+        })
+    
+    @staticmethod
+    def search_usernames():
+        # The cursor holds one position per shard, '.'-separated, with 'x' for finished shards
+        search_term = request.args.get('q', '').strip()
+        page_size = min(request.args.get('limit', USERNAME_PAGE_SIZE, type=int), MAX_USERNAME_PAGE_SIZE)
+        cursor = request.args.get('cursor', '0')
+        try:
+            shard_cursors = [0] * shard_router.shard_count if cursor == '0' else [
+                None if shard_cursor == 'x' else int(shard_cursor) for shard_cursor in cursor.split('.')
+            ]
+        except ValueError:
+            shard_cursors = []
+        if page_size < 1 or len(shard_cursors) != shard_router.shard_count:
+            return APIResponseHandler.error_response("'limit' must be positive and 'cursor' a cursor from this router")
+        
+        def search_call(shard_index, limit, shard_cursor):
+            search_query = urlencode({'q': search_term, 'limit': limit, 'cursor': shard_cursor})
+            return shard_index, 'GET', f'/get_usernames?{search_query}', None
+        
+        active_shards = [shard_index for shard_index, shard_cursor in enumerate(shard_cursors) if shard_cursor is not None]
+        shard_pages = {}
+        for shard_index, (status, shard_payload) in zip(active_shards, shard_router.map_shards([
+            search_call(shard_index, page_size, shard_cursors[shard_index]) for shard_index in active_shards
+        ])):
+            if not shard_payload or not shard_payload.get('success'):
+                return APIResponseHandler.error_response(f'Shard {shard_index} answered with status {status}')
+            shard_pages[shard_index] = shard_payload
+        
+        # Every shard page is sorted, so the merged page is the first page_size names overall
+        page_entries = sorted(
+            (username, shard_index)
+            for shard_index, shard_page in shard_pages.items()
+            for username in shard_page['usernames']
+        )[:page_size]
+        consumed_counts = {shard_index: 0 for shard_index in shard_pages}
+        for _, shard_index in page_entries:
+            consumed_counts[shard_index] += 1
+        
+        # A partly used shard page is asked for again with the used count, which yields its resume cursor
+        partly_used = [
+            shard_index for shard_index, consumed_count in consumed_counts.items()
+            if 0 < consumed_count < len(shard_pages[shard_index]['usernames'])
+        ]
+        for shard_index, (_, shard_payload) in zip(partly_used, shard_router.map_shards([
+            search_call(shard_index, consumed_counts[shard_index], shard_cursors[shard_index])
+            for shard_index in partly_used
+        ]) if partly_used else []):
+            shard_cursors[shard_index] = shard_payload['next_cursor']
+        for shard_index, consumed_count in consumed_counts.items():
+            if consumed_count == len(shard_pages[shard_index]['usernames']):
+                shard_cursors[shard_index] = shard_pages[shard_index]['next_cursor']
+        
+        next_cursor = None
+        if any(shard_cursor is not None for shard_cursor in shard_cursors):
+            next_cursor = '.'.join('x' if shard_cursor is None else str(shard_cursor) for shard_cursor in shard_cursors)
+        return APIResponseHandler.success_response({
+            'usernames': [username for username, _ in page_entries],
+            'next_cursor': next_cursor
+        })
+    
+    @staticmethod
+    def readiness():
+        # Ready once every shard is ready and serves the partition its position says it does
+        shard_results = shard_router.map_shards([
+            (shard_index, 'GET', '/readyz', None) for shard_index in range(shard_router.shard_count)
+        ])
+        shard_states = []
+        for shard_index, (status, shard_payload) in enumerate(shard_results):
+            shard_payload = shard_payload or {}
+            reported_shard = shard_payload.get('shard')
+            shard_states.append({
+                'status': shard_payload.get('status', 'unavailable') if status == 200 else 'loading',
+                'model_version': shard_payload.get('model_version'),
+                # A single unsharded bundle may sit behind a one-shard router
+                'partition_matches': reported_shard == {'index': shard_index, 'count': shard_router.shard_count}
+                or (reported_shard is None and shard_router.shard_count == 1)
+            })
+        
+        is_ready = all(
+            shard_state['status'] == 'ready' and shard_state['partition_matches'] for shard_state in shard_states
+        )
+        return jsonify({'status': 'ready' if is_ready else 'loading', 'shards': shard_states}), 200 if is_ready else 503
+    
+    @staticmethod
+    def reject_admin_request():
+        return APIResponseHandler.error_response('Send admin requests to each shard directly'), 404
+
+ROUTED_ENDPOINTS = {
+    'handle_recommendation_request': ShardRoutingService.forward_recommendation,
+    'handle_batch_recommendation_request': ShardRoutingService.forward_batch,
+    'handle_username_request': ShardRoutingService.search_usernames,
+    'handle_readiness_probe': ShardRoutingService.readiness,
+    'handle_reload_request': ShardRoutingService.reject_admin_request,
+    'handle_review_ingestion_request': ShardRoutingService.reject_admin_request
+}
+
+# Bounded admission per process: a fixed number of requests run, a bounded number
+# wait up to QUEUE_TIMEOUT_SECONDS for a slot, and everything else gets a 503 at once
+class RequestAdmission:
+    def __init__(self, max_in_flight, max_queued, queue_timeout_seconds):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+    
+    def try_acquire(self):
+        admitted = self._slots.acquire(blocking=False)
+        if not admitted:
+            with self._lock:
+                if self.queued >= self.max_queued:
+                    self.shed += 1
+                    return False
+                self.queued += 1
+            try:
+                admitted = self._slots.acquire(timeout=self.queue_timeout_seconds)
+            finally:
+                with self._lock:
+                    self.queued -= 1
+        
+        with self._lock:
+            if admitted:
+                self.in_flight += 1
+            else:
+                self.shed += 1
+        return admitted
+    
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+    
+    def stats(self):
+        return {
+            'recommender_requests_in_flight': self.in_flight,
+            'recommender_requests_queued': self.queued,
+            'recommender_requests_shed_total': self.shed
+        }
+
+request_admission = (
+    RequestAdmission(MAX_IN_FLIGHT, MAX_QUEUED, QUEUE_TIMEOUT_SECONDS) if MAX_IN_FLIGHT > 0 else None
+)
+
+precomputed_responses = PrecomputedResponses(
+    PRECOMPUTED_USERS,
+    DEFAULT_RECOMMENDATION_COUNT,
+    lambda recommendations: APIResponseHandler.success_body({
+        'recommendations': recommendations,
+        'recommendation_source': PERSONALIZED_SOURCE
+    }),
+    PRECOMPUTED_REFRESH_SECONDS
+) if PRECOMPUTED_USERS > 0 else None
+
+# Request instrumentation
+@web_app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+@web_app.before_request
+def admit_request():
+    if request_admission is None or request.endpoint not in SHEDDABLE_ENDPOINTS:
+        return None
+    if not request_admission.try_acquire():
+        overloaded_response = APIResponseHandler.error_response('Server is overloaded, retry shortly')
+        overloaded_response.status_code = 503
+        overloaded_response.headers['Retry-After'] = '1'
+        return overloaded_response
+    g.request_admitted = True
+    return None
+
+@web_app.before_request
+def route_to_shards():
+    # Runs after admission, so the router sheds load the same way an engine process does
+    if shard_router is None or request.endpoint not in ROUTED_ENDPOINTS:
+        return None
+    try:
+        return ROUTED_ENDPOINTS[request.endpoint]()
+    except (OSError, http.client.HTTPException) as shard_error:
+        log_error('shard_request_failed', endpoint=request.endpoint, error=str(shard_error))
+        unavailable_response = APIResponseHandler.error_response('A recommendation shard is unavailable, retry shortly')
+        unavailable_response.status_code = 503
+        unavailable_response.headers['Retry-After'] = '1'
+        return unavailable_response
+
+@web_app.teardown_request
+def release_request_slot(_error=None):
+    if g.pop('request_admitted', False):
+        request_admission.release()
+
+@web_app.after_request
+def record_request_metrics(response):
+    started_at = getattr(g, 'request_started_at', None)
+    endpoint_name = request.endpoint or 'unmatched'
+    if started_at is not None:
+        metrics_registry.observe(
+            'recommender_request_seconds',
+            time.perf_counter() - started_at,
+            endpoint=endpoint_name
+        )
+    metrics_registry.increment(
+        'recommender_requests_total',
+        endpoint=endpoint_name,
+        status=response.status_code
+    )
+    return response
+
+def collect_cache_metrics():
+    if recommendation_cache is None:
+        return {}
+    cache_stats = recommendation_cache.stats()
+    return {
+        'recommender_cache_hits_total': cache_stats['hits'],
+        'recommender_cache_misses_total': cache_stats['misses'],
+        'recommender_cache_evictions_total': cache_stats['evictions'],
+        'recommender_cache_entries': cache_stats['entries'],
+        'recommender_cache_bytes': cache_stats['bytes']
+    }
+
+def collect_response_sharing_metrics():
+    response_metrics = {'recommender_coalesced_requests_total': recommendation_flight.shared_calls}
+    if precomputed_responses is not None:
+        precomputed_stats = precomputed_responses.stats()
+        response_metrics.update({
+            'recommender_precomputed_users': precomputed_stats['users'],
+            'recommender_precomputed_hits_total': precomputed_stats['hits'],
+            'recommender_precomputed_build_seconds': precomputed_stats['build_seconds']
+        })
+    return response_metrics
+
+metrics_registry.register_gauge_callback(collect_cache_metrics)
+metrics_registry.register_gauge_callback(collect_response_sharing_metrics)
+if request_admission is not None:
+    metrics_registry.register_gauge_callback(request_admission.stats)
 
 # Route handlers
 @web_app.route('/')
@@ -443,48 +879,259 @@ def serve_homepage():
 @web_app.route('/get_usernames', methods=['GET'])
 def handle_username_request():
     try:
-        user_list = UserRepository.retrieve_all_usernames()
-        return APIResponseHandler.success_response({'usernames': user_list})
+        search_term = request.args.get('q', '').strip()
+        page_size = request.args.get('limit', USERNAME_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor', 0, type=int)
+        
+        if page_size < 1 or cursor < 0:
+            return APIResponseHandler.error_response("'limit' must be positive and 'cursor' non-negative")
+        
+        user_list, next_cursor = UserRepository.search_usernames(
+            search_term,
+            min(page_size, MAX_USERNAME_PAGE_SIZE),
+            cursor
+        )
+        return APIResponseHandler.success_response({
+            'usernames': user_list,
+            'next_cursor': next_cursor
+        })
     except Exception as endpoint_error:
         return APIResponseHandler.error_response(endpoint_error)
 
 
-@web_app.route('/recommend', methods=['POST'])
+def render_recommendation_response(target_user, brand):
+    # (body, etag, None) for a successful response, (None, None, error message) otherwise
+    results, error_msg, recommendation_source = RecommendationService.generate_for_user(
+        target_user, brand
+    )
+    
+    if error_msg:
+        return None, None, error_msg
+    
+    if not results or len(results) == 0:
+        return None, None, 'No recommendations available for this user'
+    
+    response_body = APIResponseHandler.success_body({
+        'recommendations': results,
+        'recommendation_source': recommendation_source
+    })
+    return response_body, response_etag(response_body), None
+
+@web_app.route('/recommend', methods=['GET', 'POST'])
 def handle_recommendation_request():
     try:
-        request_payload = request.get_json()
+        # POST takes a JSON body; GET takes query parameters and can be answered with 304
+        request_payload = request.get_json() if request.method == 'POST' else request.args
         target_user = request_payload.get('username')
-        results, error_msg = RecommendationService.generate_for_user(target_user)
+        brand = request_payload.get('brand')
+        
+        if precomputed_responses is not None and target_user:
+            serving_engine = get_recommendation_system()
+            if not precomputed_responses.is_current(serving_engine):
+                precomputed_responses.refresh_in_background(serving_engine)
+            prepared_response = precomputed_responses.get(target_user, serving_engine.model_version)
+            if prepared_response is not None:
+                return APIResponseHandler.conditional_response(*prepared_response)
+        
+        response_body, etag, error_msg = recommendation_flight.run(
+            (target_user, brand, DEFAULT_RECOMMENDATION_COUNT),
+            lambda: render_recommendation_response(target_user, brand)
+        )
         
         if error_msg:
             return APIResponseHandler.error_response(error_msg)
+        return APIResponseHandler.conditional_response(response_body, etag)
+    
+    except Exception as endpoint_error:
+        log_error('endpoint_failed', exc_info=True, endpoint=request.endpoint)
+        return APIResponseHandler.error_response(endpoint_error)
+
+
+@web_app.route('/recommend/batch', methods=['POST'])
+def handle_batch_recommendation_request():
+    try:
+        target_usernames, recommendation_count, validation_error = RecommendationService.read_batch_payload(
+            request.get_json(silent=True)
+        )
+        if validation_error:
+            return APIResponseHandler.error_response(validation_error), 400
         
-        if not results or len(results) == 0:
-            return APIResponseHandler.error_response(
-                'No recommendations available for this user'
-            )
+        results, error_msg, fallback_users = RecommendationService.generate_for_users(
+            target_usernames, recommendation_count
+        )
+        
+        if error_msg:
+            return APIResponseHandler.error_response(error_msg)
         
-        return APIResponseHandler.success_response({'recommendations': results})
+        return APIResponseHandler.success_response({
+            'recommendations': results,
+            # These users are unknown and received the popularity fallback instead
+            'fallback_users': fallback_users,
+            'users_without_recommendations': [
+                username for username, recommendations in results.items()
+                if not recommendations
+            ]
+        })
     
     except Exception as endpoint_error:
-        print(f"Endpoint error: {endpoint_error}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
+        log_error('endpoint_failed', exc_info=True, endpoint=request.endpoint)
         return APIResponseHandler.error_response(endpoint_error)
 
 
-def initialize_application():
+@web_app.route('/healthz', methods=['GET'])
+def handle_liveness_probe():
+    return jsonify({'status': 'alive'})
+
+@web_app.route('/readyz', methods=['GET'])
+def handle_readiness_probe():
+    # Green only once this process has its artifacts loaded
+    if not is_engine_loaded():
+        return jsonify({'status': 'loading'}), 503
+    serving_engine = get_recommendation_system()
+    readiness = {
+        'status': 'ready',
+        'model_version': serving_engine.model_version,
+        # Reviews without reviews_cleaned are refused by /admin/reviews until this is 'available'
+        'text_cleaning': serving_engine.text_cleaner_problem or 'available'
+    }
+    if serving_engine.shard is not None:
+        readiness['shard'] = serving_engine.shard
+    return jsonify(readiness)
+
+@web_app.route('/metrics', methods=['GET'])
+def handle_metrics_request():
+    return Response(
+        metrics_registry.render(),
+        mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+def is_admin_request():
+    admin_token = os.environ.get('RECOMMENDER_ADMIN_TOKEN')
+    return bool(admin_token) and request.headers.get('X-Admin-Token') == admin_token
+
+@web_app.route('/admin/reload', methods=['GET', 'POST'])
+def handle_reload_request():
+    if not is_admin_request():
+        return APIResponseHandler.error_response('Admin token missing or invalid'), 403
+    
     try:
-        available_users = get_all_users()
+        if request.method == 'GET':
+            return APIResponseHandler.success_response({'reload': engine_reloader.status()})
+        
+        request_payload = request.get_json(silent=True) or {}
+        artifact_dir = request_payload.get('artifact_dir')
+        if not artifact_dir or not os.path.isdir(artifact_dir):
+            return APIResponseHandler.error_response("'artifact_dir' must be an existing directory"), 400
+        
+        if not engine_reloader.reload_in_background(artifact_dir):
+            return APIResponseHandler.error_response('A reload is already in progress'), 409
+        
+        return APIResponseHandler.success_response({'reload': engine_reloader.status()}), 202
+    
+    except Exception as endpoint_error:
+        return APIResponseHandler.error_response(endpoint_error)
+
+
+def read_review_records():
+    # (records, None) from {"reviews": [...]}, a bare JSON list or NDJSON; (None, error) otherwise
+    if request.mimetype == 'application/x-ndjson':
+        review_records = []
+        for line_number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                review_records.append(json.loads(line))
+            except json.JSONDecodeError as decode_error:
+                return None, f"NDJSON line {line_number} is not valid JSON: {decode_error.msg}"
+    else:
+        request_payload = request.get_json(silent=True)
+        review_records = request_payload.get('reviews') if isinstance(request_payload, dict) else request_payload
+    
+    if not isinstance(review_records, list) or not all(isinstance(review, dict) for review in review_records):
+        return None, "Send a 'reviews' list of objects, a JSON list of objects or an NDJSON body"
+    return review_records, None
+
+@web_app.route('/admin/reviews', methods=['POST'])
+def handle_review_ingestion_request():
+    if not is_admin_request():
+        return APIResponseHandler.error_response('Admin token missing or invalid'), 403
+    
+    try:
+        review_records, input_error = read_review_records()
+        if input_error:
+            return APIResponseHandler.error_response(input_error), 400
+        
+        started_at = time.perf_counter()
+        ingested_count, reviewer_names = ingest_reviews(review_records)
+        forget_reviewer_results(reviewer_names)
+        elapsed = time.perf_counter() - started_at
+        
+        serving_engine = get_recommendation_system()
+        return APIResponseHandler.success_response({
+            'ingested': ingested_count,
+            'seconds': round(elapsed, 4),
+            'model_version': serving_engine.model_version,
+            'ingested_reviews': serving_engine.ingested_review_count
+        })
+    
+    except TextCleanerUnavailable as cleaner_error:
+        # A server setup problem, not bad input: the NLTK data is missing
+        return APIResponseHandler.error_response(cleaner_error), 503
+    except ValueError as validation_error:
+        return APIResponseHandler.error_response(validation_error), 400
+    except Exception as endpoint_error:
+        # Nothing was ingested, so the write must not look accepted
+        log_error('endpoint_failed', exc_info=True, endpoint=request.endpoint)
+        return APIResponseHandler.error_response(endpoint_error), 500
+
+def forget_reviewer_results(reviewer_names):
+    # Ingestion keeps the model version, so only the reviewers' stored results are dropped
+    if recommendation_cache is not None:
+        recommendation_cache.forget_users(
+            reviewer_names, DEFAULT_RECOMMENDATION_COUNT, get_recommendation_system().model_version
+        )
+    if precomputed_responses is not None:
+        precomputed_responses.forget_users(reviewer_names)
+
+def load_engine():
+    if shard_router is not None:
+        return
+    try:
+        serving_engine = get_recommendation_system()
+        # Built before workers fork when preloading, so they start with the search index
+        # and the responses in place
+        serving_engine.user_directory.build_index()
+        if precomputed_responses is not None:
+            precomputed_responses.refresh(serving_engine)
     except Exception as init_error:
-        print(f"⚠ Warning: Initialization issue - {init_error}", file=sys.stderr)
+        log_error('initialization_failed', error=str(init_error))
+
+def start_artifact_watcher():
+    # Threads do not survive fork, so pre-forking servers call this in each worker
+    pointer_path = os.environ.get('RECOMMENDER_ARTIFACT_POINTER')
+    if pointer_path and shard_router is None:
+        engine_reloader.watch_pointer_file(
+            pointer_path,
+            float(os.environ.get('RECOMMENDER_ARTIFACT_POLL_SECONDS', 5))
+        )
+    if review_ingest_log is not None and shard_router is None:
+        review_ingest_log.follow(
+            float(os.environ.get('RECOMMENDER_INGEST_POLL_SECONDS', 1)),
+            forget_reviewer_results
+        )
+
+def initialize_application():
+    load_engine()
+    start_artifact_watcher()
 
 if __name__ == '__main__':
     initialize_application()
     
-    # Launch Flask development server
+    # Flask development server; production serving goes through wsgi.py and gunicorn.conf.py.
+    # The reloader is off because it would load every artifact a second time
     web_app.run(
         debug=True,
+        use_reloader=False,
         port=5000,
         host='127.0.0.1'
     )
\ No newline at end of file
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from candidates import DEFAULT_TOP_K, DEFAULT_NEIGHBOUR_COUNT, DEFAULT_FACTOR_COUNT
+from sharding import user_shards
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+MODEL_FILES = ('logistic_regression_model.pkl', 'tfidf_vectorizer.pkl')
+CHECKSUM_CHUNK_BYTES = 1 << 20
+
+class ArtifactBundleError(Exception):
+    pass
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHECKSUM_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_manifest(bundle_dir, metadata):
+    file_entries = {}
+    for file_name in sorted(os.listdir(bundle_dir)):
+        if file_name == MANIFEST_FILE:
+            continue
+        file_path = os.path.join(bundle_dir, file_name)
+        file_entries[file_name] = {
+            'sha256': file_checksum(file_path),
+            'bytes': os.path.getsize(file_path)
+        }
+    
+    # The bundle version is derived from content, so identical exports share it
+    version_digest = hashlib.sha256()
+    for file_name, entry in file_entries.items():
+        version_digest.update(f"{file_name}:{entry['sha256']}\n".encode('utf-8'))
+    
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'bundle_version': version_digest.hexdigest()[:16],
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'files': file_entries,
+        **metadata
+    }
+    
+    with open(os.path.join(bundle_dir, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    
+    return manifest
+
+def open_bundle(bundle_dir, verify_checksums=True):
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as manifest_error:
+        raise ArtifactBundleError(f"Unreadable manifest {manifest_path}: {manifest_error}")
+    
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ArtifactBundleError(
+            f"Unsupported bundle format {manifest.get('format_version')} in {bundle_dir}"
+        )
+    
+    mismatched_files = []
+    for file_name, entry in manifest['files'].items():
+        file_path = os.path.join(bundle_dir, file_name)
+        if not os.path.isfile(file_path) or os.path.getsize(file_path) != entry['bytes']:
+            mismatched_files.append(file_name)
+        elif verify_checksums and file_checksum(file_path) != entry['sha256']:
+            mismatched_files.append(file_name)
+    
+    if mismatched_files:
+        raise ArtifactBundleError(
+            f"Bundle {manifest['bundle_version']} failed integrity check: "
+            f"{', '.join(mismatched_files)}"
+        )
+    
+    return manifest
+
+def export_bundle(source_dir, output_root, top_k=DEFAULT_TOP_K, candidate_model=None,
+                  neighbour_count=DEFAULT_NEIGHBOUR_COUNT, factor_count=DEFAULT_FACTOR_COUNT, shard_count=1):
+    # One bundle, or with shard_count > 1 a list of shard bundles, one per hash partition of the users
+    from model import RecommendationEngine
+    
+    engine = RecommendationEngine(
+        source_dir,
+        candidate_top_k=top_k,
+        candidate_model=candidate_model,
+        neighbour_count=neighbour_count,
+        factor_count=factor_count
+    )
+    if shard_count <= 1:
+        return publish_bundle(
+            source_dir, output_root, engine.candidate_model, engine.collaborative_predictions,
+            engine.seen_items, engine.product_index, engine.known_users
+        )
+    
+    # Per-user arrays are split by the hash of the username; product, sentiment and model
+    # files are copied into every shard
+    per_user_stores = [engine.collaborative_predictions, engine.seen_items]
+    store_shards = [
+        np.asarray(user_shards(store.user_names.tolist(), shard_count)) if store is not None else None
+        for store in per_user_stores
+    ]
+    known_user_shards = np.asarray(user_shards(engine.known_users.tolist(), shard_count))
+    
+    bundle_dirs = []
+    for shard_index in range(shard_count):
+        candidate_generator, seen_items = [
+            store.select_users(np.flatnonzero(shards == shard_index)) if store is not None else None
+            for store, shards in zip(per_user_stores, store_shards)
+        ]
+        bundle_dirs.append(publish_bundle(
+            source_dir, output_root, engine.candidate_model, candidate_generator,
+            seen_items, engine.product_index, engine.known_users[known_user_shards == shard_index],
+            {'index': shard_index, 'count': shard_count}
+        ))
+    return bundle_dirs
+
+def publish_bundle(source_dir, output_root, candidate_model, candidate_generator, seen_items,
+                   product_index, known_users, shard=None):
+    os.makedirs(output_root, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=output_root)
+    
+    try:
+        candidate_generator.save(staging_dir)
+        if seen_items is not None:
+            seen_items.save(staging_dir)
+        product_index.save(staging_dir)
+        np.save(os.path.join(staging_dir, 'known_users.npy'), known_users)
+        for file_name in MODEL_FILES:
+            shutil.copyfile(
+                os.path.join(source_dir, file_name),
+                os.path.join(staging_dir, file_name)
+            )
+        
+        manifest = write_manifest(staging_dir, {
+            'candidate_model': candidate_model,
+            'top_k': getattr(candidate_generator, 'top_k', None),
+            'seen_excluded': getattr(candidate_generator, 'seen_excluded', False),
+            'neighbour_count': getattr(candidate_generator, 'neighbour_count', None),
+            'factor_count': getattr(candidate_generator, 'factor_count', None),
+            'user_count': len(known_users),
+            'product_count': len(product_index),
+            'shard': shard
+        })
+        
+        # Publish by rename so readers never see a half-written bundle
+        bundle_dir = os.path.join(output_root, manifest['bundle_version'])
+        if os.path.isdir(bundle_dir):
+            shutil.rmtree(staging_dir)
+        else:
+            os.rename(staging_dir, bundle_dir)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    
+    if shard is None:
+        print(f"Exported bundle {manifest['bundle_version']} to {bundle_dir}")
+    else:
+        print(f"Exported shard {shard['index']} of {shard['count']} as bundle {manifest['bundle_version']} to {bundle_dir}")
+    return bundle_dir
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export notebook artifacts into a memory-mappable serving bundle'
+    )
+    parser.add_argument('--source', default='.')
+    parser.add_argument('--output', default='bundles')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--candidate-model', choices=['precomputed', 'item_neighbours', 'factors'], default=None)
+    parser.add_argument('--neighbours', type=int, default=DEFAULT_NEIGHBOUR_COUNT)
+    parser.add_argument('--factors', type=int, default=DEFAULT_FACTOR_COUNT)
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Split the users into this many bundles by a hash of the username')
+    arguments = parser.parse_args()
+    
+    export_bundle(
+        arguments.source,
+        arguments.output,
+        arguments.top_k,
+        arguments.candidate_model,
+        arguments.neighbours,
+        arguments.factors,
+        arguments.shards
+    )
@@ -0,0 +1,414 @@
+import os
+import sys
+import json
+import time
+import pickle
+import platform
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+POSITIVE_WORDS = ['great', 'love', 'excellent', 'perfect', 'amazing', 'recommend', 'happy', 'soft']
+NEGATIVE_WORDS = ['bad', 'broke', 'awful', 'poor', 'waste', 'disappointed', 'smell', 'return']
+NEUTRAL_WORDS = ['product', 'bought', 'use', 'day', 'bottle', 'price', 'store', 'time', 'family']
+
+# Synthetic artifacts with the same schema the notebook writes
+def generate_synthetic_artifacts(output_dir, user_count=2000, product_count=300,
+                                 review_count=20000, seed=42):
+    random_state = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    usernames = np.array([f"user_{index:06d}" for index in range(user_count)])
+    product_names = np.array([f"Product {index:05d}" for index in range(product_count)])
+    brand_names = np.array([f"Brand {index % 40:02d}" for index in range(product_count)])
+    
+    # Zipf-like popularity so a few products collect most reviews, as in the real data
+    product_weights = 1.0 / np.arange(1, product_count + 1) ** 0.9
+    product_ids = random_state.choice(product_count, review_count, p=product_weights / product_weights.sum())
+    user_ids = random_state.integers(0, user_count, review_count)
+    product_quality = random_state.uniform(2.0, 5.0, product_count)
+    ratings = np.clip(
+        np.rint(product_quality[product_ids] + random_state.normal(0, 1, review_count)), 1, 5
+    ).astype(int)
+    is_positive = random_state.random(review_count) < (ratings - 0.5) / 5
+    
+    review_texts = []
+    for positive in is_positive:
+        sentiment_words = POSITIVE_WORDS if positive else NEGATIVE_WORDS
+        word_count = random_state.integers(6, 25)
+        words = random_state.choice(NEUTRAL_WORDS + sentiment_words * 2, word_count)
+        review_texts.append(' '.join(words))
+    
+    review_frame = pd.DataFrame({
+        'name': product_names[product_ids],
+        'brand': brand_names[product_ids],
+        'reviews_username': usernames[user_ids],
+        'reviews_rating': ratings,
+        'user_sentiment': np.where(is_positive, 'Positive', 'Negative'),
+        'combined_reviews': review_texts,
+        'reviews_cleaned': review_texts
+    })
+    review_frame.to_csv(os.path.join(output_dir, 'cleaned_reviews_dataset.csv'), index=False)
+    
+    text_vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+    text_features = text_vectorizer.fit_transform(review_frame['reviews_cleaned'])
+    sentiment_classifier = LogisticRegression(class_weight='balanced', max_iter=1000, random_state=42)
+    sentiment_classifier.fit(text_features, review_frame['user_sentiment'])
+    
+    # Item-based predictions as in the notebook, with the rating matrix kept sparse
+    rating_table = review_frame.groupby(['reviews_username', 'name'])['reviews_rating'].mean()
+    # The notebook's train_table, read by the on-demand item_neighbours and factors models
+    rating_table.unstack().to_csv(os.path.join(output_dir, 'train_table.csv'))
+    user_index = pd.Index(sorted(rating_table.index.get_level_values(0).unique()))
+    item_index = pd.Index(sorted(rating_table.index.get_level_values(1).unique()))
+    rating_matrix = sparse.csr_matrix((
+        rating_table.to_numpy(dtype=np.float64),
+        (
+            user_index.get_indexer(rating_table.index.get_level_values(0)),
+            item_index.get_indexer(rating_table.index.get_level_values(1))
+        )
+    ), shape=(len(user_index), len(item_index)))
+    
+    item_norms = np.sqrt(np.asarray(rating_matrix.multiply(rating_matrix).sum(axis=0))).ravel()
+    item_norms[item_norms == 0] = 1.0
+    normalized_items = rating_matrix.multiply(1.0 / item_norms).tocsc()
+    item_similarity = (normalized_items.T @ normalized_items).toarray()
+    similarity_totals = np.abs(item_similarity).sum(axis=1)
+    similarity_totals[similarity_totals == 0] = 1.0
+    item_predictions = pd.DataFrame(
+        np.asarray(rating_matrix @ item_similarity) / similarity_totals,
+        index=user_index,
+        columns=item_index
+    )
+    
+    artifacts = {
+        'logistic_regression_model.pkl': sentiment_classifier,
+        'tfidf_vectorizer.pkl': text_vectorizer,
+        'item_based_predictions.pkl': item_predictions,
+        # The engine only reads the user index of this matrix
+        'user_based_predictions.pkl': pd.DataFrame(index=user_index)
+    }
+    for file_name, artifact in artifacts.items():
+        with open(os.path.join(output_dir, file_name), 'wb') as file:
+            pickle.dump(artifact, file)
+    
+    return {
+        'users': len(user_index),
+        'products': len(item_index),
+        'reviews': len(review_frame)
+    }
+
+def summarize_latencies(latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'count': int(len(latencies)),
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max())
+    }
+
+def measure_calls(call, arguments_list):
+    latencies = []
+    for arguments in arguments_list:
+        started_at = time.perf_counter()
+        call(*arguments)
+        latencies.append(time.perf_counter() - started_at)
+    return summarize_latencies(latencies)
+
+def measure_ranking(catalog_widths, candidate_limit, repeat_count, random_state):
+    # Top-N of one prediction row: the notebook's pandas sort against partial selection
+    from candidates import select_top_n
+    
+    ranking_results = {}
+    for catalog_width in catalog_widths:
+        prediction_rows = random_state.random((repeat_count, catalog_width), dtype=np.float32)
+        prediction_rows[random_state.random((repeat_count, catalog_width)) < 0.1] = np.nan
+        
+        pandas_sort = measure_calls(
+            lambda row: pd.Series(row).dropna().sort_values(ascending=False).head(candidate_limit),
+            [(row,) for row in prediction_rows]
+        )
+        partial_selection = measure_calls(
+            lambda row: select_top_n(row, candidate_limit),
+            [(row,) for row in prediction_rows]
+        )
+        ranking_results[f"width_{catalog_width}"] = {
+            'pandas_sort': pandas_sort,
+            'select_top_n': partial_selection,
+            'speedup': pandas_sort['mean_ms'] / partial_selection['mean_ms']
+        }
+    return ranking_results
+
+def measure_startup(artifact_dir):
+    # Separate interpreter so startup time and peak RSS are not polluted by this process
+    probe = (
+        "import os, sys, time, json, resource\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+        "started_at = time.perf_counter()\n"
+        "from model import RecommendationEngine\n"
+        f"engine = RecommendationEngine({artifact_dir!r})\n"
+        "elapsed = time.perf_counter() - started_at\n"
+        "peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "if os.path.exists('/proc/self/status'):\n"
+        "    # ru_maxrss survives exec and can report the parent's peak; VmHWM does not\n"
+        "    with open('/proc/self/status') as status:\n"
+        "        peak_kib = next(int(line.split()[1]) for line in status if line.startswith('VmHWM'))\n"
+        "print(json.dumps({'startup_seconds': elapsed, 'peak_rss_mb': peak_kib / 1024}))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, '-c', probe], capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def measure_endpoints(web_app, usernames, request_count, concurrency, random_state):
+    # Concurrent load through the WSGI stack in-process (no network hop)
+    request_plan = [
+        ('recommend', str(username)) for username in random_state.choice(usernames, request_count)
+    ] + [
+        ('get_usernames', str(username)[:random_state.integers(1, 8)])
+        for username in random_state.choice(usernames, request_count)
+    ]
+    random_state.shuffle(request_plan)
+    
+    latencies = {'recommend': [], 'get_usernames': []}
+    latency_lock = threading.Lock()
+    
+    def run_requests(worker_plan):
+        test_client = web_app.test_client()
+        for endpoint, argument in worker_plan:
+            started_at = time.perf_counter()
+            if endpoint == 'recommend':
+                test_client.post('/recommend', json={'username': argument})
+            else:
+                test_client.get('/get_usernames', query_string={'q': argument})
+            elapsed = time.perf_counter() - started_at
+            with latency_lock:
+                latencies[endpoint].append(elapsed)
+    
+    workers = [
+        threading.Thread(target=run_requests, args=(request_plan[offset::concurrency],))
+        for offset in range(concurrency)
+    ]
+    started_at = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started_at
+    
+    return {
+        'concurrency': concurrency,
+        'throughput_rps': len(request_plan) / elapsed,
+        **{f"{endpoint}_endpoint": summarize_latencies(values) for endpoint, values in latencies.items()}
+    }
+
+def measure_http(base_url, request_count, concurrency, random_state):
+    # Load against an already running server over keep-alive HTTP connections
+    server_address = urlsplit(base_url)
+    
+    def open_connection():
+        return http.client.HTTPConnection(server_address.hostname, server_address.port or 80, timeout=60)
+    
+    connection = open_connection()
+    connection.request('GET', '/get_usernames?limit=200')
+    usernames = json.loads(connection.getresponse().read())['usernames']
+    connection.close()
+    
+    request_bodies = [
+        json.dumps({'username': str(username)}) for username in random_state.choice(usernames, request_count)
+    ]
+    latencies = []
+    status_counts = {}
+    result_lock = threading.Lock()
+    
+    def run_requests(worker_bodies):
+        worker_connection = open_connection()
+        for request_body in worker_bodies:
+            started_at = time.perf_counter()
+            try:
+                worker_connection.request(
+                    'POST', '/recommend', body=request_body,
+                    headers={'Content-Type': 'application/json'}
+                )
+                response = worker_connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                worker_connection.close()
+                worker_connection = open_connection()
+                status = 'connection_error'
+            elapsed = time.perf_counter() - started_at
+            with result_lock:
+                latencies.append(elapsed)
+                status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+        worker_connection.close()
+    
+    workers = [
+        threading.Thread(target=run_requests, args=(request_bodies[offset::concurrency],))
+        for offset in range(concurrency)
+    ]
+    started_at = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started_at
+    
+    return {
+        'url': base_url,
+        'concurrency': concurrency,
+        'throughput_rps': request_count / elapsed,
+        'status_counts': status_counts,
+        'recommend_endpoint': summarize_latencies(latencies)
+    }
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(arguments):
+    random_state = np.random.default_rng(arguments.seed)
+    data_dir = os.path.join(arguments.workdir, f"data-{arguments.users}-{arguments.products}-{arguments.reviews}-{arguments.seed}")
+    
+    if not os.path.isfile(os.path.join(data_dir, 'train_table.csv')):
+        print(f"Generating synthetic artifacts in {data_dir}")
+        generate_synthetic_artifacts(data_dir, arguments.users, arguments.products, arguments.reviews, arguments.seed)
+    
+    # Also picked up by the startup probes, which build their engines in subprocesses
+    os.environ['RECOMMENDER_CANDIDATE_MODEL'] = arguments.candidate_model
+    from artifacts import export_bundle
+    bundle_dir = export_bundle(
+        data_dir, os.path.join(arguments.workdir, 'bundles'), candidate_model=arguments.candidate_model
+    )
+    
+    results = {
+        'commit': current_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'config': {
+            key: getattr(arguments, key)
+            for key in ('users', 'products', 'reviews', 'requests', 'concurrency', 'seed', 'cache', 'candidate_model')
+        },
+        'startup': {
+            'source': measure_startup(data_dir),
+            'bundle': measure_startup(bundle_dir)
+        }
+    }
+    
+    os.environ['RECOMMENDER_ARTIFACT_DIR'] = bundle_dir
+    os.environ['RECOMMENDER_CACHE_BACKEND'] = 'memory' if arguments.cache else 'none'
+    from model import get_recommendation_system
+    import app
+    
+    engine = get_recommendation_system()
+    usernames = engine.known_users[:].astype(str)
+    sampled_users = [(str(username),) for username in random_state.choice(usernames, arguments.requests)]
+    search_terms = [(str(username)[:random_state.integers(1, 8)],) for username in random_state.choice(usernames, arguments.requests)]
+    
+    batch_usernames = [username for (username,) in sampled_users]
+    batch_started_at = time.perf_counter()
+    engine.build_recommendation_sets(batch_usernames)
+    batch_seconds = time.perf_counter() - batch_started_at
+    
+    results['engine'] = {
+        'build_recommendation_set': measure_calls(engine.build_recommendation_set, sampled_users),
+        'fetch_user_list': measure_calls(engine.fetch_user_list, search_terms),
+        'search_user_list': measure_calls(engine.search_user_list, search_terms),
+        'build_recommendation_sets': {
+            'users': len(batch_usernames),
+            'total_ms': batch_seconds * 1000,
+            'per_user_ms': batch_seconds * 1000 / len(batch_usernames)
+        }
+    }
+    results['ranking'] = measure_ranking(
+        arguments.ranking_widths, 20, arguments.ranking_repeats, random_state
+    )
+    results['endpoints'] = measure_endpoints(
+        app.web_app, usernames, arguments.requests, arguments.concurrency, random_state
+    )
+    
+    os.makedirs(arguments.output, exist_ok=True)
+    result_path = os.path.join(
+        arguments.output,
+        f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}-{results['commit'] or 'nocommit'}.json"
+    )
+    with open(result_path, 'w') as file:
+        json.dump(results, file, indent=2)
+    
+    print(json.dumps(results, indent=2))
+    print(f"Saved results to {result_path}")
+    
+    if arguments.compare:
+        compare_results(arguments.compare, result_path)
+
+def _flatten_metrics(results, prefix=''):
+    flattened = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flattened.update(_flatten_metrics(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and (key.endswith('_ms') or key.endswith('_seconds')
+                                                  or key.endswith('_mb') or key.endswith('_rps')):
+            flattened[f"{prefix}{key}"] = value
+    return flattened
+
+def compare_results(baseline_path, candidate_path):
+    with open(baseline_path) as file:
+        baseline = _flatten_metrics(json.load(file))
+    with open(candidate_path) as file:
+        candidate = _flatten_metrics(json.load(file))
+    
+    print(f"{'metric':<60} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for metric_name in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[metric_name], candidate[metric_name]
+        change = (after - before) / before * 100 if before else float('nan')
+        print(f"{metric_name:<60} {before:>12.4f} {after:>12.4f} {change:>8.1f}%")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the recommendation serving path on synthetic artifacts'
+    )
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=300)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help='Enable the result cache for endpoint runs')
+    parser.add_argument('--candidate-model', choices=['precomputed', 'item_neighbours', 'factors'], default='precomputed')
+    parser.add_argument('--workdir', default='benchmark_data')
+    parser.add_argument('--output', default='benchmark_results')
+    parser.add_argument('--compare', help='Earlier results JSON to print a comparison against')
+    parser.add_argument('--ranking-widths', type=lambda value: [int(width) for width in value.split(',')],
+                        default=[300, 10000, 100000], help='Catalog sizes for the ranking microbenchmark')
+    parser.add_argument('--ranking-repeats', type=int, default=200)
+    parser.add_argument('--ranking-only', action='store_true', help='Run only the ranking microbenchmark')
+    parser.add_argument('--url', help='Load-test /recommend on a running server instead')
+    arguments = parser.parse_args()
+    
+    if arguments.url:
+        print(json.dumps(measure_http(
+            arguments.url, arguments.requests, arguments.concurrency,
+            np.random.default_rng(arguments.seed)
+        ), indent=2))
+    elif arguments.ranking_only:
+        print(json.dumps(measure_ranking(
+            arguments.ranking_widths, 20, arguments.ranking_repeats,
+            np.random.default_rng(arguments.seed)
+        ), indent=2))
+    else:
+        run_benchmark(arguments)
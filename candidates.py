@@ -0,0 +1,690 @@
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+DEFAULT_TOP_K = 100
+DEFAULT_NEIGHBOUR_COUNT = 100
+EXPORT_BLOCK_ROWS = 2048
+SIMILARITY_BLOCK_CELLS = 1 << 22
+SEEN_KEY_SHIFT = 32
+DEFAULT_FACTOR_COUNT = 64
+# 'exact' scores every product; 'hnsw' searches a faiss HNSW index (pip install faiss-cpu)
+FACTOR_INDEX_TYPES = ('exact', 'hnsw')
+FACTOR_INDEX_LINKS = 32
+DEFAULT_FACTOR_SEARCH_DEPTH = 128
+
+# Shared persistence and sorted user lookup for the per-user array stores
+class UserRowIndex:
+    FILE_NAMES = {}
+    
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        arrays = {
+            field: np.load(os.path.join(directory, file_name), mmap_mode=mmap_mode)
+            for field, file_name in cls.FILE_NAMES.items()
+        }
+        return cls(**arrays)
+    
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for field, file_name in self.FILE_NAMES.items():
+            np.save(os.path.join(directory, file_name), getattr(self, field))
+    
+    def __contains__(self, user_name):
+        return self.row_for(user_name) is not None
+    
+    def row_for(self, user_name):
+        if len(self.user_names) == 0:
+            return None
+        row = int(np.searchsorted(self.user_names, user_name))
+        if row < len(self.user_names) and self.user_names[row] == user_name:
+            return row
+        return None
+    
+    def rows_for(self, user_names):
+        # Vectorized row lookup, -1 for users not in the store
+        lookup_names = np.asarray(user_names, dtype=np.str_)
+        if len(self.user_names) == 0 or len(lookup_names) == 0:
+            return np.full(len(lookup_names), -1, dtype=np.int64)
+        
+        rows = np.minimum(
+            np.searchsorted(self.user_names, lookup_names), len(self.user_names) - 1
+        )
+        return np.where(self.user_names[rows] == lookup_names, rows, -1)
+
+# Products each user already reviewed, as CSR offsets into an int32 product id array
+class SeenItemIndex(UserRowIndex):
+    FILE_NAMES = {
+        'user_names': 'seen_users.npy',
+        'item_indptr': 'seen_indptr.npy',
+        'item_ids': 'seen_item_ids.npy'
+    }
+    
+    def __init__(self, user_names, item_indptr, item_ids):
+        # user_names must be sorted; item ids index the candidate generator's product_names
+        self.user_names = user_names
+        self.item_indptr = item_indptr
+        self.item_ids = item_ids
+        # Reviews ingested after the export, {user name: product ids}; replaced, never mutated
+        self.recent_items = {}
+        self._recent_lock = threading.Lock()
+    
+    @classmethod
+    def from_reviews(cls, review_frame, product_names):
+        product_lookup = {
+            product_name: product_id
+            for product_id, product_name in enumerate(product_names.tolist())
+        }
+        seen_pairs = review_frame[['reviews_username', 'name']].dropna()
+        product_ids = seen_pairs['name'].astype(str).map(product_lookup)
+        seen_pairs = seen_pairs[product_ids.notna()]
+        
+        user_names, user_rows = np.unique(
+            as_fixed_width(seen_pairs['reviews_username'].to_numpy()), return_inverse=True
+        )
+        seen_keys = np.unique(
+            (user_rows.astype(np.int64) << SEEN_KEY_SHIFT)
+            | product_ids[product_ids.notna()].to_numpy(dtype=np.int64)
+        )
+        
+        item_indptr = np.zeros(len(user_names) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(seen_keys >> SEEN_KEY_SHIFT, minlength=len(user_names)),
+            out=item_indptr[1:]
+        )
+        item_ids = (seen_keys & ((1 << SEEN_KEY_SHIFT) - 1)).astype(np.int32)
+        return cls(user_names, item_indptr, item_ids)
+    
+    def select_users(self, rows):
+        # The index restricted to the given rows, which must be ascending
+        item_indptr, item_ids = select_csr_rows(self.item_indptr, rows, self.item_ids)
+        return type(self)(self.user_names[rows], item_indptr, item_ids)
+    
+    def record_items(self, user_names, product_ids):
+        with self._recent_lock:
+            recent_items = dict(self.recent_items)
+            for user_name, product_id in zip(user_names, product_ids):
+                recent_items[user_name] = recent_items.get(user_name, frozenset()) | {int(product_id)}
+            self.recent_items = recent_items
+    
+    def seen_keys(self, user_names):
+        # Sorted (position in user_names << 32 | product id) keys for vectorized masking
+        user_rows = self.rows_for(user_names)
+        found = user_rows >= 0
+        starts = np.where(found, self.item_indptr[np.maximum(user_rows, 0)], 0)
+        lengths = np.where(found, self.item_indptr[np.maximum(user_rows, 0) + 1] - starts, 0)
+        
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        seen_keys = (
+            (np.repeat(np.arange(len(user_rows), dtype=np.int64), lengths) << SEEN_KEY_SHIFT)
+            | self.item_ids[offsets].astype(np.int64)
+        )
+        
+        recent_items = self.recent_items
+        if recent_items:
+            recent_keys = [
+                (position << SEEN_KEY_SHIFT) | product_id
+                for position, user_name in enumerate(user_names)
+                for product_id in recent_items.get(user_name, ())
+            ]
+            seen_keys = np.concatenate((seen_keys, np.asarray(recent_keys, dtype=np.int64)))
+        return np.unique(seen_keys)
+    
+    def seen_mask(self, user_names, candidate_ids):
+        # candidate_ids holds one row per user name; -1 padding is never reported as seen
+        candidate_keys = (
+            (np.arange(len(user_names), dtype=np.int64)[:, None] << SEEN_KEY_SHIFT)
+            | np.maximum(candidate_ids, 0).astype(np.int64)
+        )
+        return np.isin(candidate_keys, self.seen_keys(user_names)) & (candidate_ids >= 0)
+    
+    def recent_mask(self, user_names, candidate_ids):
+        # Like seen_mask, but only for products recorded since the export
+        recent_items = self.recent_items
+        seen = np.zeros(candidate_ids.shape, dtype=bool)
+        for position, user_name in enumerate(user_names):
+            product_ids = recent_items.get(user_name)
+            if product_ids:
+                seen[position] = np.isin(candidate_ids[position], list(product_ids))
+        return seen
+
+# Candidate generators return each known user's best unseen products
+class CandidateGenerator(UserRowIndex):
+    # Set by the engine; when present, already reviewed products are never candidates
+    seen_items = None
+    
+    def candidates_for(self, user_name, candidate_limit=None):
+        known_users, product_ids, scores = self.candidate_block([user_name], candidate_limit)
+        if not known_users[0]:
+            return None
+        
+        valid = product_ids[0] >= 0
+        return product_ids[0][valid], scores[0][valid]
+    
+    def candidate_block(self, user_names, candidate_limit=None):
+        # (known mask, ids, scores) with one row per known user, best first,
+        # padded with -1 ids and NaN scores
+        raise NotImplementedError
+
+# Per-user top-K candidates in contiguous arrays instead of a dense users x products frame
+class CandidateStore(CandidateGenerator):
+    FILE_NAMES = {
+        'user_names': 'candidate_users.npy',
+        'product_names': 'candidate_products.npy',
+        'candidate_ids': 'candidate_ids.npy',
+        'candidate_scores': 'candidate_scores.npy'
+    }
+    
+    def __init__(self, user_names, product_names, candidate_ids, candidate_scores, seen_excluded=False):
+        # user_names must be sorted so rows can be found with a binary search
+        self.user_names = user_names
+        self.product_names = product_names
+        self.candidate_ids = candidate_ids
+        self.candidate_scores = candidate_scores
+        # True when reviewed products were dropped before the top-K cut
+        self.seen_excluded = seen_excluded
+    
+    @classmethod
+    def from_prediction_frame(cls, prediction_frame, top_k=DEFAULT_TOP_K, seen_items=None):
+        prediction_frame = prediction_frame.sort_index()
+        user_names = as_fixed_width(prediction_frame.index.to_numpy())
+        product_names = as_fixed_width(prediction_frame.columns.to_numpy())
+        top_k = min(top_k, len(product_names))
+        
+        candidate_ids = np.full((len(user_names), top_k), -1, dtype=np.int32)
+        candidate_scores = np.full((len(user_names), top_k), np.nan, dtype=np.float32)
+        
+        # Convert in row blocks so the float32 copy never holds the whole matrix
+        for block_start in range(0, len(user_names), EXPORT_BLOCK_ROWS):
+            block_stop = min(block_start + EXPORT_BLOCK_ROWS, len(user_names))
+            block_scores = prediction_frame.iloc[block_start:block_stop].to_numpy(
+                dtype=np.float32, copy=seen_items is not None
+            )
+            if seen_items is not None:
+                # Reviewed products are dropped before selection so every slot holds a new product
+                seen_keys = seen_items.seen_keys(user_names[block_start:block_stop].tolist())
+                block_scores[
+                    seen_keys >> SEEN_KEY_SHIFT, seen_keys & ((1 << SEEN_KEY_SHIFT) - 1)
+                ] = np.nan
+            block_ids, block_top_scores = select_top_k(block_scores, top_k)
+            candidate_ids[block_start:block_stop] = block_ids
+            candidate_scores[block_start:block_stop] = block_top_scores
+        
+        return cls(user_names, product_names, candidate_ids, candidate_scores, seen_items is not None)
+    
+    @property
+    def top_k(self):
+        return self.candidate_ids.shape[1]
+    
+    def select_users(self, rows):
+        return type(self)(
+            self.user_names[rows], self.product_names, self.candidate_ids[rows], self.candidate_scores[rows],
+            self.seen_excluded
+        )
+    
+    def candidate_block(self, user_names, candidate_limit=None):
+        user_rows = self.rows_for(user_names)
+        known_users = user_rows >= 0
+        known_rows = user_rows[known_users]
+        candidate_ids = self.candidate_ids[known_rows]
+        candidate_scores = self.candidate_scores[known_rows]
+        
+        # When the export already excluded reviewed products, only reviews ingested since are checked
+        check_seen = self.seen_items is not None and candidate_ids.size and (
+            not self.seen_excluded or self.seen_items.recent_items
+        )
+        if check_seen:
+            known_names = [str(user_name) for user_name, is_known in zip(user_names, known_users) if is_known]
+            if self.seen_excluded:
+                seen = self.seen_items.recent_mask(known_names, candidate_ids)
+            else:
+                seen = self.seen_items.seen_mask(known_names, candidate_ids)
+            if seen.any():
+                # Stable sort moves seen products to the end and keeps the rest in order
+                order = np.argsort(seen, axis=1, kind='stable')
+                seen = np.take_along_axis(seen, order, axis=1)
+                candidate_ids = np.where(seen, -1, np.take_along_axis(candidate_ids, order, axis=1))
+                candidate_scores = np.where(
+                    seen, np.nan, np.take_along_axis(candidate_scores, order, axis=1)
+                ).astype(np.float32)
+        
+        return known_users, candidate_ids[:, :candidate_limit], candidate_scores[:, :candidate_limit]
+
+# Sparse ratings plus pruned item neighbours; user scores are computed per request.
+# Scores follow the notebook: sum_i r_ui * sim(i, j) / sum_i |sim(i, j)|
+class ItemNeighbourModel(CandidateGenerator):
+    FILE_NAMES = {
+        'user_names': 'neighbour_users.npy',
+        'product_names': 'neighbour_products.npy',
+        'rating_indptr': 'rating_indptr.npy',
+        'rating_indices': 'rating_indices.npy',
+        'rating_values': 'rating_values.npy',
+        'neighbour_indptr': 'neighbour_indptr.npy',
+        'neighbour_indices': 'neighbour_indices.npy',
+        'neighbour_weights': 'neighbour_weights.npy',
+        'similarity_totals': 'similarity_totals.npy'
+    }
+    
+    def __init__(self, user_names, product_names, rating_indptr, rating_indices, rating_values,
+                 neighbour_indptr, neighbour_indices, neighbour_weights, similarity_totals):
+        # user_names must be sorted so rows can be found with a binary search
+        self.user_names = user_names
+        self.product_names = product_names
+        self.rating_indptr = rating_indptr
+        self.rating_indices = rating_indices
+        self.rating_values = rating_values
+        self.neighbour_indptr = neighbour_indptr
+        self.neighbour_indices = neighbour_indices
+        self.neighbour_weights = neighbour_weights
+        self.similarity_totals = similarity_totals
+        
+        product_count = len(product_names)
+        self.rating_matrix = sparse.csr_matrix(
+            (rating_values, rating_indices, rating_indptr),
+            shape=(len(user_names), product_count)
+        )
+        self.neighbour_matrix = sparse.csr_matrix(
+            (neighbour_weights, neighbour_indices, neighbour_indptr),
+            shape=(product_count, product_count)
+        )
+        self.inverse_totals = np.divide(
+            1.0, similarity_totals,
+            out=np.zeros(product_count), where=np.asarray(similarity_totals) > 0
+        )
+        self.product_lookup = {
+            product_name: product_id
+            for product_id, product_name in enumerate(product_names.tolist())
+        }
+        
+        # Ratings recorded after the export, {user name: {product id: rating}}.
+        # Replaced rather than mutated so readers never see a partial update
+        self.recent_ratings = {}
+        self._rating_lock = threading.Lock()
+    
+    @classmethod
+    def from_rating_frame(cls, rating_frame, neighbour_count=DEFAULT_NEIGHBOUR_COUNT):
+        return cls.from_rating_matrix(*rating_matrix_from_frame(rating_frame), neighbour_count)
+    
+    @classmethod
+    def from_rating_matrix(cls, user_names, product_names, rating_matrix,
+                           neighbour_count=DEFAULT_NEIGHBOUR_COUNT):
+        # rating_matrix is a users x products CSR matrix with rows in user_names order
+        neighbour_indptr, neighbour_indices, neighbour_weights, similarity_totals = (
+            cls.build_neighbours(rating_matrix, neighbour_count)
+        )
+        return cls(
+            user_names,
+            product_names,
+            rating_matrix.indptr.astype(np.int64),
+            rating_matrix.indices.astype(np.int32),
+            rating_matrix.data.astype(np.float32),
+            neighbour_indptr,
+            neighbour_indices,
+            neighbour_weights,
+            similarity_totals
+        )
+    
+    @staticmethod
+    def build_neighbours(rating_matrix, neighbour_count=DEFAULT_NEIGHBOUR_COUNT):
+        # Item-item cosine similarity in row blocks; only the strongest neighbours are kept,
+        # but the normalising totals use every similarity so kept scores match the dense product
+        product_count = rating_matrix.shape[1]
+        item_norms = np.sqrt(np.asarray(rating_matrix.multiply(rating_matrix).sum(axis=0), dtype=np.float64)).ravel()
+        item_norms[item_norms == 0] = 1.0
+        normalized_items = sparse.csc_matrix(rating_matrix.multiply(1.0 / item_norms), dtype=np.float64)
+        
+        neighbour_count = min(neighbour_count, product_count)
+        block_rows = max(1, SIMILARITY_BLOCK_CELLS // max(product_count, 1))
+        similarity_totals = np.zeros(product_count, dtype=np.float64)
+        neighbour_ids = []
+        neighbour_scores = []
+        
+        for block_start in range(0, product_count, block_rows):
+            block_stop = min(block_start + block_rows, product_count)
+            similarity_block = (normalized_items[:, block_start:block_stop].T @ normalized_items).toarray()
+            similarity_totals[block_start:block_stop] = np.abs(similarity_block).sum(axis=1)
+            
+            similarity_block[similarity_block == 0] = np.nan
+            block_ids, block_scores = select_top_k(similarity_block, neighbour_count)
+            neighbour_ids.append(block_ids)
+            neighbour_scores.append(block_scores)
+        
+        if neighbour_ids:
+            neighbour_ids = np.vstack(neighbour_ids)
+            neighbour_scores = np.vstack(neighbour_scores)
+        else:
+            neighbour_ids = np.empty((0, neighbour_count), dtype=np.int32)
+            neighbour_scores = np.empty((0, neighbour_count), dtype=np.float32)
+        
+        valid = neighbour_ids >= 0
+        neighbour_indptr = np.concatenate(([0], np.cumsum(valid.sum(axis=1)))).astype(np.int64)
+        return neighbour_indptr, neighbour_ids[valid], neighbour_scores[valid], similarity_totals
+    
+    @property
+    def neighbour_count(self):
+        if len(self.product_names) == 0:
+            return 0
+        return int(np.diff(self.neighbour_indptr).max())
+    
+    def __contains__(self, user_name):
+        return user_name in self.recent_ratings or self.row_for(user_name) is not None
+    
+    def select_users(self, rows):
+        # Only the rating rows are per user; the neighbour arrays are shared by every subset
+        rating_indptr, rating_indices, rating_values = select_csr_rows(
+            self.rating_indptr, rows, self.rating_indices, self.rating_values
+        )
+        return type(self)(
+            self.user_names[rows],
+            self.product_names,
+            rating_indptr,
+            rating_indices,
+            rating_values,
+            self.neighbour_indptr,
+            self.neighbour_indices,
+            self.neighbour_weights,
+            self.similarity_totals
+        )
+    
+    def record_ratings(self, user_names, product_names, ratings):
+        # New ratings take part in scoring straight away; unknown products are skipped
+        applied = 0
+        with self._rating_lock:
+            recent_ratings = dict(self.recent_ratings)
+            for user_name, product_name, rating in zip(user_names, product_names, ratings):
+                product_id = self.product_lookup.get(product_name)
+                if product_id is None:
+                    continue
+                user_ratings = recent_ratings[user_name] = dict(recent_ratings.get(user_name, {}))
+                user_ratings[product_id] = float(rating)
+                applied += 1
+            self.recent_ratings = recent_ratings
+        return applied
+    
+    def _rating_block(self, user_names):
+        recent_ratings = self.recent_ratings
+        user_rows = self.rows_for(user_names)
+        known_users = user_rows >= 0
+        if recent_ratings:
+            known_users |= np.array([user_name in recent_ratings for user_name in user_names], dtype=bool)
+        
+        known_rows = user_rows[known_users]
+        rating_block = self.rating_matrix[np.maximum(known_rows, 0)].tocoo()
+        keep = known_rows[rating_block.row] >= 0
+        block_rows, block_columns, block_values = rating_block.row[keep], rating_block.col[keep], rating_block.data[keep]
+        
+        known_names = [user_name for user_name, is_known in zip(user_names, known_users) if is_known]
+        recent_entries = [
+            (block_row, product_id, rating)
+            for block_row, user_name in enumerate(known_names)
+            for product_id, rating in recent_ratings.get(user_name, {}).items()
+        ]
+        if recent_entries:
+            recent_rows, recent_columns, recent_values = (np.asarray(values) for values in zip(*recent_entries))
+            # A recent rating replaces the exported one for the same product
+            product_count = len(self.product_names)
+            replaced = np.isin(
+                block_rows.astype(np.int64) * product_count + block_columns,
+                recent_rows.astype(np.int64) * product_count + recent_columns
+            )
+            block_rows = np.concatenate((block_rows[~replaced], recent_rows))
+            block_columns = np.concatenate((block_columns[~replaced], recent_columns))
+            block_values = np.concatenate((block_values[~replaced], recent_values))
+        
+        rating_block = sparse.csr_matrix(
+            (block_values.astype(np.float64), (block_rows, block_columns)),
+            shape=(len(known_names), len(self.product_names))
+        )
+        return known_users, rating_block
+    
+    def candidate_block(self, user_names, candidate_limit=None):
+        user_names = [str(user_name) for user_name in user_names]
+        known_users, rating_block = self._rating_block(user_names)
+        score_block = (rating_block @ self.neighbour_matrix).multiply(self.inverse_totals).tocoo()
+        
+        if self.seen_items is not None and score_block.nnz:
+            known_names = [user_name for user_name, is_known in zip(user_names, known_users) if is_known]
+            unseen = ~np.isin(
+                (score_block.row.astype(np.int64) << SEEN_KEY_SHIFT) | score_block.col,
+                self.seen_items.seen_keys(known_names)
+            )
+            score_block = sparse.coo_matrix(
+                (score_block.data[unseen], (score_block.row[unseen], score_block.col[unseen])),
+                shape=score_block.shape
+            )
+        
+        score_block = score_block.tocsr()
+        score_block.sort_indices()
+        
+        row_lengths = np.diff(score_block.indptr)
+        width = int(row_lengths.max()) if len(row_lengths) else 0
+        if candidate_limit is not None:
+            width = min(width, candidate_limit)
+        
+        candidate_ids = np.full((len(row_lengths), width), -1, dtype=np.int32)
+        candidate_scores = np.full((len(row_lengths), width), np.nan, dtype=np.float32)
+        for block_row in range(len(row_lengths)):
+            row_start, row_stop = score_block.indptr[block_row], score_block.indptr[block_row + 1]
+            row_ids = score_block.indices[row_start:row_stop]
+            row_scores = score_block.data[row_start:row_stop]
+            # Highest score first; row ids are sorted, so ties go to the lower product id
+            order = select_top_n(row_scores, width)
+            candidate_ids[block_row, :len(order)] = row_ids[order]
+            candidate_scores[block_row, :len(order)] = row_scores[order]
+        
+        return known_users, candidate_ids, candidate_scores
+
+# Low-rank user and product factors, scored at request time: memory grows with
+# (users + products) x factors instead of users x products
+class FactorModel(CandidateGenerator):
+    FILE_NAMES = {
+        'user_names': 'factor_users.npy',
+        'product_names': 'factor_products.npy',
+        'user_factors': 'user_factors.npy',
+        'product_factors': 'product_factors.npy'
+    }
+    
+    def __init__(self, user_names, product_names, user_factors, product_factors):
+        # user_names must be sorted so rows can be found with a binary search
+        self.user_names = user_names
+        self.product_names = product_names
+        self.user_factors = user_factors
+        self.product_factors = product_factors
+        # Read per instance, so a reload picks up changed settings
+        self.index_type = os.environ.get('RECOMMENDER_FACTOR_INDEX', 'exact')
+        if self.index_type not in FACTOR_INDEX_TYPES:
+            raise ValueError(f"Unknown RECOMMENDER_FACTOR_INDEX '{self.index_type}'")
+        self.search_depth = int(os.environ.get('RECOMMENDER_FACTOR_SEARCH_DEPTH', DEFAULT_FACTOR_SEARCH_DEPTH))
+        self._approximate_index = None
+        self._index_lock = threading.Lock()
+    
+    @classmethod
+    def from_rating_frame(cls, rating_frame, factor_count=DEFAULT_FACTOR_COUNT):
+        return cls.from_rating_matrix(*rating_matrix_from_frame(rating_frame), factor_count)
+    
+    @classmethod
+    def from_rating_matrix(cls, user_names, product_names, rating_matrix,
+                           factor_count=DEFAULT_FACTOR_COUNT):
+        # Truncated SVD of the zero-filled rating matrix. U S V^T approximates the ratings and
+        # ranks each user's products; S is folded into the user factors
+        factor_count = min(factor_count, min(rating_matrix.shape) - 1)
+        if factor_count < 1:
+            return cls(
+                user_names,
+                product_names,
+                np.zeros((len(user_names), 0), dtype=np.float32),
+                np.zeros((len(product_names), 0), dtype=np.float32)
+            )
+        
+        user_vectors, singular_values, product_vectors = svds(
+            sparse.csr_matrix(rating_matrix, dtype=np.float64), k=factor_count, random_state=0
+        )
+        order = np.argsort(-singular_values)
+        return cls(
+            user_names,
+            product_names,
+            (user_vectors[:, order] * singular_values[order]).astype(np.float32),
+            np.ascontiguousarray(product_vectors[order].T, dtype=np.float32)
+        )
+    
+    @property
+    def factor_count(self):
+        return int(self.product_factors.shape[1])
+    
+    def select_users(self, rows):
+        return type(self)(self.user_names[rows], self.product_names, self.user_factors[rows], self.product_factors)
+    
+    def candidate_block(self, user_names, candidate_limit=None):
+        user_names = [str(user_name) for user_name in user_names]
+        user_rows = self.rows_for(user_names)
+        known_users = user_rows >= 0
+        query_factors = np.asarray(self.user_factors[user_rows[known_users]], dtype=np.float32)
+        candidate_limit = min(
+            DEFAULT_TOP_K if candidate_limit is None else candidate_limit, len(self.product_names)
+        )
+        
+        seen_keys = np.empty(0, dtype=np.int64)
+        if self.seen_items is not None:
+            seen_keys = self.seen_items.seen_keys(
+                [user_name for user_name, is_known in zip(user_names, known_users) if is_known]
+            )
+        
+        if self.index_type == 'hnsw':
+            candidate_ids, candidate_scores = self._approximate_top_k(query_factors, candidate_limit, seen_keys)
+        else:
+            candidate_ids, candidate_scores = self._exact_top_k(query_factors, candidate_limit, seen_keys)
+        return known_users, candidate_ids, candidate_scores
+    
+    def _exact_top_k(self, query_factors, candidate_limit, seen_keys):
+        # One block of products at a time, each block's best merged into a running top-K,
+        # so the users x products score matrix is never materialized
+        user_count = len(query_factors)
+        product_count = len(self.product_names)
+        seen_rows = (seen_keys >> SEEN_KEY_SHIFT).astype(np.int64)
+        seen_ids = (seen_keys & ((1 << SEEN_KEY_SHIFT) - 1)).astype(np.int64)
+        
+        best_ids = np.full((user_count, 0), -1, dtype=np.int32)
+        best_scores = np.empty((user_count, 0), dtype=np.float32)
+        block_columns = max(candidate_limit, SIMILARITY_BLOCK_CELLS // max(user_count, 1))
+        for block_start in range(0, product_count, block_columns):
+            block_stop = min(block_start + block_columns, product_count)
+            block_scores = query_factors @ np.asarray(self.product_factors[block_start:block_stop]).T
+            in_block = (seen_ids >= block_start) & (seen_ids < block_stop)
+            block_scores[seen_rows[in_block], seen_ids[in_block] - block_start] = np.nan
+            
+            block_ids, block_top = select_top_k(block_scores, min(candidate_limit, block_stop - block_start))
+            block_ids = np.where(block_ids >= 0, block_ids + block_start, -1).astype(np.int32)
+            best_ids, best_scores = _merge_top_k(
+                np.hstack((best_ids, block_ids)), np.hstack((best_scores, block_top)), candidate_limit
+            )
+        return best_ids, best_scores
+    
+    def _approximate_top_k(self, query_factors, candidate_limit, seen_keys):
+        # Seen products are dropped after the search, so each user asks for that many extra
+        product_index = self.approximate_index()
+        seen_rows = (seen_keys >> SEEN_KEY_SHIFT).astype(np.int64)
+        seen_counts = np.bincount(seen_rows, minlength=len(query_factors))
+        search_width = min(candidate_limit + int(seen_counts.max(initial=0)), len(self.product_names))
+        if len(query_factors) == 0 or search_width == 0:
+            return (
+                np.full((len(query_factors), candidate_limit), -1, dtype=np.int32),
+                np.full((len(query_factors), candidate_limit), np.nan, dtype=np.float32)
+            )
+        
+        found_scores, found_ids = product_index.search(np.ascontiguousarray(query_factors), search_width)
+        found_scores = found_scores.astype(np.float32)
+        found_keys = (
+            (np.arange(len(query_factors), dtype=np.int64)[:, None] << SEEN_KEY_SHIFT)
+            | np.maximum(found_ids, 0).astype(np.int64)
+        )
+        found_scores[(found_ids < 0) | np.isin(found_keys, seen_keys)] = np.nan
+        return _merge_top_k(found_ids.astype(np.int32), found_scores, candidate_limit)
+    
+    def approximate_index(self):
+        # Built on first use from the product factors; inner product matches the exact scores
+        if self._approximate_index is None:
+            with self._index_lock:
+                if self._approximate_index is None:
+                    import faiss
+                    product_index = faiss.IndexHNSWFlat(
+                        max(self.factor_count, 1), FACTOR_INDEX_LINKS, faiss.METRIC_INNER_PRODUCT
+                    )
+                    product_index.hnsw.efSearch = self.search_depth
+                    product_index.add(np.ascontiguousarray(self.product_factors, dtype=np.float32))
+                    self._approximate_index = product_index
+        return self._approximate_index
+
+def _merge_top_k(candidate_ids, candidate_scores, top_k):
+    # Best top_k of already gathered candidates; -1 ids carry NaN scores and are never picked
+    order, top_scores = select_top_k(candidate_scores, top_k)
+    top_ids = np.take_along_axis(candidate_ids, np.maximum(order, 0), axis=1)
+    top_ids[order < 0] = -1
+    return top_ids, top_scores
+
+def select_csr_rows(indptr, rows, *row_values):
+    # (indptr, values...) of CSR-style arrays keeping only the given rows, in that order
+    starts = np.asarray(indptr[rows], dtype=np.int64)
+    lengths = np.asarray(indptr[np.asarray(rows) + 1], dtype=np.int64) - starts
+    selected_indptr = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=selected_indptr[1:])
+    offsets = np.repeat(starts - selected_indptr[:-1], lengths) + np.arange(selected_indptr[-1])
+    return (selected_indptr,) + tuple(np.asarray(values[offsets]) for values in row_values)
+
+def rating_matrix_from_frame(rating_frame):
+    # rating_frame is the notebook's train_table: users x products, NaN when unrated
+    rating_frame = rating_frame.sort_index()
+    user_names = as_fixed_width(rating_frame.index.to_numpy())
+    product_names = as_fixed_width(rating_frame.columns.to_numpy())
+    
+    rating_blocks = []
+    for block_start in range(0, len(user_names), EXPORT_BLOCK_ROWS):
+        block_values = rating_frame.iloc[block_start:block_start + EXPORT_BLOCK_ROWS].to_numpy(dtype=np.float32)
+        rating_blocks.append(sparse.csr_matrix(np.nan_to_num(block_values, nan=0.0)))
+    rating_matrix = sparse.vstack(rating_blocks, format='csr') if rating_blocks else sparse.csr_matrix(
+        (0, len(product_names)), dtype=np.float32
+    )
+    return user_names, product_names, rating_matrix
+
+def select_top_k(score_block, top_k):
+    # Rows are ordered best first; NaN scores are never selected and pad with -1
+    ranking_scores = np.where(np.isnan(score_block), -np.inf, score_block)
+    if top_k < ranking_scores.shape[1]:
+        partitioned = np.argpartition(-ranking_scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        partitioned = np.broadcast_to(
+            np.arange(ranking_scores.shape[1]), ranking_scores.shape
+        )
+    
+    partition_scores = np.take_along_axis(ranking_scores, partitioned, axis=1)
+    order = np.argsort(-partition_scores, axis=1, kind='stable')
+    top_ids = np.take_along_axis(partitioned, order, axis=1).astype(np.int32)
+    top_scores = np.take_along_axis(partition_scores, order, axis=1).astype(np.float32)
+    
+    missing = np.isneginf(top_scores)
+    top_ids[missing] = -1
+    top_scores[missing] = np.nan
+    
+    return top_ids, top_scores
+
+def select_top_n(scores, top_n):
+    # Same order as a stable descending argsort cut to top_n, but only the
+    # selected entries are sorted; NaN scores are never selected
+    ranking_scores = np.where(np.isnan(scores), -np.inf, scores)
+    if top_n <= 0:
+        return np.empty(0, dtype=np.int64)
+    if top_n >= len(ranking_scores):
+        selected = np.flatnonzero(ranking_scores > -np.inf)
+        return selected[np.argsort(-ranking_scores[selected], kind='stable')]
+    
+    threshold = -np.partition(-ranking_scores, top_n - 1)[top_n - 1]
+    selected = np.flatnonzero(ranking_scores > threshold)
+    if threshold > -np.inf:
+        tied = np.flatnonzero(ranking_scores == threshold)[:top_n - len(selected)]
+        selected = np.concatenate((selected, tied))
+    return selected[np.argsort(-ranking_scores[selected], kind='stable')]
+
+def as_fixed_width(values):
+    # Fixed-width unicode keeps name arrays mmap-able, unlike object arrays
+    return np.asarray([str(value) for value in values], dtype=np.str_)
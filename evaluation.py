@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+from candidates import EXPORT_BLOCK_ROWS, select_top_k, as_fixed_width
+from training import build_rating_matrix
+
+DEFAULT_K = 5
+RELEVANCE_THRESHOLD = 4
+DEFAULT_CANDIDATE_LIMIT = 20
+
+def read_test_ratings(test_path):
+    # training.py's test_ratings.csv (one row per review) or the notebook's wide test_table.csv
+    test_frame = pd.read_csv(test_path)
+    if 'reviews_rating' not in test_frame:
+        test_frame = test_frame.set_index(test_frame.columns[0]).rename_axis(
+            index='reviews_username', columns='name'
+        ).stack().rename('reviews_rating').reset_index()
+    return test_frame
+
+class TestRatings:
+    def __init__(self, test_frame, relevance_threshold=RELEVANCE_THRESHOLD):
+        # Rows and columns sorted by name; repeated ratings averaged, as in the notebook's test_table
+        self.user_names, self.product_names, self.rating_matrix = build_rating_matrix(test_frame)
+        self.relevance_threshold = relevance_threshold
+        
+        relevant = self.rating_matrix.copy()
+        relevant.data = (relevant.data >= relevance_threshold).astype(np.int8)
+        relevant.eliminate_zeros()
+        self.relevant_counts = np.diff(relevant.indptr)
+        # Sorted row * width + column keys, so hit lookups are one searchsorted
+        self.relevant_keys = (
+            np.repeat(np.arange(len(self.user_names), dtype=np.int64), self.relevant_counts)
+            * max(len(self.product_names), 1)
+            + relevant.indices
+        )
+    
+    def columns_for(self, product_names):
+        return name_positions(self.product_names, product_names)
+    
+    def hits(self, test_rows, ranked_columns):
+        # ranked_columns holds test product columns per row, -1 where nothing was ranked
+        # or the product never appears in the test set
+        ranked_keys = test_rows[:, None].astype(np.int64) * max(len(self.product_names), 1) + ranked_columns
+        if len(self.relevant_keys) == 0:
+            return np.zeros(ranked_columns.shape, dtype=bool)
+        lookup = np.minimum(np.searchsorted(self.relevant_keys, ranked_keys), len(self.relevant_keys) - 1)
+        return (self.relevant_keys[lookup] == ranked_keys) & (ranked_columns >= 0)
+
+def name_positions(sorted_names, names):
+    # Position of each name in the sorted array, -1 when absent
+    names = np.asarray(names, dtype=np.str_)
+    if len(sorted_names) == 0 or len(names) == 0:
+        return np.full(names.shape, -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_names, names), len(sorted_names) - 1)
+    return np.where(sorted_names[positions] == names, positions, -1)
+
+def ranking_metrics(hits, relevant_counts, k):
+    # hits is users x k, best first. NDCG uses the standard ideal ranking of
+    # min(relevant, k) hits, and users without relevant test items are skipped as in the notebook
+    evaluated = relevant_counts > 0
+    hits = hits[evaluated, :k]
+    relevant_counts = relevant_counts[evaluated]
+    if len(relevant_counts) == 0:
+        return {'users': 0, 'precision': None, 'recall': None, 'ndcg': None}
+    
+    discounts = 1.0 / np.log2(np.arange(k) + 2)
+    hit_counts = hits.sum(axis=1)
+    dcg = hits @ discounts[:hits.shape[1]]
+    ideal_dcg = np.cumsum(discounts)[np.minimum(relevant_counts, k) - 1]
+    return {
+        'users': int(len(relevant_counts)),
+        'precision': float(np.mean(hit_counts / k)),
+        'recall': float(np.mean(hit_counts / relevant_counts)),
+        'ndcg': float(np.mean(dcg / ideal_dcg))
+    }
+
+def evaluate_prediction_frame(prediction_frame, test_ratings, k=DEFAULT_K):
+    # A notebook prediction matrix (item_based_predictions.pkl, user_based_predictions.pkl):
+    # top-k over each user's whole row, and rating errors over every test cell it covers
+    user_order = np.argsort(as_fixed_width(prediction_frame.index.to_numpy()), kind='stable')
+    prediction_users = as_fixed_width(prediction_frame.index.to_numpy())[user_order]
+    prediction_products = as_fixed_width(prediction_frame.columns.to_numpy())
+    product_test_columns = test_ratings.columns_for(prediction_products)
+    
+    test_rows = np.flatnonzero(name_positions(prediction_users, test_ratings.user_names) >= 0)
+    prediction_rows = user_order[name_positions(prediction_users, test_ratings.user_names[test_rows])]
+    predictions = prediction_frame.to_numpy()
+    
+    hits = np.zeros((len(test_rows), k), dtype=bool)
+    for block_start in range(0, len(test_rows), EXPORT_BLOCK_ROWS):
+        block_rows = prediction_rows[block_start:block_start + EXPORT_BLOCK_ROWS]
+        top_ids, _ = select_top_k(predictions[block_rows].astype(np.float64), k)
+        ranked_columns = np.where(top_ids >= 0, product_test_columns[np.maximum(top_ids, 0)], -1)
+        hits[block_start:block_start + EXPORT_BLOCK_ROWS] = test_ratings.hits(
+            test_rows[block_start:block_start + EXPORT_BLOCK_ROWS], _pad_columns(ranked_columns, k)
+        )
+    metrics = ranking_metrics(hits, test_ratings.relevant_counts[test_rows], k)
+    
+    # Rating error over test cells whose user and product the matrix covers
+    test_cells = test_ratings.rating_matrix[test_rows].tocoo()
+    cell_prediction_columns = name_positions(
+        np.sort(prediction_products), test_ratings.product_names[test_cells.col]
+    )
+    product_order = np.argsort(prediction_products, kind='stable')
+    covered = cell_prediction_columns >= 0
+    predicted_ratings = predictions[
+        prediction_rows[test_cells.row[covered]],
+        product_order[cell_prediction_columns[covered]]
+    ].astype(np.float64)
+    rating_errors = predicted_ratings - test_cells.data[covered]
+    metrics.update({
+        'rated_cells': int(covered.sum()),
+        'rmse': float(np.sqrt(np.mean(rating_errors ** 2))) if covered.any() else None,
+        'mae': float(np.mean(np.abs(rating_errors))) if covered.any() else None
+    })
+    return metrics
+
+def training_review_pairs(review_frame, test_frame):
+    # (user, product) pairs of the reviews outside the test split. A pair reviewed in both
+    # splits stays, as the user had already reviewed the product during training
+    pair_columns = ['reviews_username', 'name']
+    review_pairs = review_frame[pair_columns].dropna().astype(str).value_counts()
+    test_pairs = test_frame[pair_columns].dropna().astype(str).value_counts().reindex(
+        review_pairs.index, fill_value=0
+    )
+    return review_pairs.index[(review_pairs - test_pairs).to_numpy() > 0].to_frame(index=False)
+
+def evaluate_engine(engine, test_ratings, k=DEFAULT_K, candidate_limit=DEFAULT_CANDIDATE_LIMIT):
+    # The serving path for every test user: the collaborative ranking on its own, and the
+    # sentiment re-ranked top k that build_recommendation_set returns. The engine should only
+    # treat training reviews as seen (use_seen_reviews), or held-out products are never ranked
+    candidate_generator = engine.collaborative_predictions
+    candidate_test_columns = test_ratings.columns_for(candidate_generator.product_names)
+    index_test_columns = test_ratings.columns_for(engine.product_index.product_names)
+    
+    test_users = test_ratings.user_names.tolist()
+    known_rows = []
+    candidate_hits = []
+    recommendation_hits = []
+    for block_start in range(0, len(test_users), EXPORT_BLOCK_ROWS):
+        block_users = test_users[block_start:block_start + EXPORT_BLOCK_ROWS]
+        known_users, candidate_ids, _ = candidate_generator.candidate_block(block_users, k)
+        block_rows = block_start + np.flatnonzero(known_users)
+        candidate_columns = np.where(candidate_ids >= 0, candidate_test_columns[np.maximum(candidate_ids, 0)], -1)
+        candidate_hits.append(test_ratings.hits(block_rows, _pad_columns(candidate_columns, k)))
+        
+        _, selected_positions, selected_valid = engine.rank_recommendation_positions(
+            block_users, k, candidate_limit
+        )
+        selected_columns = np.where(
+            selected_valid & (selected_positions >= 0),
+            index_test_columns[np.maximum(selected_positions, 0)],
+            -1
+        )
+        recommendation_hits.append(test_ratings.hits(block_rows, _pad_columns(selected_columns, k)))
+        known_rows.append(block_rows)
+    
+    known_rows = np.concatenate(known_rows) if known_rows else np.empty(0, dtype=np.int64)
+    relevant_counts = test_ratings.relevant_counts[known_rows]
+    return {
+        'test_users': len(test_users),
+        'unknown_users': len(test_users) - len(known_rows),
+        'candidate_limit': candidate_limit,
+        'collaborative': ranking_metrics(_stack_hits(candidate_hits, k), relevant_counts, k),
+        'recommendations': ranking_metrics(_stack_hits(recommendation_hits, k), relevant_counts, k)
+    }
+
+def _pad_columns(ranked_columns, k):
+    # Fewer than k candidates leave empty slots, which never count as hits
+    if ranked_columns.shape[1] >= k:
+        return ranked_columns[:, :k]
+    return np.pad(ranked_columns, ((0, 0), (0, k - ranked_columns.shape[1])), constant_values=-1)
+
+def _stack_hits(hit_blocks, k):
+    return np.vstack(hit_blocks) if hit_blocks else np.zeros((0, k), dtype=bool)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Ranking and rating metrics against held-out reviews'
+    )
+    parser.add_argument('--artifacts', default='.')
+    parser.add_argument('--test-ratings', default=None,
+                        help="test_ratings.csv or test_table.csv (default: whichever the artifact directory has)")
+    parser.add_argument('--k', type=int, default=DEFAULT_K)
+    parser.add_argument('--candidate-limit', type=int, default=DEFAULT_CANDIDATE_LIMIT)
+    parser.add_argument('--candidate-model', choices=['precomputed', 'item_neighbours', 'factors'], default=None)
+    parser.add_argument('--threshold', type=float, default=RELEVANCE_THRESHOLD)
+    parser.add_argument('--predictions', nargs='*', default=[],
+                        help='Notebook prediction pickles to evaluate as well, e.g. item_based_predictions.pkl')
+    parser.add_argument('--output', default=None, help='Write the metrics as JSON to this file')
+    arguments = parser.parse_args()
+    
+    test_path = arguments.test_ratings
+    if test_path is None:
+        test_path = os.path.join(arguments.artifacts, 'test_ratings.csv')
+        if not os.path.isfile(test_path):
+            test_path = os.path.join(arguments.artifacts, 'test_table.csv')
+    test_frame = read_test_ratings(test_path)
+    test_ratings = TestRatings(test_frame, arguments.threshold)
+    
+    from model import RecommendationEngine
+    engine = RecommendationEngine(arguments.artifacts, candidate_model=arguments.candidate_model)
+    if engine.product_dataset is None:
+        parser.error('--artifacts must hold source artifacts; bundles do not keep the review dataset')
+    engine.use_seen_reviews(training_review_pairs(engine.product_dataset, test_frame))
+    
+    evaluation_started_at = time.perf_counter()
+    evaluation = {
+        'k': arguments.k,
+        'relevance_threshold': arguments.threshold,
+        'engine': {
+            'candidate_model': engine.candidate_model,
+            'model_version': engine.model_version,
+            **evaluate_engine(engine, test_ratings, arguments.k, arguments.candidate_limit)
+        }
+    }
+    for prediction_path in arguments.predictions:
+        with open(prediction_path, 'rb') as file:
+            prediction_frame = pickle.load(file)
+        evaluation[os.path.basename(prediction_path)] = evaluate_prediction_frame(
+            prediction_frame, test_ratings, arguments.k
+        )
+    evaluation['seconds'] = time.perf_counter() - evaluation_started_at
+    
+    print(json.dumps(evaluation, indent=2))
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(evaluation, file, indent=2)
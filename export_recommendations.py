@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+import multiprocessing
+import pandas as pd
+from model import RecommendationEngine
+
+EXPORT_STATE_FILE = 'export_state.json'
+DEFAULT_SHARD_SIZE = 1000
+
+# Set in the parent before the pool forks so workers share the loaded artifacts
+worker_engine = None
+
+def _initialize_worker(artifact_dir):
+    global worker_engine
+    if worker_engine is None:
+        # Spawned workers reload; bundles are memory-mapped so pages are still shared
+        worker_engine = RecommendationEngine(artifact_dir)
+
+def shard_file_name(shard_number, output_format):
+    return f"part-{shard_number:05d}.{output_format}"
+
+def _write_shard(shard_task):
+    shard_number, usernames, top_n, output_dir, output_format = shard_task
+    recommendation_sets = worker_engine.build_recommendation_sets(usernames, top_n)
+    
+    final_path = os.path.join(output_dir, shard_file_name(shard_number, output_format))
+    partial_path = final_path + '.partial'
+    
+    if output_format == 'jsonl':
+        with open(partial_path, 'w', encoding='utf-8') as file:
+            for username in usernames:
+                file.write(json.dumps({
+                    'username': username,
+                    'recommendations': recommendation_sets[username]
+                }) + '\n')
+    else:
+        shard_rows = [
+            {'username': username, 'rank': rank, **recommendation}
+            for username in usernames
+            for rank, recommendation in enumerate(recommendation_sets[username], start=1)
+        ]
+        pd.DataFrame(shard_rows).to_parquet(partial_path, index=False)
+    
+    # A shard only counts as finished once its file has its final name
+    os.replace(partial_path, final_path)
+    return shard_number, len(usernames)
+
+def _load_or_create_state(output_dir, export_state):
+    state_path = os.path.join(output_dir, EXPORT_STATE_FILE)
+    if os.path.isfile(state_path):
+        with open(state_path) as file:
+            previous_state = json.load(file)
+        if previous_state != export_state:
+            raise ValueError(
+                f"{output_dir} holds an export with different settings "
+                f"({previous_state}); use a new output directory"
+            )
+        return
+    
+    with open(state_path, 'w') as file:
+        json.dump(export_state, file, indent=2)
+
+def export_all_recommendations(artifact_dir, output_dir, top_n=5, output_format='jsonl',
+                               shard_size=DEFAULT_SHARD_SIZE, worker_count=None):
+    global worker_engine
+    
+    if output_format == 'parquet':
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ImportError("Parquet output requires the 'pyarrow' package")
+    
+    worker_engine = RecommendationEngine(artifact_dir)
+    usernames = worker_engine.fetch_user_list()
+    
+    os.makedirs(output_dir, exist_ok=True)
+    _load_or_create_state(output_dir, {
+        'model_version': worker_engine.model_version,
+        'user_count': len(usernames),
+        'top_n': top_n,
+        'shard_size': shard_size,
+        'format': output_format
+    })
+    
+    shard_tasks = []
+    for shard_number, shard_start in enumerate(range(0, len(usernames), shard_size)):
+        if os.path.isfile(os.path.join(output_dir, shard_file_name(shard_number, output_format))):
+            continue
+        shard_tasks.append((
+            shard_number,
+            usernames[shard_start:shard_start + shard_size],
+            top_n,
+            output_dir,
+            output_format
+        ))
+    
+    total_shards = (len(usernames) + shard_size - 1) // shard_size
+    print(f"Exporting {len(usernames)} users in {total_shards} shards "
+          f"({total_shards - len(shard_tasks)} already finished)")
+    
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    pool_context = multiprocessing.get_context(start_method)
+    exported_users = 0
+    started_at = time.perf_counter()
+    
+    with pool_context.Pool(
+        processes=worker_count,
+        initializer=_initialize_worker,
+        initargs=(artifact_dir,)
+    ) as worker_pool:
+        for finished, (shard_number, user_count) in enumerate(
+            worker_pool.imap_unordered(_write_shard, shard_tasks), start=1
+        ):
+            exported_users += user_count
+            elapsed = time.perf_counter() - started_at
+            print(f"[{finished}/{len(shard_tasks)}] shard {shard_number} done - "
+                  f"{exported_users / max(elapsed, 1e-9):,.0f} users/s", flush=True)
+    
+    print(f"Exported {exported_users} users to {output_dir} in "
+          f"{time.perf_counter() - started_at:.1f}s")
+    return exported_users
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Write top-N recommendations for every user to sharded files'
+    )
+    parser.add_argument('--artifacts', default=os.environ.get('RECOMMENDER_ARTIFACT_DIR', '.'))
+    parser.add_argument('--output', default='recommendation_export')
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    arguments = parser.parse_args()
+    
+    try:
+        export_all_recommendations(
+            arguments.artifacts,
+            arguments.output,
+            arguments.top_n,
+            arguments.format,
+            arguments.shard_size,
+            arguments.workers
+        )
+    except (ValueError, ImportError) as export_error:
+        print(f"Export failed: {export_error}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,31 @@
+import os
+import multiprocessing
+
+# Production serving: gunicorn -c gunicorn.conf.py wsgi:application
+bind = os.environ.get('RECOMMENDER_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('RECOMMENDER_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('RECOMMENDER_THREADS', '16'))
+
+# Load artifacts once in the master; workers inherit them through fork
+preload_app = os.environ.get('RECOMMENDER_PRELOAD', '1') != '0'
+
+# A worker that stops heartbeating for this long (a stuck request) is killed and replaced
+timeout = int(os.environ.get('RECOMMENDER_REQUEST_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('RECOMMENDER_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+# Connections accepted per worker and pending in the kernel; beyond that clients wait or fail to connect
+worker_connections = int(os.environ.get('RECOMMENDER_MAX_CONNECTIONS', str(threads * 4)))
+backlog = int(os.environ.get('RECOMMENDER_BACKLOG', '256'))
+
+# Admission control inside each worker: a few requests run, some wait, the rest get 503.
+# Spare threads stay free to reject quickly and to answer health probes
+os.environ.setdefault('RECOMMENDER_MAX_IN_FLIGHT', str(max(1, threads // 4)))
+os.environ.setdefault('RECOMMENDER_MAX_QUEUED', str(max(1, threads // 2)))
+
+accesslog = os.environ.get('RECOMMENDER_ACCESS_LOG')
+
+def post_fork(server, worker):
+    from app import start_artifact_watcher
+    start_artifact_watcher()
@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+import argparse
+import urllib.request
+from itertools import islice
+
+DEFAULT_BATCH_SIZE = 5000
+
+def read_review_batches(jsonl_path, batch_size=DEFAULT_BATCH_SIZE):
+    # Streams the file so memory is bounded by one batch
+    with open(jsonl_path, encoding='utf-8') as file:
+        review_lines = (line for line in file if line.strip())
+        while True:
+            batch = [json.loads(line) for line in islice(review_lines, batch_size)]
+            if not batch:
+                return
+            yield batch
+
+def post_review_batch(ingest_url, review_batch, admin_token):
+    request_body = '\n'.join(json.dumps(review) for review in review_batch).encode('utf-8')
+    ingest_request = urllib.request.Request(
+        ingest_url,
+        data=request_body,
+        method='POST',
+        headers={'Content-Type': 'application/x-ndjson', 'X-Admin-Token': admin_token}
+    )
+    with urllib.request.urlopen(ingest_request) as response:
+        return json.loads(response.read())['ingested']
+
+def ingest_file(jsonl_path, batch_size=DEFAULT_BATCH_SIZE, ingest_url=None,
+                admin_token=None, artifact_dir=None):
+    if ingest_url:
+        ingest_batch = lambda review_batch: post_review_batch(ingest_url, review_batch, admin_token)
+    else:
+        # Local mode: fold reviews into an engine in this process, mainly for measuring throughput
+        from model import RecommendationEngine
+        engine = RecommendationEngine(artifact_dir or '.')
+        ingest_batch = engine.ingest_reviews
+    
+    ingested_total = 0
+    started_at = time.perf_counter()
+    for review_batch in read_review_batches(jsonl_path, batch_size):
+        ingested_total += ingest_batch(review_batch)
+        elapsed = time.perf_counter() - started_at
+        print(f"Ingested {ingested_total} reviews "
+              f"({ingested_total / max(elapsed, 1e-9):,.0f} reviews/s)", flush=True)
+    
+    return ingested_total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Stream new reviews from a JSONL file into the serving engine'
+    )
+    parser.add_argument('reviews', help='JSONL file, one review per line')
+    parser.add_argument('--url', help='Running server, e.g. http://127.0.0.1:5000/admin/reviews')
+    parser.add_argument('--token', default=os.environ.get('RECOMMENDER_ADMIN_TOKEN'))
+    parser.add_argument('--artifacts', default=os.environ.get('RECOMMENDER_ARTIFACT_DIR', '.'))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    arguments = parser.parse_args()
+    
+    if arguments.url and not arguments.token:
+        print("An admin token is required to post reviews to a server", file=sys.stderr)
+        sys.exit(1)
+    
+    ingest_file(
+        arguments.reviews,
+        arguments.batch_size,
+        arguments.url,
+        arguments.token,
+        arguments.artifacts
+    )
@@ -1,133 +1,1030 @@
+import os
+import json
+import time
+import fcntl
 import pickle
+import hashlib
+import threading
 import pandas as pd
 import numpy as np
+from candidates import (
+    DEFAULT_TOP_K, DEFAULT_NEIGHBOUR_COUNT, DEFAULT_FACTOR_COUNT, CandidateStore, ItemNeighbourModel,
+    FactorModel, SeenItemIndex, as_fixed_width, select_top_n
+)
+from artifacts import MANIFEST_FILE, open_bundle
+from user_directory import UserDirectory
+from sentiment_scoring import SentimentScorer
+from text_preprocessing import (
+    ReviewTextCleaner, TextCleanerUnavailable, cleaned_review_texts, load_review_features, text_cleaner_problem
+)
+from observability import metrics_registry, log_sampled, log_event, log_error
 
-# Initialize machine learning models and datasets
-class RecommendationEngine:
-    def __init__(self):
-        self.sentiment_classifier = self._load_pickle_file('logistic_regression_model.pkl')
-        self.text_vectorizer = self._load_pickle_file('tfidf_vectorizer.pkl')
-        self.collaborative_predictions = self._load_pickle_file('item_based_predictions.pkl')
-        self.user_rating_matrix = self._load_pickle_file('user_based_predictions.pkl')
-        self.product_dataset = pd.read_csv('cleaned_reviews_dataset.csv')
+# 'precomputed' serves the notebook's dense item predictions; 'item_neighbours' scores
+# users on demand from sparse ratings and a pruned item-item neighbour list; 'factors'
+# scores them from low-rank user and product factors
+CANDIDATE_MODELS = {
+    'precomputed': CandidateStore,
+    'item_neighbours': ItemNeighbourModel,
+    'factors': FactorModel
+}
+DEFAULT_CANDIDATE_MODEL = 'precomputed'
+
+SOURCE_FILES = {
+    'precomputed': (
+        'logistic_regression_model.pkl',
+        'tfidf_vectorizer.pkl',
+        'item_based_predictions.pkl',
+        'user_based_predictions.pkl',
+        'cleaned_reviews_dataset.csv'
+    ),
+    'item_neighbours': (
+        'logistic_regression_model.pkl',
+        'tfidf_vectorizer.pkl',
+        'train_table.csv',
+        'cleaned_reviews_dataset.csv'
+    ),
+    'factors': (
+        'logistic_regression_model.pkl',
+        'tfidf_vectorizer.pkl',
+        'train_table.csv',
+        'cleaned_reviews_dataset.csv'
+    )
+}
+
+# Cold-start ranking: a blend of review volume, mean rating and positive sentiment.
+# Ratings and sentiment are shrunk towards the catalogue average for thinly reviewed products
+POPULARITY_WEIGHTS = {'volume': 0.2, 'rating': 0.4, 'sentiment': 0.4}
+POPULARITY_PRIOR_REVIEWS = 10
+FALLBACK_SIZE = 20
+
+INGESTION_COLUMNS = (
+    'name', 'reviews_rating', 'combined_reviews', 'reviews_cleaned', 'brand', 'user_sentiment',
+    'reviews_username'
+)
+
+def normalize_review_records(review_records):
+    # Accepts a DataFrame or a list of dicts shaped like rows of cleaned_reviews_dataset.csv
+    review_frame = pd.DataFrame(review_records)
+    if review_frame.empty:
+        return pd.DataFrame(columns=list(INGESTION_COLUMNS))
     
-    def _load_pickle_file(self, filename):
-        with open(filename, 'rb') as file:
-            return pickle.load(file)
+    if 'combined_reviews' not in review_frame:
+        # Same construction as the notebook: title and text joined
+        review_frame['combined_reviews'] = (
+            review_frame.get('reviews_title', pd.Series('', index=review_frame.index)).fillna('')
+            + ' '
+            + review_frame.get('reviews_text', pd.Series('', index=review_frame.index)).fillna('')
+        ).str.strip()
     
-    def fetch_user_list(self, search_term=None):
-        available_users = self.user_rating_matrix.index.tolist()
+    for optional_column in ('reviews_cleaned', 'brand', 'user_sentiment', 'reviews_username'):
+        if optional_column not in review_frame:
+            review_frame[optional_column] = None
+    
+    missing_columns = [
+        column for column in ('name', 'reviews_rating') if column not in review_frame
+    ]
+    if missing_columns:
+        raise ValueError(f"Reviews are missing required fields: {', '.join(missing_columns)}")
+    
+    review_frame['reviews_rating'] = pd.to_numeric(review_frame['reviews_rating'], errors='coerce')
+    invalid_rows = (
+        review_frame['name'].isna()
+        | review_frame['reviews_rating'].isna()
+        | ~review_frame['reviews_rating'].between(1, 5)
+    )
+    if invalid_rows.any():
+        raise ValueError(f"{int(invalid_rows.sum())} reviews have no product name or a rating outside 1-5")
+    
+    review_frame['name'] = review_frame['name'].astype(str)
+    review_frame['combined_reviews'] = review_frame['combined_reviews'].fillna('').astype(str)
+    return review_frame[list(INGESTION_COLUMNS)].reset_index(drop=True)
+
+# Per-product aggregates computed once so request handling is a lookup
+class ProductIndex:
+    FILE_NAMES = {
+        'product_names': 'product_names.npy',
+        'positive_proportion': 'product_positive_proportion.npy',
+        'review_count': 'product_review_count.npy',
+        'mean_rating': 'product_mean_rating.npy',
+        'label_positive_ratio': 'product_label_positive_ratio.npy',
+        'brand_names': 'product_brand_names.npy',
+        'row_offsets': 'product_row_offsets.npy'
+    }
+    
+    def __init__(self, product_names, positive_proportion, review_count, mean_rating,
+                 label_positive_ratio, brand_names, row_offsets, position_lookup=None):
+        self.product_names = product_names
+        self.positive_proportion = positive_proportion
+        self.review_count = review_count
+        self.mean_rating = mean_rating
+        self.label_positive_ratio = label_positive_ratio
+        self.brand_names = brand_names
+        self.row_offsets = row_offsets
+        if position_lookup is None:
+            position_lookup = {
+                name: position for position, name in enumerate(product_names.tolist())
+            }
+        self.position_lookup = position_lookup
+        # Built on first use, so an ingestion batch does not re-sort the whole catalogue
+        self._popularity_ranking = None
+    
+    @property
+    def popularity_order(self):
+        return self.popularity_ranking()[0]
+    
+    @property
+    def fallback_details(self):
+        return self.popularity_ranking()[1]
+    
+    @property
+    def brand_popularity(self):
+        return self.popularity_ranking()[2]
+    
+    def popularity_ranking(self):
+        # Racing threads build the same ranking; the last one stored wins
+        if self._popularity_ranking is None:
+            self._popularity_ranking = self._build_popularity_ranking()
+        return self._popularity_ranking
+    
+    def _build_popularity_ranking(self):
+        review_count = np.asarray(self.review_count, dtype=np.float64)
+        total_reviews = review_count.sum()
+        if total_reviews > 0:
+            catalogue_rating = float(np.dot(review_count, self.mean_rating) / total_reviews)
+            catalogue_sentiment = float(np.dot(review_count, self.positive_proportion) / total_reviews)
+            damped_rating = (
+                review_count * self.mean_rating + POPULARITY_PRIOR_REVIEWS * catalogue_rating
+            ) / (review_count + POPULARITY_PRIOR_REVIEWS)
+            damped_sentiment = (
+                review_count * self.positive_proportion + POPULARITY_PRIOR_REVIEWS * catalogue_sentiment
+            ) / (review_count + POPULARITY_PRIOR_REVIEWS)
+            popularity_scores = (
+                POPULARITY_WEIGHTS['volume'] * np.log1p(review_count) / np.log1p(review_count.max())
+                + POPULARITY_WEIGHTS['rating'] * (damped_rating - 1) / 4
+                + POPULARITY_WEIGHTS['sentiment'] * damped_sentiment
+            )
+        else:
+            popularity_scores = np.zeros(len(review_count))
         
-        if search_term:
-            normalized_search = search_term.lower()
-            available_users = [
-                user for user in available_users 
-                if normalized_search in user.lower()
-            ]
+        popularity_order = np.argsort(-popularity_scores, kind='stable')
+        fallback_details = [
+            self.details_at(position) for position in popularity_order[:FALLBACK_SIZE].tolist()
+        ]
         
-        return sorted(available_users)
+        # Best products per brand, keyed by lower-cased brand name
+        brand_popularity = {}
+        for position in popularity_order.tolist():
+            brand_positions = brand_popularity.setdefault(
+                self.details_brand(position).lower(), []
+            )
+            if len(brand_positions) < FALLBACK_SIZE:
+                brand_positions.append(position)
+        return popularity_order, fallback_details, brand_popularity
     
-    def generate_product_candidates(self, target_user, candidate_limit=20):
-        if target_user not in self.collaborative_predictions.index:
-            print(f"Warning: User '{target_user}' not found in prediction matrix")
-            return pd.Series(dtype=float)
-        
-        user_prediction_scores = self.collaborative_predictions.loc[target_user]
-        filtered_scores = user_prediction_scores.dropna()
+    @staticmethod
+    def review_order(review_frame):
+        # Stable sort keeps each product's reviews in their original order
+        return review_frame['name'].reset_index(drop=True).sort_values(
+            kind='mergesort', na_position='last'
+        ).index.to_numpy()
+    
+    @classmethod
+    def sort_reviews(cls, review_frame):
+        return review_frame.iloc[cls.review_order(review_frame)].reset_index(drop=True)
+    
+    @classmethod
+    def from_reviews(cls, review_frame, sentiment_scorer, review_features=None, text_cleaner=None):
+        # Expects review_frame ordered by sort_reviews so row ranges are contiguous.
+        # The classifier was trained on cleaned text, so that is what gets scored: the persisted
+        # TF-IDF rows when available, otherwise one pass over reviews_cleaned (chunked across
+        # workers if configured)
+        if review_features is not None:
+            positive_probabilities = sentiment_scorer.predict_features(review_features)
+        else:
+            positive_probabilities = sentiment_scorer.score_backfill(
+                cleaned_review_texts(review_frame, text_cleaner)
+            )
         
-        if filtered_scores.empty:
-            print(f"Warning: No valid predictions available for '{target_user}'")
-            return pd.Series(dtype=float)
+        product_summary = pd.DataFrame({
+            'name': review_frame['name'].to_numpy(),
+            'brand': review_frame['brand'].to_numpy(),
+            'is_positive': positive_probabilities > 0.5,
+            'is_labelled_positive': (review_frame['user_sentiment'] == 'Positive').to_numpy(),
+            'reviews_rating': review_frame['reviews_rating'].to_numpy()
+        }).groupby('name', sort=True).agg(
+            positive_proportion=('is_positive', 'mean'),
+            review_count=('is_positive', 'size'),
+            mean_rating=('reviews_rating', 'mean'),
+            label_positive_ratio=('is_labelled_positive', 'mean'),
+            brand=('brand', lambda brands: brands.iloc[0])
+        )
         
-        top_candidates = filtered_scores.sort_values(ascending=False).head(candidate_limit)
+        review_count = product_summary['review_count'].to_numpy(dtype=np.int64)
+        row_offsets = np.zeros(len(review_count) + 1, dtype=np.int64)
+        np.cumsum(review_count, out=row_offsets[1:])
         
-        return top_candidates
+        return cls(
+            product_summary.index.to_numpy(),
+            product_summary['positive_proportion'].to_numpy(dtype=np.float64),
+            review_count,
+            product_summary['mean_rating'].to_numpy(dtype=np.float64),
+            product_summary['label_positive_ratio'].to_numpy(dtype=np.float64),
+            product_summary['brand'].to_numpy(dtype=object),
+            row_offsets
+        )
     
-    def calculate_sentiment_metric(self, product_identifier):
-        product_feedback = self.product_dataset[
-            self.product_dataset['name'] == product_identifier
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        arrays = {
+            field: np.load(os.path.join(directory, file_name), mmap_mode=mmap_mode)
+            for field, file_name in cls.FILE_NAMES.items()
+        }
+        return cls(**arrays)
+    
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for field, file_name in self.FILE_NAMES.items():
+            values = getattr(self, field)
+            if field == 'brand_names':
+                values = as_fixed_width(
+                    brand if pd.notna(brand) else 'N/A' for brand in values
+                )
+            elif field == 'product_names':
+                values = as_fixed_width(values)
+            np.save(os.path.join(directory, file_name), values)
+    
+    def with_new_reviews(self, review_frame, is_positive):
+        # Returns an updated copy; the current index keeps serving until it is swapped out
+        new_product_names = [
+            product_name for product_name in review_frame['name'].drop_duplicates().tolist()
+            if product_name not in self.position_lookup
         ]
+        existing_count = len(self.product_names)
+        product_count = existing_count + len(new_product_names)
+        
+        def extended(values, fill_value, dtype):
+            extended_values = np.full(product_count, fill_value, dtype=dtype)
+            extended_values[:existing_count] = values
+            return extended_values
+        
+        product_names = extended(self.product_names, None, object)
+        product_names[existing_count:] = new_product_names
+        brand_names = extended(self.brand_names, None, object)
+        review_count = extended(self.review_count, 0, np.int64)
+        positive_proportion = extended(self.positive_proportion, 0.0, np.float64)
+        mean_rating = extended(self.mean_rating, 0.0, np.float64)
+        label_positive_ratio = extended(self.label_positive_ratio, 0.0, np.float64)
+        # Ingested products have no rows in product_dataset, so their row ranges are empty
+        row_offsets = np.concatenate([
+            self.row_offsets,
+            np.full(len(new_product_names), self.row_offsets[-1], dtype=np.int64)
+        ])
+        
+        position_lookup = dict(self.position_lookup)
+        for offset, product_name in enumerate(new_product_names):
+            position_lookup[product_name] = existing_count + offset
+        review_positions = np.fromiter(
+            (position_lookup[product_name] for product_name in review_frame['name'].tolist()),
+            dtype=np.int64,
+            count=len(review_frame)
+        )
+        
+        first_brands = review_frame.drop_duplicates('name').set_index('name')['brand']
+        for offset, product_name in enumerate(new_product_names):
+            brand_names[existing_count + offset] = first_brands.get(product_name)
+        
+        # Update running totals so proportions and means stay exact
+        added_count = np.bincount(review_positions, minlength=product_count)
+        updated_count = review_count + added_count
+        safe_count = np.maximum(updated_count, 1)
+        
+        def updated_average(current_average, added_values):
+            added_total = np.bincount(review_positions, weights=added_values, minlength=product_count)
+            return (current_average * review_count + added_total) / safe_count
         
-        if product_feedback.empty:
+        labelled_positive = review_frame['user_sentiment'].fillna('').to_numpy() == 'Positive'
+        has_label = review_frame['user_sentiment'].notna().to_numpy()
+        
+        updated_index = ProductIndex(
+            product_names,
+            updated_average(positive_proportion, is_positive.astype(np.float64)),
+            updated_count,
+            updated_average(mean_rating, review_frame['reviews_rating'].to_numpy(dtype=np.float64)),
+            # Unlabelled reviews count with their predicted sentiment
+            updated_average(
+                label_positive_ratio,
+                np.where(has_label, labelled_positive, is_positive).astype(np.float64)
+            ),
+            brand_names,
+            row_offsets,
+            position_lookup
+        )
+        return updated_index
+    
+    def __len__(self):
+        return len(self.product_names)
+    
+    def __contains__(self, product_name):
+        return product_name in self.position_lookup
+    
+    def locate(self, product_name):
+        return self.position_lookup.get(product_name)
+    
+    def sentiment_for(self, product_name):
+        position = self.position_lookup.get(product_name)
+        if position is None:
             return 0.0
+        return float(self.positive_proportion[position])
+    
+    def row_range(self, product_name):
+        position = self.position_lookup.get(product_name)
+        if position is None:
+            return None
+        return int(self.row_offsets[position]), int(self.row_offsets[position + 1])
+    
+    def details_for(self, product_name):
+        position = self.position_lookup.get(product_name)
+        if position is None:
+            return None
+        return self.details_at(position)
+    
+    def details_brand(self, position):
+        brand_name = self.brand_names[position]
+        return str(brand_name) if pd.notna(brand_name) else 'N/A'
+    
+    def details_at(self, position):
+        return {
+            'product_name': str(self.product_names[position]),
+            'brand': self.details_brand(position),
+            'avg_rating': round(float(self.mean_rating[position]), 2),
+            'positive_ratio': round(float(self.label_positive_ratio[position]) * 100, 1),
+            'total_reviews': int(self.review_count[position])
+        }
+
+# Initialize machine learning models and datasets
+class RecommendationEngine:
+    def __init__(self, artifact_dir='.', candidate_top_k=DEFAULT_TOP_K, verify_checksums=True,
+                 candidate_model=None, neighbour_count=DEFAULT_NEIGHBOUR_COUNT,
+                 factor_count=DEFAULT_FACTOR_COUNT):
+        self.artifact_dir = artifact_dir
+        # Bundles record the model they were exported with; this only applies to source artifacts
+        self.candidate_model = candidate_model or os.environ.get(
+            'RECOMMENDER_CANDIDATE_MODEL', DEFAULT_CANDIDATE_MODEL
+        )
+        self._sentiment_classifier = None
+        self._text_vectorizer = None
+        self._sentiment_scorer = None
+        self._text_cleaner = None
+        # Checked up front so ingestion refuses uncleaned reviews instead of failing mid-batch
+        self.text_cleaner_problem = text_cleaner_problem()
+        self._scorer_lock = threading.Lock()
+        load_started_at = time.perf_counter()
+        
+        if os.path.isfile(os.path.join(artifact_dir, MANIFEST_FILE)):
+            self._load_bundle(verify_checksums)
+        else:
+            self._load_source_artifacts(candidate_top_k, neighbour_count, factor_count)
         
-        text_features = self.text_vectorizer.transform(
-            product_feedback['combined_reviews']
+        self.ingested_review_count = 0
+        self.ingested_batch_count = 0
+        # Bytes of the shared ingest log already folded into this engine
+        self.ingest_log_offset = 0
+        self._ingest_lock = threading.Lock()
+        self.user_directory = UserDirectory(self.known_users)
+        self.collaborative_predictions.seen_items = self.seen_items
+        
+        # Candidate product id -> ProductIndex position, -1 when the product has no reviews
+        self.candidate_product_lookup = {
+            product_name: candidate_id
+            for candidate_id, product_name in enumerate(self.collaborative_predictions.product_names.tolist())
+        }
+        self.candidate_product_positions = np.array([
+            self.product_index.position_lookup.get(product_name, -1)
+            for product_name in self.candidate_product_lookup
+        ], dtype=np.int64)
+        
+        # Ranked at load so the first fallback request does not pay for it
+        self.product_index.popularity_ranking()
+        
+        self.load_seconds = time.perf_counter() - load_started_at
+        metrics_registry.set_gauge('recommender_artifact_load_seconds', self.load_seconds)
+        metrics_registry.increment('recommender_artifact_loads_total')
+        if self.text_cleaner_problem:
+            log_error('text_cleaner_unavailable', artifact_dir=artifact_dir, error=self.text_cleaner_problem)
+    
+    def _load_bundle(self, verify_checksums):
+        # Exported bundle: arrays are memory-mapped and shared between workers
+        manifest = open_bundle(self.artifact_dir, verify_checksums)
+        self.model_version = manifest['bundle_version']
+        self.candidate_model = manifest.get('candidate_model', DEFAULT_CANDIDATE_MODEL)
+        # {'index', 'count'} for a bundle holding one hash partition of the users
+        self.shard = manifest.get('shard')
+        self.collaborative_predictions = CANDIDATE_MODELS[self.candidate_model].load(self.artifact_dir)
+        # Bundles exported before the seen-item index existed still load, without the filter
+        self.seen_items = None
+        if SeenItemIndex.FILE_NAMES['item_ids'] in manifest['files']:
+            self.seen_items = SeenItemIndex.load(self.artifact_dir)
+        # Stores exported with reviewed products already dropped skip the full mask per request
+        if manifest.get('seen_excluded'):
+            self.collaborative_predictions.seen_excluded = True
+        self.known_users = np.load(
+            os.path.join(self.artifact_dir, 'known_users.npy'), mmap_mode='r'
+        )
+        self.product_index = ProductIndex.load(self.artifact_dir)
+        self.product_dataset = None
+    
+    def _load_source_artifacts(self, candidate_top_k, neighbour_count, factor_count):
+        # Notebook pickles and CSV: converted to the compact form at load time
+        if self.candidate_model not in CANDIDATE_MODELS:
+            raise ValueError(f"Unknown candidate model '{self.candidate_model}'")
+        self.model_version = self._source_version()
+        self.shard = None
+        review_frame = pd.read_csv(os.path.join(self.artifact_dir, 'cleaned_reviews_dataset.csv'))
+        review_order = ProductIndex.review_order(review_frame)
+        self.product_dataset = review_frame.iloc[review_order].reset_index(drop=True)
+        # Written by text_preprocessing.py; rows follow the CSV, so they are put in the same order
+        review_features = load_review_features(self.artifact_dir, len(review_frame))
+        if review_features is not None:
+            review_features = review_features[review_order]
+        
+        if self.candidate_model != 'precomputed':
+            # Only the training ratings are needed; the dense prediction pickles are never read
+            candidate_class = CANDIDATE_MODELS[self.candidate_model]
+            if self._has_trained_arrays():
+                # Written by training.py with its own --neighbours / --factors setting
+                self.collaborative_predictions = candidate_class.load(self.artifact_dir, mmap_mode=None)
+            else:
+                self.collaborative_predictions = candidate_class.from_rating_frame(
+                    pd.read_csv(os.path.join(self.artifact_dir, 'train_table.csv'), index_col=0),
+                    neighbour_count if self.candidate_model == 'item_neighbours' else factor_count
+                )
+            self.seen_items = SeenItemIndex.from_reviews(
+                self.product_dataset, self.collaborative_predictions.product_names
+            )
+            self.known_users = self.collaborative_predictions.user_names
+        else:
+            item_predictions = self._load_pickle_file('item_based_predictions.pkl')
+            # As in the notebook's get_top20_recommendations, products the user reviewed are excluded
+            self.seen_items = SeenItemIndex.from_reviews(
+                self.product_dataset, as_fixed_width(item_predictions.columns.to_numpy())
+            )
+            self.collaborative_predictions = CandidateStore.from_prediction_frame(
+                item_predictions,
+                candidate_top_k,
+                self.seen_items
+            )
+            self.known_users = np.sort(
+                self._load_pickle_file('user_based_predictions.pkl').index.to_numpy(dtype=str)
+            )
+        
+        self.product_index = ProductIndex.from_reviews(
+            self.product_dataset,
+            self.sentiment_scorer,
+            review_features
+        )
+    
+    def _has_trained_arrays(self):
+        return self.candidate_model != 'precomputed' and all(
+            os.path.isfile(os.path.join(self.artifact_dir, filename))
+            for filename in CANDIDATE_MODELS[self.candidate_model].FILE_NAMES.values()
+        )
+    
+    def _source_files(self):
+        if self._has_trained_arrays():
+            return tuple(
+                filename for filename in SOURCE_FILES[self.candidate_model] if filename != 'train_table.csv'
+            ) + tuple(CANDIDATE_MODELS[self.candidate_model].FILE_NAMES.values())
+        return SOURCE_FILES[self.candidate_model]
+    
+    def _source_version(self):
+        # Changes whenever any source artifact is replaced, so caches keyed on it go stale
+        file_stamps = []
+        for filename in self._source_files():
+            file_stat = os.stat(os.path.join(self.artifact_dir, filename))
+            file_stamps.append(f"{filename}:{file_stat.st_size}:{file_stat.st_mtime_ns}")
+        stamp_digest = hashlib.sha256('|'.join(file_stamps).encode('utf-8')).hexdigest()
+        return f"source-{stamp_digest[:12]}"
+    
+    @property
+    def sentiment_classifier(self):
+        if self._sentiment_classifier is None:
+            self._sentiment_classifier = self._load_pickle_file('logistic_regression_model.pkl')
+        return self._sentiment_classifier
+    
+    @property
+    def text_vectorizer(self):
+        if self._text_vectorizer is None:
+            self._text_vectorizer = self._load_pickle_file('tfidf_vectorizer.pkl')
+        return self._text_vectorizer
+    
+    @property
+    def sentiment_scorer(self):
+        # Shared by every caller so concurrent scoring requests can be batched together
+        if self._sentiment_scorer is None:
+            with self._scorer_lock:
+                if self._sentiment_scorer is None:
+                    self._sentiment_scorer = SentimentScorer(
+                        self.text_vectorizer, self.sentiment_classifier
+                    )
+        return self._sentiment_scorer
+    
+    @property
+    def text_cleaner(self):
+        # Only needed for reviews that arrive without reviews_cleaned
+        if self._text_cleaner is None:
+            with self._scorer_lock:
+                if self._text_cleaner is None:
+                    self._text_cleaner = ReviewTextCleaner()
+        return self._text_cleaner
+    
+    def _load_pickle_file(self, filename):
+        with open(os.path.join(self.artifact_dir, filename), 'rb') as file:
+            return pickle.load(file)
+    
+    def fetch_user_list(self, search_term=None):
+        matching_users, _ = self.user_directory.search(search_term)
+        return matching_users
+    
+    def search_user_list(self, search_term=None, limit=50, cursor=0):
+        return self.user_directory.search(search_term, limit, cursor)
+    
+    def generate_product_candidates(self, target_user, candidate_limit=20):
+        # Candidate product ids and prediction scores, best first, as plain arrays
+        user_candidates = self.collaborative_predictions.candidates_for(
+            target_user, candidate_limit
         )
         
-        sentiment_predictions = self.sentiment_classifier.predict(text_features)
-        positive_proportion = np.mean(sentiment_predictions == 'Positive')
+        if user_candidates is None:
+            log_sampled('user_not_found', username=target_user)
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        
+        product_ids, prediction_scores = user_candidates
         
-        return positive_proportion
+        if len(product_ids) == 0:
+            log_sampled('no_valid_predictions', username=target_user)
+        
+        return product_ids, prediction_scores
+    
+    def is_known_user(self, username):
+        # Binary search over the candidate users; no per-user work for unknown visitors
+        return username in self.collaborative_predictions
+    
+    def build_fallback_set(self, recommendation_count=5, brand=None):
+        # Popularity ranking for users without collaborative history, precomputed at load
+        # and rebuilt on first use after an ingestion batch
+        product_index = self.product_index
+        # Unknown brands fall back to the global ranking
+        brand_positions = product_index.brand_popularity.get(str(brand).strip().lower()) if brand else None
+        if brand_positions:
+            return [product_index.details_at(position) for position in brand_positions[:recommendation_count]]
+        
+        if recommendation_count <= len(product_index.fallback_details):
+            return product_index.fallback_details[:recommendation_count]
+        return [
+            product_index.details_at(position)
+            for position in product_index.popularity_order[:recommendation_count].tolist()
+        ]
+    
+    def most_active_users(self, user_count):
+        # Known users with the most reviews first: from the review dataset when loaded,
+        # otherwise from the per-user rows of the seen index or the rating matrix
+        if self.product_dataset is not None:
+            review_counts = self.product_dataset['reviews_username'].dropna().astype(str).value_counts()
+            activity_users = as_fixed_width(review_counts.index.to_numpy())
+            activity_counts = review_counts.to_numpy()
+        elif self.seen_items is not None:
+            activity_users = self.seen_items.user_names
+            activity_counts = np.diff(self.seen_items.item_indptr)
+        elif hasattr(self.collaborative_predictions, 'rating_indptr'):
+            activity_users = self.collaborative_predictions.user_names
+            activity_counts = np.diff(self.collaborative_predictions.rating_indptr)
+        else:
+            return []
+        
+        known = self.collaborative_predictions.rows_for(activity_users) >= 0
+        activity_users = activity_users[known]
+        activity_order = np.argsort(-activity_counts[known], kind='stable')[:user_count]
+        return activity_users[activity_order].tolist()
+    
+    def fetch_product_reviews(self, product_name):
+        row_range = self.product_index.row_range(product_name)
+        if row_range is None or self.product_dataset is None:
+            return None
+        return self.product_dataset.iloc[row_range[0]:row_range[1]]
+    
+    def calculate_sentiment_metric(self, product_identifier):
+        return self.product_index.sentiment_for(product_identifier)
     
     def build_recommendation_set(self, username, recommendation_count=5):
         try:
-            candidate_products = self.generate_product_candidates(
-                username, 
-                candidate_limit=20
-            )
+            with metrics_registry.time_stage('candidate_generation', path='single'):
+                candidate_ids, _ = self.generate_product_candidates(
+                    username, 
+                    candidate_limit=20
+                )
             
-            if candidate_products.empty:
-                print(f"No candidate products available for user: {username}")
+            if len(candidate_ids) == 0:
+                log_sampled('no_candidates', username=username)
                 return []
             
-            product_sentiment_map = {}
-            for product_name in candidate_products.index:
-                sentiment_score = self.calculate_sentiment_metric(product_name)
-                product_sentiment_map[product_name] = sentiment_score
-            
-            ranked_products = pd.Series(product_sentiment_map)
-            final_selections = (
-                ranked_products
-                .sort_values(ascending=False)
-                .head(recommendation_count)
-                .index
-                .tolist()
-            )
+            with metrics_registry.time_stage('sentiment_scoring', path='single'):
+                # Positions are read before the index: ingestion swaps the index first
+                product_positions = self.candidate_product_positions[candidate_ids]
+                product_index = self.product_index
+                sentiment_scores = np.where(
+                    product_positions >= 0,
+                    product_index.positive_proportion[np.maximum(product_positions, 0)],
+                    0.0
+                )
+                selected_positions = product_positions[
+                    select_top_n(sentiment_scores, recommendation_count)
+                ]
             
-            detailed_recommendations = []
-            for selected_product in final_selections:
-                product_info = self._extract_product_details(selected_product)
-                if product_info:
-                    detailed_recommendations.append(product_info)
+            with metrics_registry.time_stage('detail_extraction', path='single'):
+                detailed_recommendations = [
+                    product_index.details_at(position)
+                    for position in selected_positions.tolist()
+                    if position >= 0
+                ]
             
-            print(f"Successfully generated {len(detailed_recommendations)} recommendations for {username}")
+            log_sampled(
+                'recommendations_generated',
+                username=username,
+                count=len(detailed_recommendations)
+            )
             return detailed_recommendations
         
         except Exception as error:
-            print(f"Error during recommendation generation for {username}: {error}")
-            import traceback
-            traceback.print_exc()
+            log_error('recommendation_failed', exc_info=True, username=username, error=str(error))
             return []
     
+    def build_recommendation_sets(self, usernames, recommendation_count=5, candidate_limit=20):
+        usernames = list(usernames)
+        known_users, selected_positions, selected_valid = self.rank_recommendation_positions(
+            usernames, recommendation_count, candidate_limit
+        )
+        
+        with metrics_registry.time_stage('detail_extraction', path='batch'):
+            recommendation_sets = {username: [] for username in usernames}
+            known_usernames = [
+                username for username, is_known in zip(usernames, known_users) if is_known
+            ]
+            for username, positions, valid in zip(known_usernames, selected_positions, selected_valid):
+                recommendation_sets[username] = [
+                    self.product_index.details_at(position)
+                    for position in positions[valid & (positions >= 0)].tolist()
+                ]
+        
+        return recommendation_sets
+    
+    def rank_recommendation_positions(self, usernames, recommendation_count=5, candidate_limit=20):
+        # The batch ranking as arrays: known-user mask, then one row of ProductIndex
+        # positions per known user, best first, with a mask of the filled slots
+        with metrics_registry.time_stage('candidate_generation', path='batch'):
+            # Candidates come back best first, so the top slice is the candidate pool
+            known_users, candidate_ids, _ = self.collaborative_predictions.candidate_block(
+                usernames, candidate_limit
+            )
+        
+        with metrics_registry.time_stage('sentiment_scoring', path='batch'):
+            product_positions = np.where(
+                candidate_ids >= 0, self.candidate_product_positions[candidate_ids], -1
+            )
+            sentiment_scores = np.where(
+                product_positions >= 0,
+                self.product_index.positive_proportion[np.maximum(product_positions, 0)],
+                0.0
+            )
+            ranking_scores = np.where(candidate_ids >= 0, sentiment_scores, -np.inf)
+            
+            # Re-rank every user's candidates by sentiment in one pass
+            selection_order = np.argsort(-ranking_scores, axis=1, kind='stable')[:, :recommendation_count]
+            selected_positions = np.take_along_axis(product_positions, selection_order, axis=1)
+            selected_valid = np.take_along_axis(ranking_scores, selection_order, axis=1) > -np.inf
+        
+        return known_users, selected_positions, selected_valid
+    
+    def use_seen_reviews(self, review_frame):
+        # Rebuilds the seen-product filter from review_frame alone, e.g. the training split
+        # for offline evaluation. The precomputed store drops seen products before its top-K
+        # cut, so it is rebuilt from the prediction pickle too
+        if self.product_dataset is None:
+            raise ValueError('Seen reviews can only be replaced on engines loaded from source artifacts')
+        seen_items = SeenItemIndex.from_reviews(review_frame, self.collaborative_predictions.product_names)
+        if self.candidate_model == 'precomputed':
+            self.collaborative_predictions = CandidateStore.from_prediction_frame(
+                self._load_pickle_file('item_based_predictions.pkl'),
+                self.collaborative_predictions.top_k,
+                seen_items
+            )
+        self.seen_items = self.collaborative_predictions.seen_items = seen_items
+    
+    def require_text_cleaner(self, review_frame):
+        # Reviews sent without reviews_cleaned need the NLTK cleaner
+        needs_cleaning = bool(review_frame['reviews_cleaned'].isna().any())
+        if needs_cleaning and self.text_cleaner_problem:
+            raise TextCleanerUnavailable(
+                f"Reviews without reviews_cleaned cannot be ingested: {self.text_cleaner_problem}"
+            )
+        return needs_cleaning
+    
+    def ingest_reviews(self, review_frame):
+        # Classifies only the new reviews and folds them into the product aggregates
+        review_frame = normalize_review_records(review_frame)
+        if review_frame.empty:
+            return 0
+        
+        # Scored outside the lock so concurrent ingestions share one inference batch
+        needs_cleaning = self.require_text_cleaner(review_frame)
+        is_positive = self.sentiment_scorer.score_texts(
+            cleaned_review_texts(review_frame, self.text_cleaner if needs_cleaning else None)
+        ) > 0.5
+        
+        with self._ingest_lock:
+            with metrics_registry.time_stage('review_ingestion', path='ingest'):
+                updated_index = self.product_index.with_new_reviews(review_frame, is_positive)
+                
+                # On-demand models also take the ratings, so the reviewers' own
+                # recommendations change straight away
+                rated_reviews = review_frame[review_frame['reviews_username'].notna()]
+                if hasattr(self.collaborative_predictions, 'record_ratings') and not rated_reviews.empty:
+                    self.collaborative_predictions.record_ratings(
+                        rated_reviews['reviews_username'].astype(str).tolist(),
+                        rated_reviews['name'].tolist(),
+                        rated_reviews['reviews_rating'].tolist()
+                    )
+                
+                # Reviewed products stop being recommended to their reviewer
+                rated_ids = rated_reviews['name'].map(self.candidate_product_lookup)
+                if self.seen_items is not None and rated_ids.notna().any():
+                    self.seen_items.record_items(
+                        rated_reviews['reviews_username'][rated_ids.notna()].astype(str).tolist(),
+                        rated_ids.dropna().astype(np.int64).tolist()
+                    )
+                
+                # Candidate products that had no reviews before may now resolve
+                candidate_product_positions = self.candidate_product_positions.copy()
+                unresolved = np.flatnonzero(candidate_product_positions < 0)
+                candidate_names = self.collaborative_predictions.product_names
+                for candidate_id in unresolved.tolist():
+                    candidate_product_positions[candidate_id] = updated_index.position_lookup.get(
+                        str(candidate_names[candidate_id]), -1
+                    )
+                
+                self.product_index = updated_index
+                self.candidate_product_positions = candidate_product_positions
+                self.ingested_review_count += len(review_frame)
+                # Counted apart from model_version, so a batch does not invalidate every cached result
+                self.ingested_batch_count += 1
+            
+            metrics_registry.increment('recommender_ingested_reviews_total', len(review_frame))
+            return len(review_frame)
+    
+    def validate(self, sample_size=5):
+        # Raises if the loaded artifacts are unusable; also warms lazily built indexes
+        candidate_store = self.collaborative_predictions
+        if len(self.known_users) == 0 or len(candidate_store.user_names) == 0:
+            raise ValueError("Artifacts contain no users")
+        if len(self.product_index) == 0:
+            raise ValueError("Artifacts contain no products")
+        
+        sample_users = candidate_store.user_names[:sample_size].tolist()
+        _, sample_ids, _ = candidate_store.candidate_block(sample_users)
+        if sample_ids.size and int(sample_ids.max()) >= len(candidate_store.product_names):
+            raise ValueError("Candidate ids point outside the candidate product list")
+        
+        sample_sets = self.build_recommendation_sets(sample_users)
+        if not any(sample_sets.values()):
+            raise ValueError("Sample users received no recommendations")
+        
+        self.user_directory.search(sample_users[0][:1], limit=1)
+    
     def _extract_product_details(self, product_name):
-        product_records = self.product_dataset[
-            self.product_dataset['name'] == product_name
-        ]
+        return self.product_index.details_for(product_name)
+
+# Append-only NDJSON file of ingested reviews shared by every worker on the host. Each
+# engine folds in the log from its own offset, so all workers converge on the same reviews
+class ReviewIngestLog:
+    def __init__(self, log_path, replay_batch_size=5000):
+        self.log_path = log_path
+        self.replay_batch_size = replay_batch_size
+        self._apply_lock = threading.Lock()
+    
+    def append(self, review_records):
+        # Validated before writing, so a bad batch never reaches the other workers
+        review_frame = normalize_review_records(review_records)
+        if review_frame.empty:
+            return 0
         
-        if product_records.empty:
-            return None
+        log_lines = review_frame.to_json(orient='records', lines=True).rstrip('\n') + '\n'
+        with open(self.log_path, 'ab') as file:
+            # One locked write per batch keeps lines from concurrent appends whole
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.write(log_lines.encode('utf-8'))
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        return len(review_frame)
+    
+    def catch_up(self, serving_engine):
+        # Returns (reviews applied, usernames of their reviewers)
+        applied_count = 0
+        reviewer_names = set()
+        with self._apply_lock:
+            if not os.path.exists(self.log_path):
+                return applied_count, reviewer_names
+            
+            with open(self.log_path, 'rb') as file:
+                file.seek(serving_engine.ingest_log_offset)
+                while True:
+                    review_batch = []
+                    batch_end = serving_engine.ingest_log_offset
+                    for line in iter(file.readline, b''):
+                        # A line without its newline is still being written
+                        if not line.endswith(b'\n'):
+                            break
+                        batch_end += len(line)
+                        if line.strip():
+                            review_batch.append(json.loads(line))
+                        if len(review_batch) >= self.replay_batch_size:
+                            break
+                    
+                    if review_batch:
+                        applied_count += serving_engine.ingest_reviews(review_batch)
+                        reviewer_names.update(
+                            str(review['reviews_username']) for review in review_batch
+                            if review.get('reviews_username') is not None
+                        )
+                    serving_engine.ingest_log_offset = batch_end
+                    if len(review_batch) < self.replay_batch_size:
+                        return applied_count, reviewer_names
+                    file.seek(batch_end)
+    
+    def follow(self, poll_seconds=1.0, on_applied=None):
+        # on_applied(reviewer usernames) runs after each poll that applied reviews
+        def poll_log():
+            while True:
+                try:
+                    applied_count, reviewer_names = self.catch_up(get_recommendation_system())
+                    if applied_count and on_applied is not None:
+                        on_applied(reviewer_names)
+                except Exception as follow_error:
+                    log_error('ingest_log_follow_failed', log_path=self.log_path, error=str(follow_error))
+                time.sleep(poll_seconds)
         
-        mean_rating = product_records['reviews_rating'].mean()
-        positive_count = (product_records['user_sentiment'] == 'Positive').sum()
-        total_feedback = len(product_records)
-        positive_percentage = (positive_count / total_feedback) * 100
+        follower = threading.Thread(target=poll_log, name='ingest-log-follower', daemon=True)
+        follower.start()
+        return follower
+
+def create_review_ingest_log():
+    log_path = os.environ.get('RECOMMENDER_INGEST_LOG')
+    return ReviewIngestLog(log_path) if log_path else None
+
+review_ingest_log = create_review_ingest_log()
+
+def load_ingested_reviews(serving_engine):
+    # Engines start from the artifacts plus every review in the shared log
+    if review_ingest_log is not None:
+        review_ingest_log.catch_up(serving_engine)
+    return serving_engine
+
+recommendation_system = None
+engine_lock = threading.Lock()
+
+def get_recommendation_system():
+    global recommendation_system
+    if recommendation_system is None:
+        with engine_lock:
+            if recommendation_system is None:
+                recommendation_system = load_ingested_reviews(RecommendationEngine(
+                    os.environ.get('RECOMMENDER_ARTIFACT_DIR', '.')
+                ))
+    return recommendation_system
+
+def is_engine_loaded():
+    return recommendation_system is not None
+
+# Builds replacement engines off the request path and swaps them in atomically
+class EngineReloader:
+    def __init__(self):
+        self.state = 'idle'
+        self.artifact_dir = None
+        self.last_error = None
+        self.last_reload_seconds = None
+        self.last_reloaded_at = None
+        self._reload_lock = threading.Lock()
+    
+    def reload(self, artifact_dir):
+        global recommendation_system
+        if not self._reload_lock.acquire(blocking=False):
+            raise RuntimeError("A reload is already in progress")
+        
+        try:
+            self.state = 'loading'
+            self.artifact_dir = artifact_dir
+            started_at = time.perf_counter()
+            
+            replacement_engine = load_ingested_reviews(RecommendationEngine(artifact_dir))
+            replacement_engine.validate()
+            
+            # Requests already holding the old engine finish on it; new ones see the replacement
+            with engine_lock:
+                recommendation_system = replacement_engine
+            
+            self.state = 'idle'
+            self.last_error = None
+            self.last_reload_seconds = time.perf_counter() - started_at
+            self.last_reloaded_at = time.time()
+            log_event(
+                'artifacts_reloaded',
+                artifact_dir=artifact_dir,
+                model_version=replacement_engine.model_version,
+                seconds=self.last_reload_seconds
+            )
+            return replacement_engine.model_version
+        
+        except Exception as reload_error:
+            self.state = 'failed'
+            self.last_error = str(reload_error)
+            log_error('artifact_reload_failed', artifact_dir=artifact_dir, error=str(reload_error))
+            raise
+        
+        finally:
+            self._reload_lock.release()
+    
+    def reload_in_background(self, artifact_dir):
+        if self._reload_lock.locked():
+            return False
+        
+        def run_reload():
+            try:
+                self.reload(artifact_dir)
+            except Exception:
+                pass
         
-        brand_name = product_records['brand'].iloc[0]
-        brand_display = brand_name if pd.notna(brand_name) else 'N/A'
+        threading.Thread(target=run_reload, name='artifact-reload', daemon=True).start()
+        return True
+    
+    def watch_pointer_file(self, pointer_path, poll_seconds=5.0):
+        # The pointer file holds the artifact directory to serve; rewriting it triggers a reload
+        def poll_pointer():
+            served_dir = None
+            while True:
+                try:
+                    with open(pointer_path) as file:
+                        target_dir = file.read().strip()
+                    if target_dir and target_dir != served_dir:
+                        served_dir = target_dir
+                        if target_dir != get_recommendation_system().artifact_dir:
+                            self.reload(target_dir)
+                except Exception as watch_error:
+                    log_error('artifact_watch_failed', pointer_path=pointer_path, error=str(watch_error))
+                time.sleep(poll_seconds)
         
+        watcher = threading.Thread(target=poll_pointer, name='artifact-watcher', daemon=True)
+        watcher.start()
+        return watcher
+    
+    def status(self):
         return {
-            'product_name': product_name,
-            'brand': brand_display,
-            'avg_rating': round(mean_rating, 2),
-            'positive_ratio': round(positive_percentage, 1),
-            'total_reviews': total_feedback
+            'state': self.state,
+            'artifact_dir': self.artifact_dir,
+            'model_version': get_recommendation_system().model_version,
+            'last_error': self.last_error,
+            'last_reload_seconds': self.last_reload_seconds,
+            'last_reloaded_at': self.last_reloaded_at
         }
 
-recommendation_system = RecommendationEngine()
+engine_reloader = EngineReloader()
 
 def get_recommendations(username, data_file=None, top_n=5):
-    return recommendation_system.build_recommendation_set(username, top_n)
+    return get_recommendation_system().build_recommendation_set(username, top_n)
+
+def get_batch_recommendations(usernames, top_n=5):
+    return get_recommendation_system().build_recommendation_sets(usernames, top_n)
+
+def ingest_reviews(review_records):
+    # Returns (reviews ingested, usernames of the reviewers applied to this worker's engine)
+    serving_engine = get_recommendation_system()
+    if review_ingest_log is None:
+        review_frame = normalize_review_records(review_records)
+        return serving_engine.ingest_reviews(review_frame), set(
+            review_frame['reviews_username'].dropna().astype(str)
+        )
+    
+    # Checked before appending, so the other workers never replay a batch they cannot clean
+    review_frame = normalize_review_records(review_records)
+    serving_engine.require_text_cleaner(review_frame)
+    # Other workers pick the batch up from the log; this one applies it before replying
+    ingested_count = review_ingest_log.append(review_frame)
+    return ingested_count, review_ingest_log.catch_up(serving_engine)[1]
+
+def get_model_version():
+    return get_recommendation_system().model_version
 
 def get_all_users(query=None):
-    return recommendation_system.fetch_user_list(query)
\ No newline at end of file
+    return get_recommendation_system().fetch_user_list(query)
+
+def search_users(query=None, limit=50, cursor=0):
+    return get_recommendation_system().search_user_list(query, limit, cursor)
\ No newline at end of file
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import random
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+LOG_SAMPLE_RATE = float(os.environ.get('RECOMMENDER_LOG_SAMPLE_RATE', '0'))
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+# Process-local metrics rendered in the Prometheus text exposition format
+class MetricsRegistry:
+    def __init__(self):
+        self._descriptions = {}
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_callbacks = []
+        self._lock = threading.Lock()
+    
+    def describe(self, name, metric_type, help_text):
+        self._descriptions[name] = (metric_type, help_text)
+    
+    def observe(self, name, value, **labels):
+        series_key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(series_key)
+            if histogram is None:
+                histogram = self._histograms[series_key] = Histogram()
+            histogram.observe(value)
+    
+    def increment(self, name, amount=1, **labels):
+        series_key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[series_key] = self._counters.get(series_key, 0) + amount
+    
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def register_gauge_callback(self, callback):
+        # callback returns {metric name: value} read at scrape time
+        self._gauge_callbacks.append(callback)
+    
+    @contextmanager
+    def time_stage(self, stage, **labels):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                'recommender_stage_seconds',
+                time.perf_counter() - started_at,
+                stage=stage,
+                **labels
+            )
+    
+    def render(self):
+        with self._lock:
+            histograms = {
+                series_key: (list(histogram.bucket_counts), histogram.total, histogram.count, histogram.buckets)
+                for series_key, histogram in self._histograms.items()
+            }
+            scalar_series = {**self._counters, **self._gauges}
+        
+        for callback in self._gauge_callbacks:
+            try:
+                for name, value in callback().items():
+                    if value is not None:
+                        scalar_series[(name, ())] = value
+            except Exception as collection_error:
+                log_error('metrics_collection_failed', error=str(collection_error))
+        
+        output_lines = []
+        described_names = set()
+        
+        def describe_once(name, default_type):
+            if name in described_names:
+                return
+            described_names.add(name)
+            metric_type, help_text = self._descriptions.get(name, (default_type, name))
+            output_lines.append(f"# HELP {name} {help_text}")
+            output_lines.append(f"# TYPE {name} {metric_type}")
+        
+        for (name, labels), (bucket_counts, total, count, buckets) in sorted(histograms.items()):
+            describe_once(name, 'histogram')
+            cumulative = 0
+            for upper_bound, bucket_count in zip(list(buckets) + ['+Inf'], bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(labels + (('le', str(upper_bound)),))
+                output_lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            output_lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            output_lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        
+        for (name, labels), value in sorted(scalar_series.items()):
+            describe_once(name, 'gauge')
+            output_lines.append(f"{name}{_format_labels(labels)} {value}")
+        
+        return '\n'.join(output_lines) + '\n'
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    formatted = ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        for key, value in labels
+    )
+    return '{' + formatted + '}'
+
+metrics_registry = MetricsRegistry()
+metrics_registry.describe(
+    'recommender_stage_seconds', 'histogram',
+    'Time spent in each recommendation pipeline stage'
+)
+metrics_registry.describe(
+    'recommender_request_seconds', 'histogram',
+    'HTTP request latency by endpoint'
+)
+metrics_registry.describe(
+    'recommender_requests_total', 'counter',
+    'HTTP requests by endpoint and status code'
+)
+metrics_registry.describe(
+    'recommender_artifact_load_seconds', 'gauge',
+    'Time taken to load the most recent set of artifacts'
+)
+metrics_registry.describe(
+    'recommender_artifact_loads_total', 'counter',
+    'Engines built from artifacts, including reloads'
+)
+metrics_registry.describe(
+    'recommender_sentiment_batches_total', 'counter',
+    'Coalesced sentiment inference batches'
+)
+metrics_registry.describe(
+    'recommender_sentiment_texts_total', 'counter',
+    'Review texts scored by coalesced sentiment inference'
+)
+metrics_registry.describe(
+    'recommender_requests_in_flight', 'gauge',
+    'Admitted requests currently running in this process'
+)
+metrics_registry.describe(
+    'recommender_requests_queued', 'gauge',
+    'Requests waiting for an admission slot in this process'
+)
+metrics_registry.describe(
+    'recommender_requests_shed_total', 'counter',
+    'Requests rejected with 503 because the admission queue was full or timed out'
+)
+metrics_registry.describe(
+    'recommender_fallback_responses_total', 'counter',
+    'Unknown users answered with the popularity fallback'
+)
+metrics_registry.describe(
+    'recommender_coalesced_requests_total', 'counter',
+    '/recommend requests answered by an identical request already in flight'
+)
+metrics_registry.describe(
+    'recommender_precomputed_hits_total', 'counter',
+    '/recommend requests answered with a precomputed response'
+)
+metrics_registry.describe(
+    'recommender_precomputed_users', 'gauge',
+    'Most active users with a precomputed /recommend response'
+)
+metrics_registry.describe(
+    'recommender_precomputed_build_seconds', 'gauge',
+    'Time taken to build the precomputed responses for the current model version'
+)
+metrics_registry.describe(
+    'recommender_shard_request_seconds', 'histogram',
+    'Latency of requests the router forwards to each shard'
+)
+metrics_registry.describe(
+    'recommender_shard_errors_total', 'counter',
+    'Forwarded requests that failed to reach a shard'
+)
+for cache_counter in ('hits', 'misses', 'evictions'):
+    metrics_registry.describe(
+        f'recommender_cache_{cache_counter}_total', 'counter',
+        f'Recommendation cache {cache_counter}'
+    )
+
+# Structured logging: sampled for the hot path, unconditional for errors
+structured_logger = logging.getLogger('recommender')
+if not structured_logger.handlers:
+    log_handler = logging.StreamHandler(sys.stderr)
+    log_handler.setFormatter(logging.Formatter('%(message)s'))
+    structured_logger.addHandler(log_handler)
+    structured_logger.setLevel(logging.INFO)
+    structured_logger.propagate = False
+
+def log_sampled(event, **fields):
+    if LOG_SAMPLE_RATE <= 0 or random.random() >= LOG_SAMPLE_RATE:
+        return
+    structured_logger.info(json.dumps({'event': event, **fields}, default=str))
+
+def log_event(event, **fields):
+    # Rare lifecycle events (loads, reloads) are always logged
+    structured_logger.info(json.dumps({'event': event, **fields}, default=str))
+
+def log_error(event, exc_info=False, **fields):
+    structured_logger.error(json.dumps({'event': event, **fields}, default=str), exc_info=exc_info)
@@ -0,0 +1,419 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from observability import log_error
+
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Process-local LRU store; values are serialized bytes so sizes are exact
+class InMemoryCacheBackend:
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            
+            expires_at, payload = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(cache_key)
+                return None
+            
+            self._entries.move_to_end(cache_key)
+            return payload
+    
+    def set(self, cache_key, payload, ttl_seconds=None):
+        entry_bytes = len(cache_key) + len(payload)
+        if entry_bytes > self.max_bytes:
+            return
+        
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            if cache_key in self._entries:
+                self._remove(cache_key)
+            
+            self._entries[cache_key] = (expires_at, payload)
+            self.current_bytes += entry_bytes
+            
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+    
+    def _remove(self, cache_key):
+        _, payload = self._entries.pop(cache_key)
+        self.current_bytes -= len(cache_key) + len(payload)
+    
+    def delete(self, cache_key):
+        with self._lock:
+            if cache_key in self._entries:
+                self._remove(cache_key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def switch_model_version(self, model_version):
+        # Clears the entries when they were written for another model version
+        with self._lock:
+            if model_version == self.model_version:
+                return False
+            self._entries.clear()
+            self.current_bytes = 0
+            self.model_version = model_version
+            return True
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+
+# SQLite file shared by every worker on the host; WAL lets readers run concurrently
+class SQLiteCacheBackend:
+    def __init__(self, database_path, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.database_path = database_path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._local = threading.local()
+        
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS recommendation_cache ('
+            'cache_key TEXT PRIMARY KEY, payload BLOB NOT NULL, '
+            'entry_bytes INTEGER NOT NULL, expires_at REAL, last_access REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS recommendation_cache_access '
+            'ON recommendation_cache (last_access)'
+        )
+        # The model version the stored entries belong to, shared by every worker
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS recommendation_cache_meta ('
+            'name TEXT PRIMARY KEY, value TEXT NOT NULL)'
+        )
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.database_path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+    
+    def get(self, cache_key):
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT payload, expires_at FROM recommendation_cache WHERE cache_key = ?',
+            (cache_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        payload, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            connection.execute('DELETE FROM recommendation_cache WHERE cache_key = ?', (cache_key,))
+            return None
+        
+        connection.execute(
+            'UPDATE recommendation_cache SET last_access = ? WHERE cache_key = ?',
+            (now, cache_key)
+        )
+        return bytes(payload)
+    
+    def set(self, cache_key, payload, ttl_seconds=None):
+        entry_bytes = len(cache_key) + len(payload)
+        if entry_bytes > self.max_bytes:
+            return
+        
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO recommendation_cache '
+            '(cache_key, payload, entry_bytes, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+            (cache_key, payload, entry_bytes, expires_at, now)
+        )
+        
+        total_bytes = connection.execute(
+            'SELECT COALESCE(SUM(entry_bytes), 0) FROM recommendation_cache'
+        ).fetchone()[0]
+        if total_bytes > self.max_bytes:
+            # Drop least recently used rows until the table fits again
+            evicted_rows = connection.execute(
+                'DELETE FROM recommendation_cache WHERE cache_key IN ('
+                ' SELECT cache_key FROM ('
+                '  SELECT cache_key, SUM(entry_bytes) OVER ('
+                '   ORDER BY last_access DESC, cache_key) AS running_bytes'
+                '  FROM recommendation_cache)'
+                ' WHERE running_bytes > ?)',
+                (self.max_bytes,)
+            ).rowcount
+            self.evictions += max(evicted_rows, 0)
+    
+    def delete(self, cache_key):
+        self._connection().execute('DELETE FROM recommendation_cache WHERE cache_key = ?', (cache_key,))
+    
+    def clear(self):
+        self._connection().execute('DELETE FROM recommendation_cache')
+    
+    def switch_model_version(self, model_version):
+        # Clears the entries only when the stored version differs, so a worker starting
+        # up does not throw away what the others already cached for the same model
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                "SELECT value FROM recommendation_cache_meta WHERE name = 'model_version'"
+            ).fetchone()
+            switched = row is None or row[0] != model_version
+            if switched:
+                connection.execute('DELETE FROM recommendation_cache')
+                connection.execute(
+                    "INSERT OR REPLACE INTO recommendation_cache_meta (name, value) VALUES ('model_version', ?)",
+                    (model_version,)
+                )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return switched
+    
+    def stats(self):
+        entries, total_bytes = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(entry_bytes), 0) FROM recommendation_cache'
+        ).fetchone()
+        return {
+            'entries': entries,
+            'bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
+
+# Recommendation results keyed by (username, top_n, model version)
+class RecommendationCache:
+    def __init__(self, backend, ttl_seconds=None):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def build_key(username, top_n, model_version):
+        return json.dumps([model_version, top_n, username])
+    
+    def _track_model_version(self, model_version):
+        # A new model version means the artifacts were reloaded: the backend drops stale
+        # entries unless another process already switched it to this version
+        if model_version != self.model_version:
+            with self._lock:
+                if model_version != self.model_version:
+                    self.backend.switch_model_version(model_version)
+                    self.model_version = model_version
+    
+    def get_or_compute(self, username, top_n, model_version, compute_recommendations):
+        self._track_model_version(model_version)
+        cache_key = self.build_key(username, top_n, model_version)
+        
+        payload = self.backend.get(cache_key)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+            return json.loads(payload)
+        
+        with self._lock:
+            self.misses += 1
+        
+        recommendations = compute_recommendations()
+        # Empty results are not cached; they are cheap and may be transient failures
+        if recommendations:
+            self.backend.set(
+                cache_key,
+                json.dumps(recommendations, separators=(',', ':')).encode('utf-8'),
+                self.ttl_seconds
+            )
+        return recommendations
+    
+    def forget_users(self, usernames, top_n, model_version):
+        # After ingestion: the reviewers' own results change, everyone else's only drift until the TTL
+        for username in usernames:
+            self.backend.delete(self.build_key(username, top_n, model_version))
+    
+    def flush(self):
+        self.backend.clear()
+    
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'model_version': self.model_version,
+            **self.backend.stats()
+        }
+
+# Concurrent calls with the same key share the first caller's computation; results
+# are handed to the callers already waiting and are not kept afterwards
+class SingleFlight:
+    def __init__(self):
+        self.shared_calls = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def run(self, call_key, compute):
+        with self._lock:
+            call = self._calls.get(call_key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[call_key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.shared_calls += 1
+        
+        if not is_leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = compute()
+            return call['result']
+        except Exception as compute_error:
+            call['error'] = compute_error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[call_key]
+            call['done'].set()
+
+def response_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+# Serialized /recommend bodies for the most active users, rebuilt whenever the model version
+# changes and at most every refresh_seconds while ingested reviews arrive
+class PrecomputedResponses:
+    def __init__(self, user_count, recommendation_count, render_body, refresh_seconds=60.0):
+        # render_body(recommendations) returns the response bytes exactly as /recommend sends them
+        self.user_count = user_count
+        self.recommendation_count = recommendation_count
+        self.render_body = render_body
+        self.refresh_seconds = refresh_seconds
+        # (model version, {username: (body, etag)}), swapped as one value
+        self.versioned_responses = (None, {})
+        self.ingested_review_count = 0
+        self.built_at = None
+        self.hits = 0
+        self.build_seconds = None
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+    
+    def is_current(self, serving_engine):
+        if self.versioned_responses[0] != serving_engine.model_version:
+            return False
+        return (
+            self.ingested_review_count == serving_engine.ingested_review_count
+            or time.monotonic() - self.built_at < self.refresh_seconds
+        )
+    
+    def get(self, username, model_version):
+        # (body, etag), or None when the user is not precomputed for this model version
+        responses_version, responses = self.versioned_responses
+        if model_version != responses_version:
+            return None
+        response = responses.get(username)
+        if response is not None:
+            with self._lock:
+                self.hits += 1
+        return response
+    
+    def forget_users(self, usernames):
+        # Reviewers fall back to a normal computation until the next refresh
+        responses_version, responses = self.versioned_responses
+        if any(username in responses for username in usernames):
+            self.versioned_responses = (responses_version, {
+                username: response for username, response in responses.items()
+                if username not in usernames
+            })
+    
+    def refresh(self, serving_engine):
+        with self._refresh_lock:
+            if self.is_current(serving_engine):
+                return False
+            
+            model_version = serving_engine.model_version
+            ingested_review_count = serving_engine.ingested_review_count
+            started_at = time.perf_counter()
+            responses = {}
+            try:
+                recommendation_sets = serving_engine.build_recommendation_sets(
+                    serving_engine.most_active_users(self.user_count), self.recommendation_count
+                )
+                for username, recommendations in recommendation_sets.items():
+                    if recommendations:
+                        body = self.render_body(recommendations)
+                        responses[username] = (body, response_etag(body))
+            except Exception as build_error:
+                # Stored empty, so the version is not retried on every request
+                responses = {}
+                log_error('precomputed_responses_failed', error=str(build_error), model_version=model_version)
+            
+            self.versioned_responses = (model_version, responses)
+            self.ingested_review_count = ingested_review_count
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started_at
+            return True
+    
+    def refresh_in_background(self, serving_engine):
+        # Requests keep being computed normally until the new responses are in place
+        if self._refresh_lock.locked():
+            return False
+        threading.Thread(target=self.refresh, args=(serving_engine,), daemon=True).start()
+        return True
+    
+    def stats(self):
+        responses_version, responses = self.versioned_responses
+        return {
+            'users': len(responses),
+            'hits': self.hits,
+            'model_version': responses_version,
+            'build_seconds': self.build_seconds
+        }
+
+def create_recommendation_cache():
+    # Configured through environment variables so each worker builds the same cache
+    backend_name = os.environ.get('RECOMMENDER_CACHE_BACKEND', 'memory').lower()
+    if backend_name == 'none':
+        return None
+    
+    max_bytes = int(os.environ.get('RECOMMENDER_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES))
+    ttl_setting = os.environ.get('RECOMMENDER_CACHE_TTL_SECONDS')
+    ttl_seconds = float(ttl_setting) if ttl_setting else None
+    
+    if backend_name == 'sqlite':
+        backend = SQLiteCacheBackend(
+            os.environ.get('RECOMMENDER_CACHE_PATH', 'recommendation_cache.sqlite3'),
+            max_bytes
+        )
+    elif backend_name == 'memory':
+        backend = InMemoryCacheBackend(max_bytes)
+    else:
+        raise ValueError(f"Unknown RECOMMENDER_CACHE_BACKEND '{backend_name}'")
+    
+    return RecommendationCache(backend, ttl_seconds)
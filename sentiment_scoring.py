@@ -0,0 +1,133 @@
+import os
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from observability import metrics_registry
+
+POSITIVE_LABEL = 'Positive'
+DEFAULT_MAX_BATCH_TEXTS = 5000
+DEFAULT_BACKFILL_CHUNK_TEXTS = 20000
+BACKFILL_WORKERS = int(os.environ.get('RECOMMENDER_SENTIMENT_WORKERS', '0'))
+BACKFILL_EXECUTOR = os.environ.get('RECOMMENDER_SENTIMENT_EXECUTOR', 'process')
+
+class ScoringRequest:
+    def __init__(self, texts):
+        self.texts = texts
+        self.probabilities = None
+        self.error = None
+        self.done = False
+
+# One vectorizer/classifier pass per batch of review texts. Concurrent callers are
+# coalesced: whichever thread finds the scorer idle scores everything queued so far
+class SentimentScorer:
+    def __init__(self, text_vectorizer, sentiment_classifier,
+                 positive_label=POSITIVE_LABEL, max_batch_texts=DEFAULT_MAX_BATCH_TEXTS):
+        self.text_vectorizer = text_vectorizer
+        self.sentiment_classifier = sentiment_classifier
+        self.positive_label = positive_label
+        self.max_batch_texts = max_batch_texts
+        self.positive_column = list(sentiment_classifier.classes_).index(positive_label)
+        self._pending = []
+        self._scoring = False
+        self._condition = threading.Condition()
+    
+    def predict_positive(self, texts):
+        return self.predict_features(self.text_vectorizer.transform(texts))
+    
+    def predict_features(self, text_features):
+        # Probability of the positive label; above 0.5 is what predict() would label positive
+        return self.sentiment_classifier.predict_proba(text_features)[:, self.positive_column]
+    
+    def score_texts(self, texts):
+        scoring_request = ScoringRequest([str(text) for text in texts])
+        if not scoring_request.texts:
+            return np.empty(0, dtype=np.float64)
+        
+        with self._condition:
+            self._pending.append(scoring_request)
+            while not scoring_request.done:
+                if self._scoring:
+                    self._condition.wait()
+                    continue
+                
+                self._scoring = True
+                scoring_batch = self._take_pending()
+                self._condition.release()
+                try:
+                    self._score_batch(scoring_batch)
+                finally:
+                    self._condition.acquire()
+                    self._scoring = False
+                    self._condition.notify_all()
+        
+        if scoring_request.error is not None:
+            raise scoring_request.error
+        return scoring_request.probabilities
+    
+    def _take_pending(self):
+        # Oldest requests first, capped so one huge batch does not starve everyone else
+        scoring_batch = [self._pending.pop(0)]
+        batch_texts = len(scoring_batch[0].texts)
+        while self._pending and batch_texts + len(self._pending[0].texts) <= self.max_batch_texts:
+            batch_texts += len(self._pending[0].texts)
+            scoring_batch.append(self._pending.pop(0))
+        return scoring_batch
+    
+    def _score_batch(self, scoring_batch):
+        batch_texts = [text for scoring_request in scoring_batch for text in scoring_request.texts]
+        try:
+            with metrics_registry.time_stage('sentiment_inference', path='coalesced'):
+                probabilities = self.predict_positive(batch_texts)
+            metrics_registry.increment('recommender_sentiment_batches_total')
+            metrics_registry.increment('recommender_sentiment_texts_total', len(batch_texts))
+            
+            split_offsets = np.cumsum([len(scoring_request.texts) for scoring_request in scoring_batch])[:-1]
+            for scoring_request, request_probabilities in zip(
+                scoring_batch, np.split(probabilities, split_offsets)
+            ):
+                scoring_request.probabilities = request_probabilities
+        except Exception as scoring_error:
+            for scoring_request in scoring_batch:
+                scoring_request.error = scoring_error
+        finally:
+            for scoring_request in scoring_batch:
+                scoring_request.done = True
+    
+    def score_backfill(self, texts, workers=None, executor=None,
+                       chunk_texts=DEFAULT_BACKFILL_CHUNK_TEXTS):
+        # Whole-dataset scoring; chunks run on a pool when workers > 1
+        workers = BACKFILL_WORKERS if workers is None else workers
+        executor = executor or BACKFILL_EXECUTOR
+        texts = [str(text) for text in texts]
+        if workers <= 1 or len(texts) <= chunk_texts:
+            return self.predict_positive(texts) if texts else np.empty(0, dtype=np.float64)
+        
+        text_chunks = [texts[start:start + chunk_texts] for start in range(0, len(texts), chunk_texts)]
+        with metrics_registry.time_stage('sentiment_inference', path='backfill'):
+            if executor == 'thread':
+                with ThreadPoolExecutor(max_workers=workers) as worker_pool:
+                    chunk_probabilities = list(worker_pool.map(self.predict_positive, text_chunks))
+            elif executor == 'process':
+                # Tokenizing holds the GIL, so processes scale where threads cannot
+                start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context(start_method),
+                    initializer=_initialize_backfill_worker,
+                    initargs=(self.text_vectorizer, self.sentiment_classifier, self.positive_label)
+                ) as worker_pool:
+                    chunk_probabilities = list(worker_pool.map(_score_backfill_chunk, text_chunks))
+            else:
+                raise ValueError(f"Unknown sentiment executor '{executor}'")
+        
+        return np.concatenate(chunk_probabilities)
+
+backfill_scorer = None
+
+def _initialize_backfill_worker(text_vectorizer, sentiment_classifier, positive_label):
+    global backfill_scorer
+    backfill_scorer = SentimentScorer(text_vectorizer, sentiment_classifier, positive_label)
+
+def _score_backfill_chunk(texts):
+    return backfill_scorer.predict_positive(texts)
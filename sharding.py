@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import hashlib
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from observability import metrics_registry
+
+DEFAULT_POOL_SIZE = int(os.environ.get('RECOMMENDER_SHARD_POOL_SIZE', '16'))
+DEFAULT_SHARD_TIMEOUT_SECONDS = float(os.environ.get('RECOMMENDER_SHARD_TIMEOUT_SECONDS', '10'))
+FORWARDED_REQUEST_HEADERS = ('Content-Type', 'If-None-Match')
+FORWARDED_RESPONSE_HEADERS = ('Content-Type', 'ETag', 'Retry-After')
+
+def user_shard(username, shard_count):
+    # Stable across processes and Python versions, unlike hash()
+    user_digest = hashlib.blake2b(str(username).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(user_digest, 'little') % shard_count
+
+def user_shards(usernames, shard_count):
+    return [user_shard(username, shard_count) for username in usernames]
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+# Keep-alive connections to one shard: http://host:port or unix:///path/to.sock
+class ShardConnectionPool:
+    def __init__(self, shard_url, max_idle=DEFAULT_POOL_SIZE, timeout=DEFAULT_SHARD_TIMEOUT_SECONDS):
+        shard_address = urlsplit(shard_url)
+        if shard_address.scheme not in ('http', 'unix'):
+            raise ValueError(f"Shard URL '{shard_url}' must use http:// or unix://")
+        self.shard_url = shard_url
+        self.socket_path = shard_address.path if shard_address.scheme == 'unix' else None
+        self.host = shard_address.hostname
+        self.port = shard_address.port or 80
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle_connections = []
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        if self.socket_path is not None:
+            return UnixHTTPConnection(self.socket_path, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+    
+    def request(self, method, path, body=None, headers=None):
+        # Returns (status, response headers, body bytes)
+        for attempt in range(2):
+            with self._lock:
+                connection = self._idle_connections.pop() if self._idle_connections else None
+            reused = connection is not None
+            if connection is None:
+                connection = self._connect()
+            
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                response_body = response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                # The shard may have closed an idle keep-alive connection; retry once on a new one
+                if reused and attempt == 0:
+                    continue
+                raise
+            
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    if len(self._idle_connections) < self.max_idle:
+                        self._idle_connections.append(connection)
+                        connection = None
+                if connection is not None:
+                    connection.close()
+            return response.status, response.headers, response_body
+    
+    def close(self):
+        with self._lock:
+            idle_connections, self._idle_connections = self._idle_connections, []
+        for connection in idle_connections:
+            connection.close()
+
+# Forwards requests to the shard that owns each user; shard i must serve shard i of the export
+class ShardRouter:
+    def __init__(self, shard_urls, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_SHARD_TIMEOUT_SECONDS):
+        if not shard_urls:
+            raise ValueError('At least one shard URL is required')
+        self.shard_pools = [ShardConnectionPool(shard_url, pool_size, timeout) for shard_url in shard_urls]
+        self._fan_out_pool = None
+        self._fan_out_lock = threading.Lock()
+    
+    @property
+    def shard_count(self):
+        return len(self.shard_pools)
+    
+    def shard_for(self, username):
+        return user_shard(username, self.shard_count)
+    
+    def request(self, shard_index, method, path, body=None, headers=None):
+        started_at = time.perf_counter()
+        try:
+            return self.shard_pools[shard_index].request(method, path, body, headers)
+        except (OSError, http.client.HTTPException):
+            metrics_registry.increment('recommender_shard_errors_total', shard=shard_index)
+            raise
+        finally:
+            metrics_registry.observe(
+                'recommender_shard_request_seconds',
+                time.perf_counter() - started_at,
+                shard=shard_index
+            )
+    
+    def request_json(self, shard_index, method, path, payload=None):
+        # (status, decoded JSON body)
+        status, _, response_body = self.request(
+            shard_index,
+            method,
+            path,
+            json.dumps(payload).encode('utf-8') if payload is not None else None,
+            {'Content-Type': 'application/json'} if payload is not None else None
+        )
+        return status, json.loads(response_body) if response_body else None
+    
+    def map_shards(self, shard_calls):
+        # Runs (shard index, method, path, payload) calls concurrently, results in call order
+        if len(shard_calls) == 1:
+            return [self.request_json(*shard_calls[0])]
+        # Created on first use, so pre-forked workers each start their own threads
+        if self._fan_out_pool is None:
+            with self._fan_out_lock:
+                if self._fan_out_pool is None:
+                    self._fan_out_pool = ThreadPoolExecutor(
+                        max_workers=4 * self.shard_count, thread_name_prefix='shard-fan-out'
+                    )
+        pending_calls = [self._fan_out_pool.submit(self.request_json, *shard_call) for shard_call in shard_calls]
+        return [pending_call.result() for pending_call in pending_calls]
+
+def create_shard_router():
+    # Router mode is enabled by RECOMMENDER_SHARD_URLS, a comma-separated list in shard order
+    shard_urls = [
+        shard_url.strip()
+        for shard_url in os.environ.get('RECOMMENDER_SHARD_URLS', '').split(',')
+        if shard_url.strip()
+    ]
+    return ShardRouter(shard_urls) if shard_urls else None
+
+def read_shard_manifest(bundle_dir):
+    from artifacts import MANIFEST_FILE
+    with open(os.path.join(bundle_dir, MANIFEST_FILE)) as file:
+        return json.load(file).get('shard')
+
+def serve_local_shards(bundle_dirs, socket_dir, bind, workers):
+    # One gunicorn server per shard bundle on a Unix socket, plus the router on bind
+    shard_bundles = {}
+    for bundle_dir in bundle_dirs:
+        shard = read_shard_manifest(bundle_dir)
+        if shard is None:
+            raise ValueError(f"{bundle_dir} is not a shard bundle; export with --shards")
+        shard_bundles[shard['index']] = (os.path.abspath(bundle_dir), shard['count'])
+    shard_count = next(iter(shard_bundles.values()))[1]
+    if sorted(shard_bundles) != list(range(shard_count)):
+        raise ValueError(f"Expected one bundle for each of {shard_count} shards, got shards {sorted(shard_bundles)}")
+    
+    os.makedirs(socket_dir, exist_ok=True)
+    # gunicorn.conf.py and wsgi.py are resolved from the repository directory
+    server_directory = os.path.dirname(os.path.abspath(__file__))
+    server_command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application']
+    server_processes = []
+    shard_urls = []
+    # SIGTERM unwinds like Ctrl-C, so the shard servers are stopped with the launcher
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+    try:
+        for shard_index in range(shard_count):
+            socket_path = os.path.abspath(os.path.join(socket_dir, f"shard-{shard_index}.sock"))
+            shard_urls.append(f"unix://{socket_path}")
+            server_processes.append(subprocess.Popen(server_command, cwd=server_directory, env={
+                **os.environ,
+                'RECOMMENDER_ARTIFACT_DIR': shard_bundles[shard_index][0],
+                'RECOMMENDER_BIND': f"unix:{socket_path}",
+                'RECOMMENDER_WORKERS': str(workers),
+                'RECOMMENDER_SHARD_URLS': ''
+            }))
+        server_processes.append(subprocess.Popen(server_command, cwd=server_directory, env={
+            **os.environ,
+            'RECOMMENDER_BIND': bind,
+            'RECOMMENDER_WORKERS': str(workers),
+            'RECOMMENDER_SHARD_URLS': ','.join(shard_urls)
+        }))
+        print(f"Router on {bind} for {shard_count} shards: {', '.join(shard_urls)}")
+        
+        while all(server_process.poll() is None for server_process in server_processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server_process in server_processes:
+            if server_process.poll() is None:
+                server_process.send_signal(signal.SIGTERM)
+        for server_process in server_processes:
+            server_process.wait()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve shard bundles from artifacts.py --shards behind a router on one machine'
+    )
+    parser.add_argument('bundles', nargs='+', help='Shard bundle directories, in any order')
+    parser.add_argument('--socket-dir', default='shard-sockets')
+    parser.add_argument('--bind', default='127.0.0.1:5000')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers per shard and for the router')
+    arguments = parser.parse_args()
+    
+    serve_local_shards(arguments.bundles, arguments.socket_dir, arguments.bind, arguments.workers)
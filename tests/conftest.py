@@ -0,0 +1,68 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+
+def write_source_artifacts(artifact_dir, user_count=60, product_count=25, review_count=700):
+    # A small stand-in for the notebook's outputs: reviews CSV, TF-IDF and classifier
+    # pickles, item-based prediction frames and the training table
+    sklearn_text = pytest.importorskip('sklearn.feature_extraction.text')
+    sklearn_linear = pytest.importorskip('sklearn.linear_model')
+    generator = np.random.default_rng(0)
+    
+    usernames = np.array([f"user{user_id:03d}" for user_id in range(user_count)])
+    product_names = np.array([f"Product {product_id}" for product_id in range(product_count)])
+    ratings = generator.integers(1, 6, review_count)
+    sentiments = np.where(ratings >= 3, 'Positive', 'Negative')
+    words = {'Positive': ['great', 'love', 'excellent', 'good'], 'Negative': ['bad', 'awful', 'poor', 'broken']}
+    review_texts = [' '.join(generator.choice(words[sentiment], 4)) for sentiment in sentiments]
+    review_products = product_names[generator.zipf(1.5, review_count) % product_count]
+    review_frame = pd.DataFrame({
+        'name': review_products,
+        'brand': [f"Brand {product_name[-1]}" for product_name in review_products],
+        'reviews_username': usernames[generator.integers(0, user_count, review_count)],
+        'reviews_rating': ratings,
+        'user_sentiment': sentiments,
+        'combined_reviews': review_texts,
+        'reviews_cleaned': review_texts
+    })
+    review_frame.to_csv(artifact_dir / 'cleaned_reviews_dataset.csv', index=False)
+    
+    text_vectorizer = sklearn_text.TfidfVectorizer().fit(review_frame['reviews_cleaned'])
+    sentiment_classifier = sklearn_linear.LogisticRegression().fit(
+        text_vectorizer.transform(review_frame['reviews_cleaned']), sentiments
+    )
+    with open(artifact_dir / 'tfidf_vectorizer.pkl', 'wb') as file:
+        pickle.dump(text_vectorizer, file)
+    with open(artifact_dir / 'logistic_regression_model.pkl', 'wb') as file:
+        pickle.dump(sentiment_classifier, file)
+    
+    # The notebook's item-based predictions: ratings times cosine item similarity
+    train_table = review_frame.pivot_table(index='reviews_username', columns='name', values='reviews_rating')
+    filled_ratings = train_table.fillna(0)
+    product_norms = np.linalg.norm(filled_ratings.to_numpy(), axis=0)
+    similarity = filled_ratings.T.dot(filled_ratings) / np.maximum(np.outer(product_norms, product_norms), 1e-12)
+    item_predictions = filled_ratings.dot(similarity) / np.abs(similarity).sum(axis=1)
+    with open(artifact_dir / 'item_based_predictions.pkl', 'wb') as file:
+        pickle.dump(item_predictions, file)
+    with open(artifact_dir / 'user_based_predictions.pkl', 'wb') as file:
+        pickle.dump(item_predictions.copy(), file)
+    train_table.to_csv(artifact_dir / 'train_table.csv')
+    return artifact_dir
+
+@pytest.fixture(scope='session')
+def source_artifact_dir(tmp_path_factory):
+    return write_source_artifacts(tmp_path_factory.mktemp('source'))
+
+@pytest.fixture(scope='session')
+def source_engine(source_artifact_dir):
+    from model import RecommendationEngine
+    return RecommendationEngine(str(source_artifact_dir), candidate_model='precomputed')
+
+@pytest.fixture
+def app_client(source_engine, monkeypatch):
+    # The Flask app serving source_engine, without loading anything from the environment
+    import app
+    import model
+    monkeypatch.setattr(model, 'recommendation_system', source_engine)
+    return app.web_app.test_client()
@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import pytest
+from artifacts import MANIFEST_FILE, ArtifactBundleError, export_bundle, open_bundle, publish_bundle
+from model import ProductIndex, RecommendationEngine
+
+@pytest.fixture(scope='module')
+def bundle_dir(source_artifact_dir, tmp_path_factory):
+    return export_bundle(str(source_artifact_dir), str(tmp_path_factory.mktemp('bundles')))
+
+def copy_bundle(bundle_dir, target_dir):
+    os.makedirs(target_dir)
+    for file_name in os.listdir(bundle_dir):
+        with open(os.path.join(bundle_dir, file_name), 'rb') as source_file:
+            with open(os.path.join(target_dir, file_name), 'wb') as target_file:
+                target_file.write(source_file.read())
+    return str(target_dir)
+
+def flip_last_byte(file_path):
+    # Same size, different content: only the checksum notices
+    with open(file_path, 'r+b') as file:
+        file.seek(-1, os.SEEK_END)
+        last_byte = file.read(1)
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last_byte[0] ^ 0xFF]))
+
+def test_published_bundle_is_named_after_its_content(bundle_dir, source_artifact_dir):
+    manifest = open_bundle(bundle_dir)
+    
+    assert os.path.basename(bundle_dir) == manifest['bundle_version']
+    assert set(manifest['files']) == set(os.listdir(bundle_dir)) - {MANIFEST_FILE}
+    # Exporting the same artifacts again reuses the bundle and leaves no staging directory
+    output_root = os.path.dirname(bundle_dir)
+    assert export_bundle(str(source_artifact_dir), output_root) == bundle_dir
+    assert os.listdir(output_root) == [manifest['bundle_version']]
+
+def test_tampered_files_fail_the_checksum(bundle_dir, tmp_path):
+    tampered_dir = copy_bundle(bundle_dir, tmp_path / 'tampered')
+    flip_last_byte(os.path.join(tampered_dir, 'candidate_scores.npy'))
+    
+    with pytest.raises(ArtifactBundleError, match='candidate_scores.npy'):
+        open_bundle(tampered_dir)
+    with pytest.raises(ArtifactBundleError):
+        RecommendationEngine(tampered_dir)
+    # Skipping checksums still compares sizes
+    assert open_bundle(tampered_dir, verify_checksums=False)
+
+def test_missing_or_truncated_files_fail_without_checksums(bundle_dir, tmp_path):
+    broken_dir = copy_bundle(bundle_dir, tmp_path / 'broken')
+    os.remove(os.path.join(broken_dir, 'known_users.npy'))
+    with open(os.path.join(broken_dir, 'product_review_count.npy'), 'r+b') as file:
+        file.truncate(16)
+    
+    with pytest.raises(ArtifactBundleError, match='known_users.npy, product_review_count.npy'):
+        open_bundle(broken_dir, verify_checksums=False)
+
+def test_unreadable_manifest_is_a_bundle_error(bundle_dir, tmp_path):
+    broken_dir = copy_bundle(bundle_dir, tmp_path / 'broken')
+    with open(os.path.join(broken_dir, MANIFEST_FILE), 'w') as file:
+        file.write('{')
+    
+    with pytest.raises(ArtifactBundleError, match='Unreadable manifest'):
+        open_bundle(broken_dir)
+
+def test_failed_publish_leaves_nothing_behind(source_engine, source_artifact_dir, tmp_path):
+    class FailingGenerator:
+        def save(self, directory):
+            np.save(os.path.join(directory, 'candidate_ids.npy'), np.zeros(3))
+            raise OSError('disk full')
+    
+    with pytest.raises(OSError):
+        publish_bundle(
+            str(source_artifact_dir), str(tmp_path), 'precomputed', FailingGenerator(), None,
+            source_engine.product_index, source_engine.known_users
+        )
+    assert os.listdir(tmp_path) == []
+
+def test_bundle_engine_serves_memory_mapped_arrays(bundle_dir, source_engine):
+    bundle_engine = RecommendationEngine(bundle_dir)
+    
+    assert isinstance(bundle_engine.collaborative_predictions.candidate_ids, np.memmap)
+    assert bundle_engine.product_index.fallback_details == source_engine.product_index.fallback_details
+    for product_name in source_engine.product_index.product_names.tolist():
+        assert bundle_engine.product_index.details_for(product_name) == source_engine.product_index.details_for(product_name)
+
+def test_saved_index_loads_memory_mapped(source_engine, tmp_path):
+    product_index = source_engine.product_index
+    product_index.save(str(tmp_path))
+    loaded_index = ProductIndex.load(str(tmp_path))
+    
+    assert isinstance(loaded_index.review_count, np.memmap)
+    for product_name in product_index.product_names.tolist():
+        assert loaded_index.row_range(product_name) == product_index.row_range(product_name)
@@ -0,0 +1,43 @@
+import pytest
+
+@pytest.mark.parametrize('body', [b'["user000"]', b'"user000"', b'42', b'null', b'{not json', b''])
+def test_bodies_that_are_not_json_objects_get_a_400(app_client, body):
+    response = app_client.post('/recommend/batch', data=body, content_type='application/json')
+    
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'success': False, 'error': "The body must be a JSON object with a 'usernames' list"
+    }
+
+@pytest.mark.parametrize('payload, error', [
+    ({}, "A non-empty 'usernames' list is required"),
+    ({'usernames': []}, "A non-empty 'usernames' list is required"),
+    ({'usernames': 'user000'}, "A non-empty 'usernames' list is required"),
+    ({'usernames': ['user000', '']}, "Every username must be a non-empty string"),
+    ({'usernames': ['user000'], 'top_n': True}, "'top_n' must be a positive integer"),
+    ({'usernames': ['user000'], 'top_n': 0}, "'top_n' must be a positive integer"),
+    ({'usernames': ['user000'], 'top_n': '3'}, "'top_n' must be a positive integer")
+])
+def test_invalid_fields_get_a_400(app_client, payload, error):
+    response = app_client.post('/recommend/batch', json=payload)
+    
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+def test_batches_above_the_limit_get_a_400(app_client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'MAX_BATCH_USERS', 3)
+    response = app_client.post('/recommend/batch', json={'usernames': ['a', 'b', 'c', 'd']})
+    
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'At most 3 usernames can be requested at once'
+
+def test_valid_batch_returns_personal_and_fallback_sets(app_client, source_engine):
+    known_user = source_engine.known_users[0]
+    response = app_client.post('/recommend/batch', json={'usernames': [known_user, 'stranger'], 'top_n': 3})
+    payload = response.get_json()
+    
+    assert response.status_code == 200
+    assert payload['recommendations'][known_user] == source_engine.build_recommendation_set(known_user, 3)
+    assert payload['recommendations']['stranger'] == source_engine.build_fallback_set(3)
+    assert payload['fallback_users'] == ['stranger']
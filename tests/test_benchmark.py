@@ -0,0 +1,49 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+import benchmark
+
+@pytest.fixture(scope='module')
+def synthetic_dir(tmp_path_factory):
+    synthetic_dir = tmp_path_factory.mktemp('synthetic')
+    benchmark.generate_synthetic_artifacts(str(synthetic_dir), user_count=150, product_count=30, review_count=1500, seed=7)
+    return synthetic_dir
+
+def test_synthetic_artifacts_load_and_serve(synthetic_dir):
+    from model import RecommendationEngine
+    engine = RecommendationEngine(str(synthetic_dir), candidate_model='precomputed')
+    review_frame = pd.read_csv(synthetic_dir / 'cleaned_reviews_dataset.csv')
+    
+    assert len(review_frame) == 1500
+    assert len(engine.product_index) == review_frame['name'].nunique()
+    assert engine.build_recommendation_set(engine.known_users[0])
+
+def test_same_seed_gives_the_same_artifacts(synthetic_dir, tmp_path):
+    benchmark.generate_synthetic_artifacts(str(tmp_path), user_count=150, product_count=30, review_count=1500, seed=7)
+    
+    for file_name in ('cleaned_reviews_dataset.csv', 'train_table.csv'):
+        assert (tmp_path / file_name).read_bytes() == (synthetic_dir / file_name).read_bytes()
+
+def test_ranking_microbenchmark_reports_both_methods():
+    ranking_results = benchmark.measure_ranking([50, 400], 20, 5, np.random.default_rng(0))
+    
+    assert sorted(ranking_results) == ['width_400', 'width_50']
+    for width_results in ranking_results.values():
+        assert width_results['pandas_sort']['count'] == width_results['select_top_n']['count'] == 5
+        assert width_results['speedup'] > 0
+
+def test_compare_prints_the_change_of_shared_timings(tmp_path, capsys):
+    baseline = {'commit': 'a', 'engine': {'call': {'p50_ms': 2.0, 'count': 10}}, 'startup': {'load_seconds': 1.0}}
+    candidate = {'commit': 'b', 'engine': {'call': {'p50_ms': 1.0, 'count': 10}}}
+    for name, results in (('baseline', baseline), ('candidate', candidate)):
+        with open(tmp_path / f"{name}.json", 'w') as file:
+            json.dump(results, file)
+    
+    benchmark.compare_results(str(tmp_path / 'baseline.json'), str(tmp_path / 'candidate.json'))
+    
+    printed_lines = capsys.readouterr().out.splitlines()
+    assert len(printed_lines) == 2
+    assert printed_lines[1].split() == ['engine.call.p50_ms', '2.0000', '1.0000', '-50.0%']
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from candidates import CandidateStore
+
+def build_prediction_frame(user_count=40, product_count=30, seed=4):
+    # Unsorted users and some missing predictions, as in the notebook's matrices
+    generator = np.random.default_rng(seed)
+    scores = generator.random((user_count, product_count)) * 5
+    scores[generator.random(scores.shape) < 0.3] = np.nan
+    scores[0] = np.nan
+    user_names = [f"user{user_id:03d}" for user_id in generator.permutation(user_count)]
+    return pd.DataFrame(scores, index=user_names, columns=[f"product{product_id:02d}" for product_id in range(product_count)])
+
+def frame_candidates(prediction_frame, user_name, candidate_limit):
+    # The dense lookup the store replaced
+    top_candidates = prediction_frame.loc[user_name].dropna().sort_values(ascending=False).head(candidate_limit)
+    return top_candidates.index.tolist(), top_candidates.to_numpy()
+
+def test_candidates_match_the_prediction_frame():
+    prediction_frame = build_prediction_frame()
+    candidate_store = CandidateStore.from_prediction_frame(prediction_frame, top_k=20)
+    
+    for user_name in prediction_frame.index.tolist():
+        product_ids, scores = candidate_store.candidates_for(user_name, 20)
+        expected_names, expected_scores = frame_candidates(prediction_frame, user_name, 20)
+        assert candidate_store.product_names[product_ids].tolist() == expected_names
+        assert np.allclose(scores, expected_scores)
+
+def test_smaller_limits_return_a_prefix():
+    prediction_frame = build_prediction_frame()
+    candidate_store = CandidateStore.from_prediction_frame(prediction_frame, top_k=20)
+    user_name = prediction_frame.index[5]
+    
+    product_ids, _ = candidate_store.candidates_for(user_name, 20)
+    limited_ids, _ = candidate_store.candidates_for(user_name, 7)
+    
+    assert limited_ids.tolist() == product_ids[:7].tolist()
+
+def test_users_without_predictions_are_known_but_empty():
+    prediction_frame = build_prediction_frame()
+    candidate_store = CandidateStore.from_prediction_frame(prediction_frame, top_k=20)
+    
+    product_ids, scores = candidate_store.candidates_for(prediction_frame.index[0])
+    assert len(product_ids) == 0 and len(scores) == 0
+    assert candidate_store.candidates_for('nobody') is None
+
+def test_candidate_block_keeps_request_order():
+    prediction_frame = build_prediction_frame()
+    candidate_store = CandidateStore.from_prediction_frame(prediction_frame, top_k=10)
+    user_names = [prediction_frame.index[3], 'nobody', prediction_frame.index[1]]
+    
+    known_users, candidate_ids, candidate_scores = candidate_store.candidate_block(user_names, 5)
+    
+    assert known_users.tolist() == [True, False, True]
+    assert candidate_ids.shape == candidate_scores.shape == (2, 5)
+    assert candidate_ids[1].tolist() == candidate_store.candidates_for(user_names[2], 5)[0].tolist()
+    assert candidate_ids.dtype == np.int32 and candidate_scores.dtype == np.float32
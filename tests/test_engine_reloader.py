@@ -0,0 +1,72 @@
+import time
+import threading
+import pytest
+import model
+from model import EngineReloader, RecommendationEngine
+
+ADMIN_HEADERS = {'X-Admin-Token': 'secret'}
+
+@pytest.fixture
+def serving_engine(source_engine, monkeypatch):
+    monkeypatch.setattr(model, 'recommendation_system', source_engine)
+    return source_engine
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def test_reload_swaps_in_a_new_engine(serving_engine, source_artifact_dir):
+    reloader = EngineReloader()
+    held_engine = model.get_recommendation_system()
+    
+    model_version = reloader.reload(str(source_artifact_dir))
+    
+    replacement_engine = model.get_recommendation_system()
+    assert replacement_engine is not held_engine
+    assert replacement_engine.model_version == model_version
+    # Requests that already held the old engine can still finish on it
+    username = held_engine.known_users[0]
+    assert held_engine.build_recommendation_set(username) == replacement_engine.build_recommendation_set(username)
+    assert reloader.status()['state'] == 'idle'
+
+def test_failed_reload_keeps_serving_the_old_engine(serving_engine, tmp_path):
+    reloader = EngineReloader()
+    
+    with pytest.raises(Exception):
+        reloader.reload(str(tmp_path))
+    
+    assert model.get_recommendation_system() is serving_engine
+    assert reloader.status()['state'] == 'failed'
+    assert reloader.status()['last_error']
+
+def test_only_one_reload_runs_at_a_time(serving_engine, source_artifact_dir, monkeypatch):
+    release = threading.Event()
+    
+    def blocked_load(replacement_engine):
+        release.wait(5)
+        return replacement_engine
+    monkeypatch.setattr(model, 'load_ingested_reviews', blocked_load)
+    reloader = EngineReloader()
+    
+    assert reloader.reload_in_background(str(source_artifact_dir))
+    wait_for(lambda: reloader.state == 'loading')
+    assert not reloader.reload_in_background(str(source_artifact_dir))
+    with pytest.raises(RuntimeError):
+        reloader.reload(str(source_artifact_dir))
+    # The old engine serves until the replacement is ready
+    assert model.get_recommendation_system() is serving_engine
+    
+    release.set()
+    wait_for(lambda: reloader.state == 'idle')
+    assert isinstance(model.get_recommendation_system(), RecommendationEngine)
+    assert model.get_recommendation_system() is not serving_engine
+
+def test_reload_endpoint_checks_the_token_and_directory(app_client, monkeypatch, tmp_path):
+    monkeypatch.setenv('RECOMMENDER_ADMIN_TOKEN', 'secret')
+    
+    assert app_client.post('/admin/reload', json={'artifact_dir': str(tmp_path)}).status_code == 403
+    response = app_client.post('/admin/reload', headers=ADMIN_HEADERS, json={'artifact_dir': str(tmp_path / 'missing')})
+    assert response.status_code == 400
+    assert app_client.get('/admin/reload', headers=ADMIN_HEADERS).get_json()['reload']['state'] in ('idle', 'failed')
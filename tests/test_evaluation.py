@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+import evaluation
+from evaluation import evaluate_prediction_frame, ranking_metrics, read_test_ratings
+
+def notebook_precision_and_recall(pred_matrix, test_matrix, k=5, threshold=4):
+    # The notebook's precision_at_k and recall_at_k loops, sharing one pass
+    precisions = []
+    recalls = []
+    for user in test_matrix.index:
+        if user not in pred_matrix.index:
+            continue
+        actual_items = test_matrix.loc[user]
+        relevant_items = actual_items[actual_items >= threshold].index
+        if len(relevant_items) == 0:
+            continue
+        top_k_items = pred_matrix.loc[user].sort_values(ascending=False).head(k).index
+        hits = len(set(top_k_items).intersection(set(relevant_items)))
+        precisions.append(hits / k)
+        recalls.append(hits / len(relevant_items))
+    return np.mean(precisions), np.mean(recalls)
+
+def build_test_frame(row_count=600, user_count=80, product_count=30, seed=5):
+    generator = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'reviews_username': [f"user{user_id:03d}" for user_id in generator.integers(0, user_count, row_count)],
+        'name': [f"product{product_id:02d}" for product_id in generator.integers(0, product_count, row_count)],
+        'reviews_rating': generator.integers(1, 6, row_count).astype(float)
+    })
+
+def build_prediction_frame(user_count=100, product_count=35, seed=6):
+    # Covers users and products the test split does not have, and misses some it does
+    generator = np.random.default_rng(seed)
+    return pd.DataFrame(
+        generator.random((user_count, product_count)) * 5,
+        index=[f"user{user_id:03d}" for user_id in range(20, 20 + user_count)],
+        columns=[f"product{product_id:02d}" for product_id in range(5, 5 + product_count)]
+    )
+
+def test_precision_and_recall_match_the_notebook():
+    test_frame = build_test_frame()
+    prediction_frame = build_prediction_frame()
+    test_table = test_frame.pivot_table(index='reviews_username', columns='name', values='reviews_rating')
+    
+    metrics = evaluate_prediction_frame(prediction_frame, evaluation.TestRatings(test_frame), k=5)
+    notebook_precision, notebook_recall = notebook_precision_and_recall(prediction_frame, test_table)
+    
+    assert metrics['precision'] == pytest.approx(notebook_precision)
+    assert metrics['recall'] == pytest.approx(notebook_recall)
+
+def test_ndcg_uses_the_ideal_ranking_of_every_relevant_product():
+    # Two relevant products, only one ranked second: the notebook's idcg of the top k
+    # alone would report 1.0
+    hits = np.array([[False, True, False]])
+    metrics = ranking_metrics(hits, np.array([2]), k=3)
+    
+    assert metrics['ndcg'] == pytest.approx((1 / np.log2(3)) / (1 + 1 / np.log2(3)))
+    assert metrics['precision'] == pytest.approx(1 / 3)
+    assert metrics['recall'] == pytest.approx(1 / 2)
+
+def test_users_without_relevant_ratings_are_skipped():
+    hits = np.array([[True, False], [False, False]])
+    metrics = ranking_metrics(hits, np.array([1, 0]), k=2)
+    
+    assert metrics['users'] == 1
+    assert metrics['ndcg'] == pytest.approx(1.0)
+    assert ranking_metrics(hits, np.array([0, 0]), k=2)['precision'] is None
+
+def test_rmse_is_the_square_root_of_the_mean_squared_error():
+    test_frame = pd.DataFrame({
+        'reviews_username': ['amy', 'amy', 'bob', 'bob'],
+        'name': ['p1', 'p2', 'p1', 'p3'],
+        'reviews_rating': [5.0, 1.0, 4.0, 2.0]
+    })
+    # p3 has no prediction column, so bob's rating of it is not scored
+    prediction_frame = pd.DataFrame([[4.0, 4.0], [4.0, 3.0]], index=['amy', 'bob'], columns=['p1', 'p2'])
+    
+    metrics = evaluate_prediction_frame(prediction_frame, evaluation.TestRatings(test_frame), k=2)
+    
+    assert metrics['rated_cells'] == 3
+    assert metrics['rmse'] == pytest.approx(np.sqrt((1 + 9 + 0) / 3))
+    assert metrics['mae'] == pytest.approx(4 / 3)
+
+def test_wide_test_table_reads_as_the_long_ratings(tmp_path):
+    test_frame = build_test_frame(row_count=200)
+    test_table = test_frame.pivot_table(index='reviews_username', columns='name', values='reviews_rating')
+    test_table.to_csv(tmp_path / 'test_table.csv')
+    
+    wide_ratings = evaluation.TestRatings(read_test_ratings(str(tmp_path / 'test_table.csv')))
+    long_ratings = evaluation.TestRatings(test_frame)
+    
+    assert wide_ratings.user_names.tolist() == long_ratings.user_names.tolist()
+    assert wide_ratings.product_names.tolist() == long_ratings.product_names.tolist()
+    assert np.allclose(wide_ratings.rating_matrix.toarray(), long_ratings.rating_matrix.toarray())
+    assert wide_ratings.relevant_counts.tolist() == long_ratings.relevant_counts.tolist()
@@ -0,0 +1,54 @@
+import os
+import json
+import pytest
+from export_recommendations import EXPORT_STATE_FILE, export_all_recommendations, shard_file_name
+
+SHARD_SIZE = 25
+
+def read_export(output_dir):
+    exported = {}
+    for file_name in sorted(os.listdir(output_dir)):
+        if file_name.endswith('.jsonl'):
+            with open(os.path.join(output_dir, file_name), encoding='utf-8') as file:
+                for line in file:
+                    record = json.loads(line)
+                    exported[record['username']] = record['recommendations']
+    return exported
+
+def test_export_writes_every_user_once(source_engine, source_artifact_dir, tmp_path):
+    exported_users = export_all_recommendations(str(source_artifact_dir), str(tmp_path), shard_size=SHARD_SIZE, worker_count=2)
+    
+    usernames = source_engine.fetch_user_list()
+    exported = read_export(tmp_path)
+    assert exported_users == len(usernames)
+    assert sorted(exported) == sorted(usernames)
+    assert exported == json.loads(json.dumps(source_engine.build_recommendation_sets(usernames, 5)))
+    assert not [file_name for file_name in os.listdir(tmp_path) if file_name.endswith('.partial')]
+
+def test_rerun_finishes_only_the_missing_shards(source_artifact_dir, tmp_path):
+    export_all_recommendations(str(source_artifact_dir), str(tmp_path), shard_size=SHARD_SIZE, worker_count=1)
+    finished_path = tmp_path / shard_file_name(0, 'jsonl')
+    interrupted_path = tmp_path / shard_file_name(1, 'jsonl')
+    
+    # Shard 1 was cut off mid-write: only its .partial file exists
+    complete_shard = interrupted_path.read_text(encoding='utf-8')
+    interrupted_path.rename(str(interrupted_path) + '.partial')
+    (tmp_path / (interrupted_path.name + '.partial')).write_text(complete_shard[:40], encoding='utf-8')
+    finished_path.write_text(finished_path.read_text(encoding='utf-8') + '\n', encoding='utf-8')
+    
+    exported_users = export_all_recommendations(str(source_artifact_dir), str(tmp_path), shard_size=SHARD_SIZE, worker_count=1)
+    
+    assert exported_users == SHARD_SIZE
+    assert interrupted_path.read_text(encoding='utf-8') == complete_shard
+    assert not os.path.exists(str(interrupted_path) + '.partial')
+    # Finished shards are not rewritten
+    assert finished_path.read_text(encoding='utf-8').endswith('\n\n')
+
+def test_rerun_with_other_settings_is_refused(source_artifact_dir, tmp_path):
+    export_all_recommendations(str(source_artifact_dir), str(tmp_path), shard_size=SHARD_SIZE, worker_count=1)
+    with open(tmp_path / EXPORT_STATE_FILE) as file:
+        export_state = json.load(file)
+    
+    with pytest.raises(ValueError, match='different settings'):
+        export_all_recommendations(str(source_artifact_dir), str(tmp_path), top_n=3, shard_size=SHARD_SIZE, worker_count=1)
+    assert export_state['top_n'] == 5 and export_state['shard_size'] == SHARD_SIZE
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from candidates import FactorModel, SeenItemIndex, as_fixed_width
+
+def build_factor_model(user_count=40, product_count=60, factor_count=8):
+    generator = np.random.default_rng(7)
+    ratings = sparse.random(
+        user_count, product_count, density=0.2, random_state=7,
+        data_rvs=lambda size: generator.integers(1, 6, size)
+    ).tocsr()
+    return FactorModel.from_rating_matrix(
+        as_fixed_width(np.array([f"user{row:03d}" for row in range(user_count)])),
+        as_fixed_width(np.array([f"product{column:03d}" for column in range(product_count)])),
+        ratings,
+        factor_count
+    )
+
+def test_explicit_zero_limit_returns_no_candidates():
+    factor_model = build_factor_model()
+    known_users, candidate_ids, candidate_scores = factor_model.candidate_block(['user000'], 0)
+    
+    assert known_users.tolist() == [True]
+    assert candidate_ids.shape == (1, 0)
+    assert candidate_scores.shape == (1, 0)
+
+def test_index_settings_are_read_per_model(monkeypatch):
+    monkeypatch.setenv('RECOMMENDER_FACTOR_INDEX', 'hnsw')
+    monkeypatch.setenv('RECOMMENDER_FACTOR_SEARCH_DEPTH', '16')
+    factor_model = build_factor_model()
+    assert (factor_model.index_type, factor_model.search_depth) == ('hnsw', 16)
+    
+    monkeypatch.setenv('RECOMMENDER_FACTOR_INDEX', 'annoy')
+    with pytest.raises(ValueError):
+        build_factor_model()
+
+def test_exact_top_k_drops_seen_products():
+    factor_model = build_factor_model()
+    user_names = ['user000', 'user001']
+    factor_model.seen_items = SeenItemIndex(
+        as_fixed_width(np.array(user_names)),
+        np.array([0, 2, 3], dtype=np.int64),
+        np.array([4, 9, 11], dtype=np.int32)
+    )
+    _, candidate_ids, _ = factor_model.candidate_block(user_names, 60)
+    
+    assert not {4, 9} & set(candidate_ids[0].tolist())
+    assert 11 not in candidate_ids[1].tolist()
+    assert (candidate_ids[0] >= 0).sum() == 58
+
+def test_approximate_top_k_matches_exact_on_a_small_model(monkeypatch):
+    pytest.importorskip('faiss')
+    monkeypatch.setenv('RECOMMENDER_FACTOR_SEARCH_DEPTH', '256')
+    factor_model = build_factor_model()
+    user_names = [f"user{row:03d}" for row in range(40)]
+    factor_model.seen_items = SeenItemIndex(
+        as_fixed_width(np.array(user_names[:2])),
+        np.array([0, 2, 3], dtype=np.int64),
+        np.array([4, 9, 11], dtype=np.int32)
+    )
+    query_factors = np.asarray(factor_model.user_factors, dtype=np.float32)
+    seen_keys = factor_model.seen_items.seen_keys(user_names)
+    
+    exact_ids, exact_scores = factor_model._exact_top_k(query_factors, 10, seen_keys)
+    approximate_ids, approximate_scores = factor_model._approximate_top_k(query_factors, 10, seen_keys)
+    
+    # With a search depth above the product count HNSW visits every product
+    assert np.array_equal(np.sort(approximate_ids, axis=1), np.sort(exact_ids, axis=1))
+    np.testing.assert_allclose(approximate_scores, exact_scores, rtol=1e-5, atol=1e-5)
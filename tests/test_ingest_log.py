@@ -0,0 +1,55 @@
+import pytest
+from model import ReviewIngestLog
+
+# Records what the log hands to the engine
+class RecordingEngine:
+    def __init__(self):
+        self.ingest_log_offset = 0
+        self.batches = []
+    
+    def ingest_reviews(self, review_batch):
+        self.batches.append(review_batch)
+        return len(review_batch)
+
+def review(product_name, username=None):
+    return {'name': product_name, 'reviews_rating': 4, 'reviews_cleaned': 'good', 'reviews_username': username}
+
+def test_every_engine_replays_the_same_reviews(tmp_path):
+    review_log = ReviewIngestLog(str(tmp_path / 'reviews.jsonl'), replay_batch_size=2)
+    assert review_log.append([review('p1', 'amy'), review('p2')]) == 2
+    assert review_log.append([review('p3', 'bob')]) == 1
+    
+    first_engine, second_engine = RecordingEngine(), RecordingEngine()
+    assert review_log.catch_up(first_engine) == (3, {'amy', 'bob'})
+    assert [len(batch) for batch in first_engine.batches] == [2, 1]
+    assert review_log.catch_up(second_engine)[0] == 3
+    assert first_engine.batches == second_engine.batches
+    assert [entry['name'] for batch in first_engine.batches for entry in batch] == ['p1', 'p2', 'p3']
+    
+    # Caught-up engines only see what was appended since
+    review_log.append([review('p4')])
+    assert review_log.catch_up(first_engine) == (1, set())
+    assert review_log.catch_up(first_engine) == (0, set())
+
+def test_partly_written_lines_wait_for_their_newline(tmp_path):
+    log_path = tmp_path / 'reviews.jsonl'
+    review_log = ReviewIngestLog(str(log_path))
+    review_log.append([review('p1')])
+    with open(log_path, 'ab') as file:
+        file.write(b'{"name": "p2", "reviews_rating": 5')
+    
+    serving_engine = RecordingEngine()
+    assert review_log.catch_up(serving_engine)[0] == 1
+    with open(log_path, 'ab') as file:
+        file.write(b'}\n')
+    assert review_log.catch_up(serving_engine)[0] == 1
+    assert serving_engine.batches[1][0]['name'] == 'p2'
+
+def test_invalid_batches_are_not_logged(tmp_path):
+    log_path = tmp_path / 'reviews.jsonl'
+    review_log = ReviewIngestLog(str(log_path))
+    
+    with pytest.raises(ValueError):
+        review_log.append([{'name': 'p1', 'reviews_rating': 9}])
+    assert not log_path.exists()
+    assert review_log.catch_up(RecordingEngine()) == (0, set())
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from candidates import ItemNeighbourModel
+
+@pytest.fixture(scope='module')
+def train_table(source_artifact_dir):
+    return pd.read_csv(source_artifact_dir / 'train_table.csv', index_col=0).sort_index()
+
+def dense_predictions(train_table):
+    # The notebook's item-based scores: ratings times cosine item similarity
+    filled_ratings = train_table.fillna(0).to_numpy()
+    product_norms = np.linalg.norm(filled_ratings, axis=0)
+    similarity = filled_ratings.T @ filled_ratings / np.maximum(np.outer(product_norms, product_norms), 1e-12)
+    return filled_ratings @ similarity / np.abs(similarity).sum(axis=1), similarity
+
+def score_matrix(item_model, user_names):
+    known_users, candidate_ids, candidate_scores = item_model.candidate_block(user_names)
+    scores = np.zeros((len(user_names), len(item_model.product_names)))
+    for block_row, user_row in enumerate(np.flatnonzero(known_users)):
+        valid = candidate_ids[block_row] >= 0
+        scores[user_row, candidate_ids[block_row][valid]] = candidate_scores[block_row][valid]
+    return known_users, scores
+
+def test_scores_match_the_dense_item_based_predictions(train_table):
+    item_model = ItemNeighbourModel.from_rating_frame(train_table, neighbour_count=len(train_table.columns))
+    expected_scores, _ = dense_predictions(train_table)
+    
+    known_users, scores = score_matrix(item_model, train_table.index.tolist())
+    
+    assert known_users.all()
+    assert np.allclose(scores, expected_scores, atol=1e-5)
+
+def test_pruned_neighbours_are_the_strongest_similarities(train_table):
+    item_model = ItemNeighbourModel.from_rating_frame(train_table, neighbour_count=3)
+    _, similarity = dense_predictions(train_table)
+    
+    assert item_model.neighbour_count == 3
+    for product_id in range(len(item_model.product_names)):
+        row_start, row_stop = item_model.neighbour_indptr[product_id], item_model.neighbour_indptr[product_id + 1]
+        kept_weights = np.sort(item_model.neighbour_weights[row_start:row_stop])[::-1]
+        assert np.allclose(kept_weights, np.sort(similarity[product_id])[::-1][:3], atol=1e-5)
+    # Totals still use every similarity, so kept scores are not inflated
+    assert np.allclose(item_model.similarity_totals, np.abs(similarity).sum(axis=1))
+
+def test_recorded_ratings_score_straight_away(train_table):
+    item_model = ItemNeighbourModel.from_rating_frame(train_table, neighbour_count=len(train_table.columns))
+    _, similarity = dense_predictions(train_table)
+    product_name = train_table.columns[4]
+    
+    assert item_model.candidates_for('new visitor') is None
+    assert item_model.record_ratings(['new visitor', 'new visitor'], [product_name, 'Unknown product'], [5, 4]) == 1
+    
+    _, scores = score_matrix(item_model, ['new visitor'])
+    assert np.allclose(scores[0], 5 * similarity[4] / np.abs(similarity).sum(axis=1), atol=1e-5)
+
+def test_saved_model_loads_with_the_same_candidates(train_table, tmp_path):
+    item_model = ItemNeighbourModel.from_rating_frame(train_table, neighbour_count=5)
+    item_model.save(str(tmp_path))
+    loaded_model = ItemNeighbourModel.load(str(tmp_path))
+    user_names = train_table.index.tolist()
+    
+    for original, loaded in zip(item_model.candidate_block(user_names, 10), loaded_model.candidate_block(user_names, 10)):
+        assert np.array_equal(original, loaded, equal_nan=True)
@@ -0,0 +1,58 @@
+import model
+from observability import MetricsRegistry
+
+def test_histograms_render_cumulative_buckets():
+    metrics = MetricsRegistry()
+    metrics.describe('stage_seconds', 'histogram', 'Stage latency')
+    for value in (0.0002, 0.003, 0.003, 10.0):
+        metrics.observe('stage_seconds', value, stage='scoring')
+    
+    rendered = metrics.render().splitlines()
+    
+    assert rendered[:2] == ['# HELP stage_seconds Stage latency', '# TYPE stage_seconds histogram']
+    assert 'stage_seconds_bucket{stage="scoring",le="0.00025"} 1' in rendered
+    assert 'stage_seconds_bucket{stage="scoring",le="0.005"} 3' in rendered
+    assert 'stage_seconds_bucket{stage="scoring",le="5.0"} 3' in rendered
+    assert 'stage_seconds_bucket{stage="scoring",le="+Inf"} 4' in rendered
+    assert 'stage_seconds_count{stage="scoring"} 4' in rendered
+
+def test_counters_gauges_and_label_escaping():
+    metrics = MetricsRegistry()
+    metrics.increment('requests_total', endpoint='recommend', status=200)
+    metrics.increment('requests_total', 2, endpoint='recommend', status=200)
+    metrics.set_gauge('load_seconds', 1.5)
+    metrics.increment('errors_total', reason='say "hi"\n')
+    
+    rendered = metrics.render().splitlines()
+    
+    assert 'requests_total{endpoint="recommend",status="200"} 3' in rendered
+    assert 'load_seconds 1.5' in rendered
+    assert 'errors_total{reason="say \\"hi\\"\\n"} 1' in rendered
+    assert rendered.count('# TYPE requests_total gauge') == 1
+
+def test_failing_gauge_callbacks_do_not_break_the_scrape():
+    metrics = MetricsRegistry()
+    metrics.register_gauge_callback(lambda: {'cache_entries': 3, 'unset': None})
+    metrics.register_gauge_callback(lambda: 1 / 0)
+    
+    rendered = metrics.render().splitlines()
+    
+    assert 'cache_entries 3' in rendered
+    assert not [line for line in rendered if line.startswith('unset')]
+
+def test_metrics_endpoint_reports_requests_and_stages(app_client, source_engine):
+    app_client.post('/recommend', json={'username': source_engine.known_users[0]})
+    
+    response = app_client.get('/metrics')
+    rendered = response.get_data(as_text=True)
+    
+    assert response.mimetype == 'text/plain'
+    assert 'recommender_requests_total{endpoint="handle_recommendation_request",status="200"}' in rendered
+    assert 'recommender_stage_seconds_count{path="single",stage="candidate_generation"}' in rendered
+
+def test_probes_report_the_loaded_engine(app_client, source_engine, monkeypatch):
+    assert app_client.get('/healthz').get_json() == {'status': 'alive'}
+    assert app_client.get('/readyz').get_json()['model_version'] == source_engine.model_version
+    
+    monkeypatch.setattr(model, 'recommendation_system', None)
+    assert app_client.get('/readyz').status_code == 503
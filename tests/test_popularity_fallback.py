@@ -0,0 +1,56 @@
+import numpy as np
+from model import ProductIndex
+
+def build_product_index(review_count, mean_rating, positive_proportion, brand_names):
+    product_count = len(review_count)
+    row_offsets = np.zeros(product_count + 1, dtype=np.int64)
+    np.cumsum(review_count, out=row_offsets[1:])
+    return ProductIndex(
+        np.array([f"p{position}" for position in range(product_count)], dtype=object),
+        np.asarray(positive_proportion, dtype=np.float64),
+        np.asarray(review_count, dtype=np.int64),
+        np.asarray(mean_rating, dtype=np.float64),
+        np.asarray(positive_proportion, dtype=np.float64),
+        np.asarray(brand_names, dtype=object),
+        row_offsets
+    )
+
+def test_few_perfect_reviews_do_not_outrank_a_well_reviewed_product():
+    # Undamped, p0's single 5-star review would rank first. Shrunk towards the catalogue
+    # average it falls behind p1's 30 good reviews, and even p2's 200 poor ones
+    product_index = build_product_index(
+        [1, 30, 200], [5.0, 4.3, 2.0], [1.0, 0.85, 0.3], ['Acme', 'Acme', 'Other']
+    )
+    
+    assert product_index.popularity_order.tolist() == [1, 2, 0]
+    assert [details['product_name'] for details in product_index.fallback_details] == ['p1', 'p2', 'p0']
+
+def test_brand_rankings_ignore_case_and_keep_the_global_order():
+    product_index = build_product_index(
+        [1, 200, 150, 40], [5.0, 4.6, 2.0, 4.0], [1.0, 0.92, 0.3, 0.8], ['Acme', 'acme', 'Other', None]
+    )
+    
+    assert product_index.brand_popularity['acme'] == [1, 0]
+    assert product_index.brand_popularity['n/a'] == [3]
+
+def test_unknown_users_get_the_labelled_fallback(app_client, source_engine):
+    response = app_client.post('/recommend', json={'username': 'first time visitor'})
+    payload = response.get_json()
+    
+    assert response.status_code == 200
+    assert payload['recommendation_source'] == 'popular_fallback'
+    assert payload['recommendations'] == source_engine.build_fallback_set(5)
+
+def test_known_users_are_labelled_personalized(app_client, source_engine):
+    payload = app_client.get('/recommend', query_string={'username': source_engine.known_users[0]}).get_json()
+    
+    assert payload['recommendation_source'] == 'personalized'
+
+def test_brand_narrows_the_fallback_and_unknown_brands_use_the_global_ranking(app_client, source_engine):
+    brand = source_engine.product_index.fallback_details[0]['brand']
+    branded = app_client.post('/recommend', json={'username': 'visitor', 'brand': brand.upper()}).get_json()
+    unknown_brand = app_client.post('/recommend', json={'username': 'visitor', 'brand': 'No such brand'}).get_json()
+    
+    assert branded['recommendations']
+    assert {details['brand'] for details in branded['recommendations']} == {brand}
+    assert unknown_brand['recommendations'] == source_engine.build_fallback_set(5)
@@ -0,0 +1,57 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from model import ProductIndex
+
+@pytest.fixture(scope='module')
+def review_frame(source_artifact_dir):
+    return pd.read_csv(source_artifact_dir / 'cleaned_reviews_dataset.csv')
+
+def scanned_details(review_frame, product_name):
+    # The per-request scan of product_dataset that ProductIndex replaced
+    product_records = review_frame[review_frame['name'] == product_name]
+    if product_records.empty:
+        return None
+    brand_name = product_records['brand'].iloc[0]
+    return {
+        'product_name': product_name,
+        'brand': brand_name if pd.notna(brand_name) else 'N/A',
+        'avg_rating': round(product_records['reviews_rating'].mean(), 2),
+        'positive_ratio': round((product_records['user_sentiment'] == 'Positive').sum() / len(product_records) * 100, 1),
+        'total_reviews': len(product_records)
+    }
+
+def test_details_match_a_scan_of_the_review_dataset(source_engine, review_frame):
+    for product_name in review_frame['name'].unique().tolist():
+        assert source_engine.product_index.details_for(product_name) == scanned_details(review_frame, product_name)
+    assert source_engine.product_index.details_for('Unknown product') is None
+
+def test_row_ranges_select_the_same_reviews_as_a_scan(source_engine, review_frame):
+    for product_name in review_frame['name'].unique().tolist():
+        product_reviews = source_engine.fetch_product_reviews(product_name)
+        scanned_reviews = review_frame[review_frame['name'] == product_name]
+        pd.testing.assert_frame_equal(
+            product_reviews.reset_index(drop=True), scanned_reviews.reset_index(drop=True)
+        )
+    assert source_engine.fetch_product_reviews('Unknown product') is None
+
+def test_sentiment_matches_classifying_each_products_reviews(source_engine, source_artifact_dir, review_frame):
+    with open(source_artifact_dir / 'tfidf_vectorizer.pkl', 'rb') as file:
+        text_vectorizer = pickle.load(file)
+    with open(source_artifact_dir / 'logistic_regression_model.pkl', 'rb') as file:
+        sentiment_classifier = pickle.load(file)
+    
+    for product_name, product_reviews in review_frame.groupby('name'):
+        predictions = sentiment_classifier.predict(text_vectorizer.transform(product_reviews['reviews_cleaned']))
+        assert source_engine.calculate_sentiment_metric(product_name) == pytest.approx(np.mean(predictions == 'Positive'))
+    assert source_engine.calculate_sentiment_metric('Unknown product') == 0.0
+
+def test_sort_reviews_keeps_each_products_reviews_in_order(review_frame):
+    sorted_reviews = ProductIndex.sort_reviews(review_frame)
+    
+    assert sorted_reviews['name'].is_monotonic_increasing
+    for product_name, product_reviews in sorted_reviews.groupby('name'):
+        assert product_reviews['combined_reviews'].tolist() == (
+            review_frame.loc[review_frame['name'] == product_name, 'combined_reviews'].tolist()
+        )
@@ -0,0 +1,249 @@
+import time
+import threading
+import pytest
+import recommendation_cache as recommendation_cache_module
+from recommendation_cache import (
+    InMemoryCacheBackend, PrecomputedResponses, RecommendationCache, SQLiteCacheBackend, SingleFlight,
+    response_etag
+)
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def run_concurrently(single_flight, call_key, compute, caller_count):
+    # The first caller computes; the rest join while it is blocked
+    outcomes = [None] * caller_count
+    
+    def call(caller_index):
+        try:
+            outcomes[caller_index] = single_flight.run(call_key, compute)
+        except Exception as call_error:
+            outcomes[caller_index] = call_error
+    
+    threads = [threading.Thread(target=call, args=(caller_index,)) for caller_index in range(caller_count)]
+    threads[0].start()
+    wait_for(lambda: call_key in single_flight._calls)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: single_flight.shared_calls == caller_count - 1)
+    return threads, outcomes
+
+def test_single_flight_shares_one_computation():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    compute_calls = []
+    
+    def compute():
+        compute_calls.append(1)
+        release.wait(5)
+        return {'recommendations': ['p1']}
+    
+    threads, outcomes = run_concurrently(single_flight, ('amy', None, 5), compute, 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert len(compute_calls) == 1
+    assert all(outcome is outcomes[0] for outcome in outcomes)
+    # Results are not kept once the leader finishes
+    assert single_flight._calls == {}
+    assert single_flight.run(('amy', None, 5), lambda: 'fresh') == 'fresh'
+
+def test_single_flight_raises_the_leaders_error_in_every_caller():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    
+    def compute():
+        release.wait(5)
+        raise RuntimeError('engine failed')
+    
+    threads, outcomes = run_concurrently(single_flight, 'amy', compute, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert single_flight.run('amy', lambda: 'recovered') == 'recovered'
+
+def test_single_flight_keys_do_not_block_each_other():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=single_flight.run, args=('amy', lambda: release.wait(5)))
+    leader.start()
+    wait_for(lambda: 'amy' in single_flight._calls)
+    
+    assert single_flight.run('bob', lambda: 'bob result') == 'bob result'
+    release.set()
+    leader.join(5)
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache_backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    return InMemoryCacheBackend()
+
+def test_cache_drops_entries_when_the_model_version_changes(cache_backend):
+    recommendation_cache = RecommendationCache(cache_backend)
+    
+    assert recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p1']) == ['p1']
+    assert recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p2']) == ['p1']
+    assert recommendation_cache.get_or_compute('amy', 5, 'v2', lambda: ['p3']) == ['p3']
+    assert recommendation_cache.stats()['entries'] == 1
+
+def test_workers_sharing_a_sqlite_file_keep_each_others_entries(tmp_path):
+    database_path = str(tmp_path / 'cache.sqlite3')
+    first_worker = RecommendationCache(SQLiteCacheBackend(database_path))
+    first_worker.get_or_compute('amy', 5, 'v1', lambda: ['p1'])
+    
+    # A second worker starting on the same model must not clear the shared file
+    second_worker = RecommendationCache(SQLiteCacheBackend(database_path))
+    assert second_worker.get_or_compute('amy', 5, 'v1', lambda: ['p9']) == ['p1']
+    assert second_worker.hits == 1
+    
+    # Only a worker on a new model version drops the stale entries
+    second_worker.get_or_compute('bob', 5, 'v2', lambda: ['p2'])
+    assert second_worker.stats()['entries'] == 1
+    assert first_worker.get_or_compute('bob', 5, 'v2', lambda: ['p9']) == ['p2']
+
+def test_cache_forgets_only_the_given_users(cache_backend):
+    recommendation_cache = RecommendationCache(cache_backend)
+    recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p1'])
+    recommendation_cache.get_or_compute('bob', 5, 'v1', lambda: ['p2'])
+    
+    recommendation_cache.forget_users({'amy'}, 5, 'v1')
+    
+    assert recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p9']) == ['p9']
+    assert recommendation_cache.get_or_compute('bob', 5, 'v1', lambda: ['p9']) == ['p2']
+
+class FakeClock:
+    # Stands in for the time module so expiry does not depend on sleeping
+    def __init__(self):
+        self.now = 1000.0
+    
+    def time(self):
+        return self.now
+    
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def sized_backend(request, tmp_path):
+    def build(max_bytes):
+        if request.param == 'sqlite':
+            return SQLiteCacheBackend(str(tmp_path / 'sized.sqlite3'), max_bytes)
+        return InMemoryCacheBackend(max_bytes)
+    return build
+
+def test_least_recently_used_entries_are_evicted_first(sized_backend, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(recommendation_cache_module, 'time', clock)
+    # Each entry is 2 key bytes and 8 payload bytes, so three do not fit
+    cache_backend = sized_backend(25)
+    for cache_key in ('k1', 'k2'):
+        clock.now += 1
+        cache_backend.set(cache_key, b'x' * 8)
+    clock.now += 1
+    assert cache_backend.get('k1') == b'x' * 8
+    
+    clock.now += 1
+    cache_backend.set('k3', b'y' * 8)
+    
+    assert cache_backend.get('k2') is None
+    assert cache_backend.get('k1') is not None and cache_backend.get('k3') is not None
+    assert cache_backend.stats()['evictions'] == 1
+    assert cache_backend.stats()['bytes'] == 20
+
+def test_entries_larger_than_the_cache_are_not_stored(sized_backend):
+    cache_backend = sized_backend(16)
+    cache_backend.set('k1', b'x' * 32)
+    
+    assert cache_backend.get('k1') is None
+    assert cache_backend.stats()['entries'] == 0
+
+def test_entries_expire_after_the_ttl(cache_backend, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(recommendation_cache_module, 'time', clock)
+    recommendation_cache = RecommendationCache(cache_backend, ttl_seconds=30)
+    recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p1'])
+    
+    clock.now += 29
+    assert recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p2']) == ['p1']
+    clock.now += 2
+    assert recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p3']) == ['p3']
+    assert (recommendation_cache.hits, recommendation_cache.misses) == (1, 2)
+
+def test_empty_results_are_not_cached(cache_backend):
+    recommendation_cache = RecommendationCache(cache_backend)
+    recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: [])
+    
+    assert recommendation_cache.get_or_compute('amy', 5, 'v1', lambda: ['p1']) == ['p1']
+
+def test_recommend_serves_repeat_requests_from_the_cache(app_client, source_engine, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'recommendation_cache', RecommendationCache(InMemoryCacheBackend()))
+    computed_users = []
+    build_recommendation_set = source_engine.build_recommendation_set
+    
+    def counting_build(username, recommendation_count=5):
+        computed_users.append(username)
+        return build_recommendation_set(username, recommendation_count)
+    monkeypatch.setattr(source_engine, 'build_recommendation_set', counting_build)
+    username = source_engine.known_users[0]
+    
+    first_response = app_client.post('/recommend', json={'username': username})
+    second_response = app_client.post('/recommend', json={'username': username})
+    
+    assert first_response.status_code == 200
+    assert first_response.get_json() == second_response.get_json()
+    assert computed_users == [username]
+    assert app.recommendation_cache.stats()['hits'] == 1
+
+class StubEngine:
+    def __init__(self, model_version):
+        self.model_version = model_version
+        self.ingested_review_count = 0
+        self.builds = 0
+    
+    def most_active_users(self, user_count):
+        return ['amy', 'bob', 'cat'][:user_count]
+    
+    def build_recommendation_sets(self, usernames, top_n):
+        self.builds += 1
+        return {username: [f"{username}-{self.builds}"] if username != 'cat' else [] for username in usernames}
+
+def render_body(recommendations):
+    return ','.join(recommendations).encode('utf-8')
+
+def test_precomputed_responses_follow_the_model_version():
+    serving_engine = StubEngine('v1')
+    precomputed_responses = PrecomputedResponses(3, 5, render_body)
+    
+    assert precomputed_responses.refresh(serving_engine)
+    assert precomputed_responses.get('amy', 'v1') == (b'amy-1', response_etag(b'amy-1'))
+    # Users without recommendations are computed normally
+    assert precomputed_responses.get('cat', 'v1') is None
+    assert not precomputed_responses.refresh(serving_engine)
+    
+    serving_engine.model_version = 'v2'
+    assert not precomputed_responses.is_current(serving_engine)
+    assert precomputed_responses.get('amy', 'v2') is None
+    assert precomputed_responses.refresh(serving_engine)
+    assert precomputed_responses.get('amy', 'v2')[0] == b'amy-2'
+
+def test_ingestion_refreshes_are_throttled():
+    serving_engine = StubEngine('v1')
+    precomputed_responses = PrecomputedResponses(3, 5, render_body, refresh_seconds=60)
+    precomputed_responses.refresh(serving_engine)
+    
+    serving_engine.ingested_review_count = 10
+    precomputed_responses.forget_users({'amy'})
+    assert precomputed_responses.is_current(serving_engine)
+    assert precomputed_responses.get('amy', 'v1') is None
+    assert precomputed_responses.get('bob', 'v1')[0] == b'bob-1'
+    
+    precomputed_responses.refresh_seconds = 0
+    assert precomputed_responses.refresh(serving_engine)
+    assert precomputed_responses.get('amy', 'v1')[0] == b'amy-2'
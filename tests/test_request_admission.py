@@ -0,0 +1,71 @@
+import time
+import threading
+import pytest
+import app
+from app import RequestAdmission
+
+@pytest.fixture
+def full_admission(monkeypatch):
+    # One slot, already taken, and no queue
+    request_admission = RequestAdmission(1, 0, 0.01)
+    assert request_admission.try_acquire()
+    monkeypatch.setattr(app, 'request_admission', request_admission)
+    return request_admission
+
+def test_requests_beyond_the_queue_are_shed_immediately():
+    request_admission = RequestAdmission(1, 0, 5)
+    
+    assert request_admission.try_acquire()
+    assert not request_admission.try_acquire()
+    assert request_admission.stats() == {
+        'recommender_requests_in_flight': 1,
+        'recommender_requests_queued': 0,
+        'recommender_requests_shed_total': 1
+    }
+    
+    request_admission.release()
+    assert request_admission.try_acquire()
+
+def test_queued_requests_wait_for_a_free_slot():
+    request_admission = RequestAdmission(1, 1, 5)
+    assert request_admission.try_acquire()
+    
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(request_admission.try_acquire()))
+    waiter.start()
+    while request_admission.queued == 0:
+        time.sleep(0.001)
+    # The single queue place is taken, so a third request is shed
+    assert not request_admission.try_acquire()
+    
+    request_admission.release()
+    waiter.join(5)
+    assert admitted == [True]
+    assert request_admission.stats()['recommender_requests_in_flight'] == 1
+
+def test_queued_requests_are_shed_after_the_timeout():
+    request_admission = RequestAdmission(1, 1, 0.01)
+    assert request_admission.try_acquire()
+    
+    assert not request_admission.try_acquire()
+    assert request_admission.queued == 0
+    assert request_admission.shed == 1
+
+def test_sheddable_endpoints_answer_503_with_retry_after(full_admission):
+    client = app.web_app.test_client()
+    
+    for response in (
+        client.get('/recommend', query_string={'username': 'someone'}),
+        client.post('/recommend/batch', json={'usernames': ['someone']}),
+        client.get('/get_usernames')
+    ):
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert response.get_json() == {'success': False, 'error': 'Server is overloaded, retry shortly'}
+    assert full_admission.shed == 3
+
+def test_probes_are_never_shed(full_admission):
+    client = app.web_app.test_client()
+    
+    assert client.get('/healthz').status_code == 200
+    assert full_admission.shed == 0
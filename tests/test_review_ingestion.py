@@ -0,0 +1,86 @@
+import json
+import pytest
+import model
+from model import RecommendationEngine
+
+ADMIN_HEADERS = {'X-Admin-Token': 'secret'}
+
+@pytest.fixture
+def ingest_client(source_artifact_dir, monkeypatch):
+    # Ingestion changes the engine, so every test gets its own
+    import app
+    serving_engine = RecommendationEngine(str(source_artifact_dir), candidate_model='precomputed')
+    monkeypatch.setattr(model, 'recommendation_system', serving_engine)
+    monkeypatch.setenv('RECOMMENDER_ADMIN_TOKEN', 'secret')
+    return app.web_app.test_client(), serving_engine
+
+def review(product_name='Product 1', username='user001', rating=5):
+    return {'name': product_name, 'reviews_rating': rating, 'reviews_cleaned': 'great love', 'reviews_username': username}
+
+@pytest.mark.parametrize('request_options', [
+    {'json': {'reviews': [review(), review('Product 2')]}},
+    {'json': [review(), review('Product 2')]},
+    {'data': '\n'.join(json.dumps(entry) for entry in (review(), review('Product 2'))) + '\n',
+     'content_type': 'application/x-ndjson'}
+])
+def test_accepted_body_shapes(ingest_client, request_options):
+    client, serving_engine = ingest_client
+    response = client.post('/admin/reviews', headers=ADMIN_HEADERS, **request_options)
+    
+    assert response.status_code == 200
+    assert response.get_json()['ingested'] == 2
+    assert serving_engine.ingested_review_count == 2
+
+def test_ingested_reviews_update_product_aggregates(ingest_client):
+    client, serving_engine = ingest_client
+    review_count = int(serving_engine.product_index.details_for('Product 3')['total_reviews'])
+    
+    client.post('/admin/reviews', headers=ADMIN_HEADERS, json={'reviews': [review('Product 3'), review('New product')]})
+    
+    assert serving_engine.product_index.details_for('Product 3')['total_reviews'] == review_count + 1
+    assert serving_engine.product_index.details_for('New product')['total_reviews'] == 1
+
+def test_popularity_ranking_is_rebuilt_on_first_use_after_a_batch(ingest_client):
+    client, serving_engine = ingest_client
+    reviews = [review('New product', 'user%03d' % (reviewer % 60)) for reviewer in range(200)]
+    
+    client.post('/admin/reviews', headers=ADMIN_HEADERS, json={'reviews': reviews})
+    
+    product_index = serving_engine.product_index
+    assert product_index._popularity_ranking is None
+    assert serving_engine.build_fallback_set(1)[0]['product_name'] == 'New product'
+    assert product_index.popularity_ranking() is product_index.popularity_ranking()
+
+@pytest.mark.parametrize('request_options', [
+    {'json': {'reviews': 'Product 1'}},
+    {'json': {'reviews': [review(), 'Product 2']}},
+    {'json': 'Product 1'},
+    {'json': {}},
+    {'data': '{not json', 'content_type': 'application/json'},
+    {'data': json.dumps(review()) + '\n{"name": ', 'content_type': 'application/x-ndjson'},
+    {'data': '[1, 2]', 'content_type': 'application/x-ndjson'},
+    {'json': {'reviews': [review(rating=9)]}},
+    {'json': {'reviews': [{'reviews_rating': 4}]}}
+])
+def test_rejected_input_gets_a_400_and_ingests_nothing(ingest_client, request_options):
+    client, serving_engine = ingest_client
+    response = client.post('/admin/reviews', headers=ADMIN_HEADERS, **request_options)
+    
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert serving_engine.ingested_review_count == 0
+
+def test_ndjson_errors_name_the_line(ingest_client):
+    client, _ = ingest_client
+    response = client.post(
+        '/admin/reviews', headers=ADMIN_HEADERS,
+        data=json.dumps(review()) + '\n\n{"name": \n', content_type='application/x-ndjson'
+    )
+    assert response.get_json()['error'].startswith('NDJSON line 3 is not valid JSON')
+
+def test_requests_without_the_admin_token_are_refused(ingest_client):
+    client, serving_engine = ingest_client
+    response = client.post('/admin/reviews', json={'reviews': [review()]})
+    
+    assert response.status_code == 403
+    assert serving_engine.ingested_review_count == 0
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from candidates import SEEN_KEY_SHIFT, CandidateStore, SeenItemIndex, as_fixed_width
+
+PRODUCT_NAMES = as_fixed_width(np.array(['p0', 'p1', 'p2', 'p3', 'p4']))
+
+def build_seen_items():
+    review_frame = pd.DataFrame({
+        'reviews_username': ['bob', 'amy', 'bob', 'amy', 'bob', None, 'cat'],
+        'name': ['p3', 'p1', 'p0', 'p1', 'p4', 'p2', 'unknown product']
+    })
+    return SeenItemIndex.from_reviews(review_frame, PRODUCT_NAMES)
+
+def test_from_reviews_builds_sorted_csr_rows():
+    seen_items = build_seen_items()
+    
+    # Reviews of unknown products and reviews without a username are ignored
+    assert seen_items.user_names.tolist() == ['amy', 'bob']
+    assert seen_items.item_indptr.tolist() == [0, 1, 4]
+    assert seen_items.item_ids.tolist() == [1, 0, 3, 4]
+
+def test_seen_keys_pack_request_position_and_product_id():
+    seen_items = build_seen_items()
+    seen_keys = seen_items.seen_keys(['bob', 'nobody', 'amy'])
+    
+    assert seen_keys.tolist() == sorted([
+        (0 << SEEN_KEY_SHIFT) | 0, (0 << SEEN_KEY_SHIFT) | 3, (0 << SEEN_KEY_SHIFT) | 4,
+        (2 << SEEN_KEY_SHIFT) | 1
+    ])
+    assert (seen_keys >> SEEN_KEY_SHIFT).tolist() == [0, 0, 0, 2]
+    assert (seen_keys & ((1 << SEEN_KEY_SHIFT) - 1)).tolist() == [0, 3, 4, 1]
+
+def test_seen_mask_ignores_padding_and_other_users():
+    seen_items = build_seen_items()
+    candidate_ids = np.array([
+        [4, 2, 0, -1],
+        [0, 1, -1, -1],
+        [1, 3, 4, 0]
+    ], dtype=np.int32)
+    
+    seen = seen_items.seen_mask(['bob', 'amy', 'nobody'], candidate_ids)
+    assert seen.tolist() == [
+        [True, False, True, False],
+        [False, True, False, False],
+        [False, False, False, False]
+    ]
+
+def test_recorded_items_are_seen_without_changing_the_export():
+    seen_items = build_seen_items()
+    seen_items.record_items(['amy', 'dan'], [2, 4])
+    
+    assert seen_items.item_ids.tolist() == [1, 0, 3, 4]
+    assert seen_items.seen_keys(['amy', 'dan']).tolist() == [
+        (0 << SEEN_KEY_SHIFT) | 1, (0 << SEEN_KEY_SHIFT) | 2, (1 << SEEN_KEY_SHIFT) | 4
+    ]
+    candidate_ids = np.array([[2, 1, 3], [4, 2, -1]], dtype=np.int32)
+    assert seen_items.recent_mask(['amy', 'dan'], candidate_ids).tolist() == [
+        [True, False, False],
+        [True, False, False]
+    ]
+
+def test_precomputed_store_excludes_seen_products_before_the_cut():
+    seen_items = build_seen_items()
+    prediction_frame = pd.DataFrame(
+        [[5.0, 4.0, 3.0, 2.0, 1.0], [1.0, 2.0, 3.0, 4.0, 5.0]],
+        index=['bob', 'amy'],
+        columns=PRODUCT_NAMES
+    )
+    candidate_store = CandidateStore.from_prediction_frame(prediction_frame, 2, seen_items)
+    candidate_store.seen_items = seen_items
+    
+    assert candidate_store.seen_excluded
+    _, candidate_ids, _ = candidate_store.candidate_block(['amy', 'bob'])
+    assert candidate_ids.tolist() == [[4, 3], [1, 2]]
+    
+    # Reviews ingested after the export still drop their products at serve time
+    seen_items.record_items(['amy'], [4])
+    _, candidate_ids, candidate_scores = candidate_store.candidate_block(['amy'])
+    assert candidate_ids.tolist() == [[3, -1]]
+    assert np.isnan(candidate_scores[0, 1])
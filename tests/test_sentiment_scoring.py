@@ -0,0 +1,101 @@
+import time
+import threading
+import numpy as np
+import pytest
+from sentiment_scoring import SentimentScorer
+
+# Each text is a number; its positive probability is that number / 100
+class RecordingVectorizer:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+    
+    def transform(self, texts):
+        self.batches.append(list(texts))
+        self.release.wait(5)
+        return np.array([float(text) for text in texts])[:, None]
+
+class ScaledClassifier:
+    classes_ = np.array(['Negative', 'Positive'])
+    
+    def predict_proba(self, text_features):
+        if np.isnan(text_features).any():
+            raise ValueError('Unscorable text')
+        positive = text_features[:, 0] / 100
+        return np.column_stack((1 - positive, positive))
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def score_concurrently(scorer, vectorizer, text_lists):
+    # The first call holds the scorer while the others queue up behind it
+    results = {}
+    errors = {}
+    
+    def score(call_index):
+        try:
+            results[call_index] = scorer.score_texts(text_lists[call_index])
+        except Exception as scoring_error:
+            errors[call_index] = scoring_error
+    
+    vectorizer.release.clear()
+    threads = [threading.Thread(target=score, args=(0,))]
+    threads[0].start()
+    wait_for(lambda: len(vectorizer.batches) == 1)
+    for call_index in range(1, len(text_lists)):
+        threads.append(threading.Thread(target=score, args=(call_index,)))
+        threads[-1].start()
+    wait_for(lambda: len(scorer._pending) == len(text_lists) - 1)
+    vectorizer.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+def test_queued_calls_are_scored_in_one_batch_and_split_back():
+    vectorizer = RecordingVectorizer()
+    scorer = SentimentScorer(vectorizer, ScaledClassifier())
+    text_lists = [['10'], ['20', '30'], ['40'], ['50', '60', '70']]
+    
+    results, errors = score_concurrently(scorer, vectorizer, text_lists)
+    
+    assert not errors
+    assert len(vectorizer.batches) == 2
+    assert sorted(vectorizer.batches[1]) == ['20', '30', '40', '50', '60', '70']
+    for call_index, texts in enumerate(text_lists):
+        assert results[call_index].tolist() == pytest.approx([float(text) / 100 for text in texts])
+
+def test_batches_are_capped_at_max_batch_texts():
+    vectorizer = RecordingVectorizer()
+    scorer = SentimentScorer(vectorizer, ScaledClassifier(), max_batch_texts=3)
+    text_lists = [['1'], ['2', '3'], ['4'], ['5', '6']]
+    
+    results, errors = score_concurrently(scorer, vectorizer, text_lists)
+    
+    assert not errors
+    assert all(len(batch) <= 3 for batch in vectorizer.batches)
+    assert sorted(text for batch in vectorizer.batches[1:] for text in batch) == ['2', '3', '4', '5', '6']
+    assert len(results) == len(text_lists)
+
+def test_a_failed_batch_raises_in_every_call_it_held():
+    vectorizer = RecordingVectorizer()
+    scorer = SentimentScorer(vectorizer, ScaledClassifier())
+    text_lists = [['10'], ['20'], ['nan']]
+    
+    results, errors = score_concurrently(scorer, vectorizer, text_lists)
+    
+    assert results[0].tolist() == pytest.approx([0.1])
+    assert sorted(errors) == [1, 2]
+    assert all(isinstance(error, ValueError) for error in errors.values())
+    # The scorer is idle again afterwards
+    assert scorer.score_texts(['30']).tolist() == pytest.approx([0.3])
+
+def test_empty_input_skips_the_model():
+    vectorizer = RecordingVectorizer()
+    scorer = SentimentScorer(vectorizer, ScaledClassifier())
+    
+    assert scorer.score_texts([]).size == 0
+    assert vectorizer.batches == []
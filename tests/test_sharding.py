@@ -0,0 +1,136 @@
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pytest
+import app
+from artifacts import export_bundle
+from model import RecommendationEngine
+from sharding import user_shard
+from user_directory import UserDirectory
+
+SHARD_COUNT = 3
+
+@pytest.mark.parametrize('candidate_model', ['precomputed', 'item_neighbours', 'factors'])
+def test_bundle_source_and_sharded_results_are_identical(candidate_model, source_artifact_dir, tmp_path):
+    source_engine = RecommendationEngine(str(source_artifact_dir), candidate_model=candidate_model)
+    bundle_engine = RecommendationEngine(export_bundle(
+        str(source_artifact_dir), str(tmp_path / 'bundle'), candidate_model=candidate_model
+    ))
+    shard_engines = {}
+    for bundle_dir in export_bundle(
+        str(source_artifact_dir), str(tmp_path / 'shards'), candidate_model=candidate_model, shard_count=SHARD_COUNT
+    ):
+        shard_engine = RecommendationEngine(bundle_dir)
+        shard_engines[shard_engine.shard['index']] = shard_engine
+    
+    usernames = source_engine.known_users.tolist()
+    assert sorted(shard_engines) == list(range(SHARD_COUNT))
+    assert sorted(
+        username for shard_engine in shard_engines.values() for username in shard_engine.known_users.tolist()
+    ) == sorted(usernames)
+    
+    source_sets = source_engine.build_recommendation_sets(usernames, 5)
+    assert any(source_sets.values())
+    assert bundle_engine.build_recommendation_sets(usernames, 5) == source_sets
+    for username in usernames:
+        shard_engine = shard_engines[user_shard(username, SHARD_COUNT)]
+        assert shard_engine.build_recommendation_set(username, 5) == source_sets[username]
+        assert bundle_engine.build_recommendation_set(username, 5) == source_sets[username]
+    assert shard_engines[0].build_fallback_set(5) == source_engine.build_fallback_set(5)
+
+# Answers the router's shard calls in process, from one UserDirectory per shard
+class InProcessShardRouter:
+    def __init__(self, usernames, shard_count):
+        self.shard_count = shard_count
+        self.user_directories = [
+            UserDirectory(np.array(sorted(
+                username for username in usernames if user_shard(username, shard_count) == shard_index
+            )))
+            for shard_index in range(shard_count)
+        ]
+        self.calls = []
+    
+    def shard_for(self, username):
+        return user_shard(username, self.shard_count)
+    
+    def map_shards(self, shard_calls):
+        return [self.request_json(*shard_call) for shard_call in shard_calls]
+    
+    def request_json(self, shard_index, method, path, payload=None):
+        self.calls.append((shard_index, method, path))
+        shard_path = urlsplit(path)
+        if shard_path.path == '/get_usernames':
+            query = {name: values[0] for name, values in parse_qs(shard_path.query, keep_blank_values=True).items()}
+            usernames, next_cursor = self.user_directories[shard_index].search(
+                query['q'], int(query['limit']), int(query['cursor'])
+            )
+            return 200, {'success': True, 'usernames': usernames, 'next_cursor': next_cursor}
+        
+        known_users = set(self.user_directories[shard_index].usernames.tolist())
+        return 200, {
+            'success': True,
+            'recommendations': {username: [f"{username} pick"] for username in payload['usernames']},
+            'fallback_users': [username for username in payload['usernames'] if username not in known_users]
+        }
+
+USERNAMES = [f"{prefix}{user_id:02d}" for prefix in ('amy', 'bob', 'carla', 'dmitri') for user_id in range(13)]
+
+@pytest.fixture
+def router_client(monkeypatch):
+    shard_router = InProcessShardRouter(USERNAMES, SHARD_COUNT)
+    monkeypatch.setattr(app, 'shard_router', shard_router)
+    return app.web_app.test_client(), shard_router
+
+def collect_router_pages(client, query, limit):
+    usernames = []
+    cursor = '0'
+    while cursor is not None:
+        page = client.get('/get_usernames', query_string={'q': query, 'limit': limit, 'cursor': cursor}).get_json()
+        assert page['success'] and len(page['usernames']) <= limit
+        usernames.extend(page['usernames'])
+        cursor = page['next_cursor']
+    return usernames
+
+@pytest.mark.parametrize('query', ['', 'a', 'bob', '1', 'nobody'])
+@pytest.mark.parametrize('limit', [1, 4, 7, 100])
+def test_router_pages_merge_shards_in_sorted_order(router_client, query, limit):
+    client, _ = router_client
+    expected, _ = UserDirectory(np.array(sorted(USERNAMES))).search(query)
+    assert collect_router_pages(client, query, limit) == expected
+
+def test_router_cursor_skips_finished_shards(router_client):
+    client, shard_router = router_client
+    page = client.get('/get_usernames', query_string={'q': 'amy', 'limit': 13}).get_json()
+    assert page['next_cursor'] is None
+    
+    page = client.get('/get_usernames', query_string={'q': '', 'limit': 50}).get_json()
+    shard_cursors = page['next_cursor'].split('.')
+    assert len(shard_cursors) == SHARD_COUNT
+    shard_router.calls.clear()
+    client.get('/get_usernames', query_string={'q': '', 'limit': 50, 'cursor': page['next_cursor']})
+    assert {shard_index for shard_index, _, _ in shard_router.calls} == {
+        shard_index for shard_index, shard_cursor in enumerate(shard_cursors) if shard_cursor != 'x'
+    }
+
+def test_router_rejects_foreign_cursors(router_client):
+    client, _ = router_client
+    for cursor in ('12', '1.2', 'a.b.c'):
+        page = client.get('/get_usernames', query_string={'cursor': cursor}).get_json()
+        assert not page['success']
+
+def test_router_batch_merges_shard_results(router_client):
+    client, _ = router_client
+    usernames = ['dmitri03', 'ghost', 'amy01', 'bob12', 'amy01']
+    
+    response = client.post('/recommend/batch', json={'usernames': usernames, 'top_n': 2})
+    payload = response.get_json()
+    assert response.status_code == 200
+    assert payload['recommendations'] == {username: [f"{username} pick"] for username in usernames}
+    assert payload['fallback_users'] == ['ghost']
+
+def test_router_batch_answers_malformed_bodies_with_json_400(router_client):
+    client, shard_router = router_client
+    for body in (b'{not json', b'["amy01"]', b'"amy01"', b'{"usernames": ["amy01"], "top_n": true}', b'{}'):
+        response = client.post('/recommend/batch', data=body, content_type='application/json')
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+    assert shard_router.calls == []
@@ -0,0 +1,140 @@
+import json
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+import model
+import text_preprocessing
+from model import ReviewIngestLog, RecommendationEngine
+from text_preprocessing import (
+    ReviewTextCleaner, TextCleanerUnavailable, cleaned_review_texts, iter_preprocessed_chunks, load_review_features,
+    preprocess_reviews, text_cleaner_problem
+)
+
+MISSING_CORPORA = 'NLTK data missing: stopwords, wordnet; run python -m nltk.downloader stopwords wordnet'
+
+def test_cleaner_follows_the_notebook_steps():
+    text_cleaner = ReviewTextCleaner(stop_words=['the', 'is'], lemmatize=lambda token: token.rstrip('s'))
+    
+    assert text_cleaner.clean('The <b>Product</b> is GREAT!! see www.example.com 10/10 shoes') == 'product great see shoe'
+    assert text_cleaner.clean_texts(['Cats', 'the dogs']) == ['cat', 'dog']
+
+def test_missing_corpora_are_reported_by_name(monkeypatch):
+    nltk = pytest.importorskip('nltk')
+    
+    def find(resource_path):
+        if 'wordnet' in resource_path:
+            raise LookupError(resource_path)
+        return resource_path
+    monkeypatch.setattr(nltk.data, 'find', find)
+    
+    assert text_cleaner_problem() == 'NLTK data missing: wordnet; run python -m nltk.downloader wordnet'
+    with pytest.raises(TextCleanerUnavailable):
+        ReviewTextCleaner()
+    # A cleaner given its own stopwords and lemmatizer does not need NLTK data
+    ReviewTextCleaner(stop_words=[], lemmatize=str)
+
+@pytest.fixture
+def engine_without_corpora(source_artifact_dir, monkeypatch):
+    import app
+    monkeypatch.setattr(text_preprocessing, 'text_cleaner_problem', lambda: MISSING_CORPORA)
+    monkeypatch.setattr(model, 'text_cleaner_problem', lambda: MISSING_CORPORA)
+    serving_engine = RecommendationEngine(str(source_artifact_dir), candidate_model='precomputed')
+    monkeypatch.setattr(model, 'recommendation_system', serving_engine)
+    monkeypatch.setenv('RECOMMENDER_ADMIN_TOKEN', 'secret')
+    return app.web_app.test_client(), serving_engine
+
+def test_uncleaned_reviews_are_refused_with_a_503(engine_without_corpora):
+    client, serving_engine = engine_without_corpora
+    response = client.post('/admin/reviews', headers={'X-Admin-Token': 'secret'}, json={'reviews': [
+        {'name': 'Product 1', 'reviews_rating': 5, 'reviews_text': 'Loved it'}
+    ]})
+    
+    assert response.status_code == 503
+    assert MISSING_CORPORA in response.get_json()['error']
+    assert serving_engine.ingested_review_count == 0
+    assert client.get('/readyz').get_json()['text_cleaning'] == MISSING_CORPORA
+
+def test_cleaned_reviews_still_ingest_without_corpora(engine_without_corpora):
+    client, serving_engine = engine_without_corpora
+    response = client.post('/admin/reviews', headers={'X-Admin-Token': 'secret'}, json={'reviews': [
+        {'name': 'Product 1', 'reviews_rating': 5, 'reviews_cleaned': 'love'}
+    ]})
+    
+    assert response.status_code == 200
+    assert serving_engine.ingested_review_count == 1
+
+def test_refused_reviews_never_reach_the_shared_log(engine_without_corpora, tmp_path, monkeypatch):
+    client, _ = engine_without_corpora
+    log_path = tmp_path / 'reviews.jsonl'
+    monkeypatch.setattr(model, 'review_ingest_log', ReviewIngestLog(str(log_path)))
+    
+    response = client.post(
+        '/admin/reviews', headers={'X-Admin-Token': 'secret'}, content_type='application/x-ndjson',
+        data=json.dumps({'name': 'Product 1', 'reviews_rating': 5, 'reviews_text': 'Loved it'})
+    )
+    assert response.status_code == 503
+    assert not log_path.exists()
+
+def plain_cleaner():
+    # Picklable for the worker processes and independent of NLTK data
+    return ReviewTextCleaner(stop_words=['the'], lemmatize=str)
+
+def test_stored_cleaned_texts_are_kept_and_missing_ones_cleaned():
+    review_frame = pd.DataFrame({
+        'reviews_title': ['Great', None],
+        'reviews_text': ['The <i>best</i>', 'Broke after a day'],
+        'reviews_cleaned': [None, 'already cleaned']
+    })
+    
+    assert cleaned_review_texts(review_frame, plain_cleaner()) == ['great best', 'already cleaned']
+
+def test_worker_processes_return_chunks_in_input_order():
+    text_chunks = [[f"Review {index} of THE chunk {chunk}" for index in range(20)] for chunk in range(6)]
+    
+    serial_chunks = [texts for texts, _ in iter_preprocessed_chunks(iter(text_chunks), plain_cleaner(), workers=1)]
+    parallel_chunks = [texts for texts, _ in iter_preprocessed_chunks(iter(text_chunks), plain_cleaner(), workers=2)]
+    
+    assert parallel_chunks == serial_chunks
+    assert serial_chunks[2][3] == 'review of chunk'
+
+def test_persisted_features_match_the_vectorizer_and_go_stale(source_artifact_dir, tmp_path):
+    artifact_dir = tmp_path / 'artifacts'
+    shutil.copytree(source_artifact_dir, artifact_dir)
+    review_count = len(pd.read_csv(artifact_dir / 'cleaned_reviews_dataset.csv'))
+    
+    preprocess_reviews(
+        str(artifact_dir / 'cleaned_reviews_dataset.csv'), str(artifact_dir / 'tfidf_vectorizer.pkl'), str(artifact_dir),
+        workers=1, chunk_texts=128, text_cleaner=plain_cleaner()
+    )
+    
+    with open(artifact_dir / 'tfidf_vectorizer.pkl', 'rb') as file:
+        text_vectorizer = pickle.load(file)
+    rewritten_frame = pd.read_csv(artifact_dir / 'cleaned_reviews_dataset.csv')
+    review_features = load_review_features(str(artifact_dir), review_count)
+    assert np.allclose(review_features.toarray(), text_vectorizer.transform(rewritten_frame['reviews_cleaned']).toarray())
+    assert load_review_features(str(artifact_dir), review_count + 1) is None
+    
+    rewritten_frame.iloc[:-1].to_csv(artifact_dir / 'cleaned_reviews_dataset.csv', index=False)
+    assert load_review_features(str(artifact_dir), review_count) is None
+
+def test_engines_score_persisted_features_like_the_texts(source_engine, source_artifact_dir, tmp_path, monkeypatch):
+    artifact_dir = tmp_path / 'artifacts'
+    shutil.copytree(source_artifact_dir, artifact_dir)
+    preprocess_reviews(
+        str(artifact_dir / 'cleaned_reviews_dataset.csv'), str(artifact_dir / 'tfidf_vectorizer.pkl'), str(artifact_dir),
+        workers=1, text_cleaner=plain_cleaner()
+    )
+    loaded_features = []
+    
+    def recording_load(*arguments):
+        loaded_features.append(load_review_features(*arguments))
+        return loaded_features[-1]
+    monkeypatch.setattr(model, 'load_review_features', recording_load)
+    
+    feature_engine = RecommendationEngine(str(artifact_dir), candidate_model='precomputed')
+    
+    # The rows are reordered with the reviews, so each product still gets its own scores
+    assert loaded_features[0] is not None
+    assert np.allclose(feature_engine.product_index.positive_proportion, source_engine.product_index.positive_proportion)
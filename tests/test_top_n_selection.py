@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from candidates import select_top_k, select_top_n
+
+def reference_top_n(scores, top_n):
+    # What the notebook did: a stable descending sort, NaN last, cut to top_n
+    order = np.argsort(-np.where(np.isnan(scores), -np.inf, scores), kind='stable')
+    return [position for position in order[:top_n].tolist() if not np.isnan(scores[position])]
+
+def test_ties_keep_their_original_order():
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.5, 0.1])
+    
+    assert select_top_n(scores, 3).tolist() == [1, 3, 0]
+    assert select_top_n(scores, 4).tolist() == [1, 3, 0, 2]
+    assert select_top_n(scores, 10).tolist() == [1, 3, 0, 2, 4, 5]
+
+def test_nan_scores_are_never_selected():
+    scores = np.array([np.nan, 0.2, np.nan, 0.7, 0.2])
+    
+    assert select_top_n(scores, 2).tolist() == [3, 1]
+    assert select_top_n(scores, 5).tolist() == [3, 1, 4]
+    assert select_top_n(np.full(3, np.nan), 2).tolist() == []
+
+@pytest.mark.parametrize('top_n', [0, -1])
+def test_non_positive_top_n_selects_nothing(top_n):
+    assert select_top_n(np.array([0.3, 0.1]), top_n).tolist() == []
+
+def test_matches_a_stable_sort_on_random_scores_with_ties():
+    generator = np.random.default_rng(0)
+    for _ in range(200):
+        scores = generator.integers(0, 5, generator.integers(1, 30)).astype(np.float64)
+        scores[generator.random(len(scores)) < 0.2] = np.nan
+        top_n = int(generator.integers(1, 35))
+        assert select_top_n(scores, top_n).tolist() == reference_top_n(scores, top_n)
+
+def test_select_top_k_pads_rows_without_enough_scores():
+    score_block = np.array([
+        [0.1, np.nan, 0.9, 0.4],
+        [np.nan, np.nan, 0.3, np.nan]
+    ], dtype=np.float32)
+    
+    top_ids, top_scores = select_top_k(score_block, 3)
+    assert top_ids.tolist() == [[2, 3, 0], [2, -1, -1]]
+    assert top_scores[0].tolist() == pytest.approx([0.9, 0.4, 0.1])
+    assert top_scores[1, 0] == pytest.approx(0.3)
+    assert np.isnan(top_scores[1, 1:]).all()
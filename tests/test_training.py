@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from training import build_rating_matrix, split_ratings
+
+def notebook_train_test_split_cf(dataframe):
+    # The notebook's function, kept verbatim apart from formatting
+    from sklearn.model_selection import train_test_split
+    train_data_parts = []
+    test_data_parts = []
+    for username in dataframe['reviews_username'].unique():
+        user_records = dataframe[dataframe['reviews_username'] == username]
+        if len(user_records) < 2:
+            train_data_parts.append(user_records)
+            continue
+        user_train, user_test = train_test_split(user_records, test_size=0.2, random_state=42)
+        train_data_parts.append(user_train)
+        test_data_parts.append(user_test)
+    return pd.concat(train_data_parts), pd.concat(test_data_parts)
+
+def build_rating_frame(row_count=3000, user_count=400, product_count=50, seed=3):
+    # Skewed user activity gives many distinct per-user record counts, including 1
+    generator = np.random.default_rng(seed)
+    user_ids = np.minimum(generator.zipf(1.6, row_count), user_count) - 1
+    return pd.DataFrame({
+        'reviews_username': [f"user{user_id:04d}" for user_id in user_ids],
+        'name': [f"product{product_id:03d}" for product_id in generator.integers(0, product_count, row_count)],
+        'reviews_rating': generator.integers(1, 6, row_count).astype(float)
+    })
+
+def test_split_matches_the_notebook_row_for_row():
+    pytest.importorskip('sklearn')
+    rating_frame = build_rating_frame()
+    
+    train_frame, test_frame = split_ratings(rating_frame)
+    notebook_train, notebook_test = notebook_train_test_split_cf(rating_frame)
+    
+    assert sorted(train_frame.index) == sorted(notebook_train.index)
+    assert sorted(test_frame.index) == sorted(notebook_test.index)
+
+def test_single_record_users_stay_in_train():
+    rating_frame = build_rating_frame()
+    train_frame, test_frame = split_ratings(rating_frame)
+    
+    record_counts = rating_frame['reviews_username'].value_counts()
+    single_users = set(record_counts.index[record_counts == 1])
+    assert single_users
+    assert single_users <= set(train_frame['reviews_username'])
+    assert not single_users & set(test_frame['reviews_username'])
+    assert len(train_frame) + len(test_frame) == len(rating_frame)
+
+def test_rating_matrix_matches_pivot_table():
+    rating_frame = build_rating_frame(row_count=800, user_count=60, product_count=15)
+    rating_frame.loc[::7, 'reviews_rating'] = np.nan
+    
+    user_names, product_names, rating_matrix = build_rating_matrix(rating_frame)
+    pivot_table = rating_frame.pivot_table(index='reviews_username', columns='name', values='reviews_rating')
+    
+    assert user_names.tolist() == pivot_table.index.tolist()
+    assert product_names.tolist() == pivot_table.columns.tolist()
+    np.testing.assert_allclose(
+        rating_matrix.toarray(), np.nan_to_num(pivot_table.to_numpy(), nan=0.0), rtol=1e-6
+    )
@@ -0,0 +1,55 @@
+import numpy as np
+from user_directory import UserDirectory
+
+USERNAMES = np.array(sorted([
+    'alice', 'Alicia', 'bob', 'bobby', 'carol', 'joe_smith', 'joesmith99', 'malice', 'zed'
+]))
+
+def collect_pages(user_directory, query, limit):
+    pages = []
+    cursor = 0
+    while cursor is not None:
+        page, cursor = user_directory.search(query, limit, cursor)
+        pages.append(page)
+    return pages
+
+def test_search_matches_substrings_case_insensitively_in_sorted_order():
+    user_directory = UserDirectory(USERNAMES)
+    
+    assert user_directory.search('ALI')[0] == ['Alicia', 'alice', 'malice']
+    assert user_directory.search('smith')[0] == ['joe_smith', 'joesmith99']
+    assert user_directory.search('o')[0] == [name for name in USERNAMES.tolist() if 'o' in name.lower()]
+    assert user_directory.search('xyz') == ([], None)
+
+def test_cursor_pages_cover_every_match_once():
+    user_directory = UserDirectory(USERNAMES)
+    
+    for query in (None, 'o', 'bob', 'alic'):
+        expected = user_directory.search(query)[0]
+        pages = collect_pages(user_directory, query, 2)
+        assert [name for page in pages for name in page] == expected
+        assert all(len(page) <= 2 for page in pages)
+
+def test_last_page_has_no_next_cursor():
+    user_directory = UserDirectory(USERNAMES)
+    
+    page, next_cursor = user_directory.search('bob', limit=2)
+    assert page == ['bob', 'bobby']
+    assert next_cursor is None
+    
+    page, next_cursor = user_directory.search(None, limit=len(USERNAMES))
+    assert len(page) == len(USERNAMES)
+    assert next_cursor is None
+
+def test_long_queries_are_checked_against_the_full_name():
+    # 'joesmith' shares every 3-gram with 'joe_smith' except the ones across the underscore
+    user_directory = UserDirectory(np.array(['joe_smith', 'joesmith99', 'smithjoe']))
+    assert user_directory.search('joesmith')[0] == ['joesmith99']
+
+def test_build_index_is_idempotent():
+    user_directory = UserDirectory(USERNAMES)
+    user_directory.build_index()
+    gram_postings = user_directory.gram_postings
+    user_directory.build_index()
+    assert user_directory.gram_postings is gram_postings
+    assert user_directory.gram_postings['bob'].tolist() == [2, 3]
@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import pickle
+import argparse
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from artifacts import file_checksum
+
+# The notebook's preprocess_text steps, compiled once
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+WEB_LINK_PATTERN = re.compile(r'(https?://\S+|www\.\S+)')
+NON_LETTER_PATTERN = re.compile(r'[^a-z\s]')
+
+DEFAULT_CHUNK_TEXTS = 5000
+MAX_LEMMA_CACHE = 200000
+PREPROCESS_WORKERS = int(os.environ.get('RECOMMENDER_PREPROCESS_WORKERS', '0'))
+REVIEW_FEATURES_FILE = 'review_features.npz'
+REVIEW_FEATURES_MANIFEST = 'review_features.json'
+# NLTK data the default cleaner needs: python -m nltk.downloader stopwords wordnet
+NLTK_CORPORA = {'stopwords': 'corpora/stopwords', 'wordnet': 'corpora/wordnet'}
+
+class TextCleanerUnavailable(RuntimeError):
+    pass
+
+def text_cleaner_problem():
+    # None when the default cleaner can run, otherwise what is missing
+    try:
+        import nltk
+    except ImportError:
+        return 'nltk is not installed; pip install nltk'
+    
+    missing_corpora = []
+    for corpus_name, corpus_path in NLTK_CORPORA.items():
+        try:
+            nltk.data.find(corpus_path)
+        except LookupError:
+            # WordNet may be installed as a zip only
+            try:
+                nltk.data.find(f"{corpus_path}.zip")
+            except LookupError:
+                missing_corpora.append(corpus_name)
+    if missing_corpora:
+        return (
+            f"NLTK data missing: {', '.join(missing_corpora)}; "
+            f"run python -m nltk.downloader {' '.join(missing_corpora)}"
+        )
+    return None
+
+class ReviewTextCleaner:
+    def __init__(self, stop_words=None, lemmatize=None):
+        # Defaults are the notebook's NLTK English stopwords and WordNet lemmatizer
+        if stop_words is None or lemmatize is None:
+            cleaner_problem = text_cleaner_problem()
+            if cleaner_problem:
+                raise TextCleanerUnavailable(cleaner_problem)
+        if stop_words is None:
+            from nltk.corpus import stopwords
+            stop_words = stopwords.words('english')
+        if lemmatize is None:
+            from nltk.stem import WordNetLemmatizer
+            lemmatize = WordNetLemmatizer().lemmatize
+        self.stop_words = frozenset(stop_words)
+        self._lemmatize = lemmatize
+        # Review vocabularies repeat heavily, so each distinct token is lemmatized once
+        self._lemma_cache = {}
+    
+    def lemma(self, token):
+        token_lemma = self._lemma_cache.get(token)
+        if token_lemma is None:
+            token_lemma = self._lemmatize(token)
+            if len(self._lemma_cache) < MAX_LEMMA_CACHE:
+                self._lemma_cache[token] = token_lemma
+        return token_lemma
+    
+    def clean(self, text):
+        text = str(text).lower()
+        text = HTML_TAG_PATTERN.sub('', text)
+        text = WEB_LINK_PATTERN.sub('', text)
+        text = NON_LETTER_PATTERN.sub(' ', text)
+        return ' '.join(
+            self.lemma(token) for token in text.split() if token not in self.stop_words
+        )
+    
+    def clean_texts(self, texts):
+        return [self.clean(text) for text in texts]
+
+def review_texts(review_frame):
+    # combined_reviews as the notebook builds it: title and text joined
+    if 'combined_reviews' in review_frame:
+        return review_frame['combined_reviews'].fillna('').astype(str)
+    return (
+        review_frame.get('reviews_title', pd.Series('', index=review_frame.index)).fillna('').astype(str)
+        + ' '
+        + review_frame.get('reviews_text', pd.Series('', index=review_frame.index)).fillna('').astype(str)
+    ).str.strip()
+
+def cleaned_review_texts(review_frame, text_cleaner=None):
+    # reviews_cleaned where the dataset has it; other rows are cleaned here.
+    # Reviews that cleaned to nothing read back from CSV as NaN and simply clean to '' again
+    combined_texts = review_texts(review_frame)
+    if 'reviews_cleaned' in review_frame:
+        cleaned_texts = review_frame['reviews_cleaned'].astype(object).to_numpy(copy=True)
+    else:
+        cleaned_texts = np.full(len(review_frame), None, dtype=object)
+    
+    missing_rows = np.flatnonzero(pd.isna(cleaned_texts))
+    if len(missing_rows):
+        text_cleaner = text_cleaner or ReviewTextCleaner()
+        cleaned_texts[missing_rows] = text_cleaner.clean_texts(combined_texts.iloc[missing_rows].tolist())
+    return [str(text) for text in cleaned_texts]
+
+preprocess_cleaner = None
+preprocess_vectorizer = None
+
+def _initialize_preprocess_worker(text_cleaner, text_vectorizer):
+    global preprocess_cleaner, preprocess_vectorizer
+    preprocess_cleaner = text_cleaner
+    preprocess_vectorizer = text_vectorizer
+
+def _preprocess_chunk(texts):
+    cleaned_texts = preprocess_cleaner.clean_texts(texts)
+    text_features = preprocess_vectorizer.transform(cleaned_texts) if preprocess_vectorizer is not None else None
+    return cleaned_texts, text_features
+
+def iter_preprocessed_chunks(text_chunks, text_cleaner=None, text_vectorizer=None, workers=None):
+    # Yields (cleaned texts, TF-IDF rows or None) per chunk, in input order. Chunks are read
+    # lazily and at most two per worker are in flight, so memory stays flat for any corpus size
+    workers = PREPROCESS_WORKERS if workers is None else workers
+    text_cleaner = text_cleaner or ReviewTextCleaner()
+    if workers <= 1:
+        _initialize_preprocess_worker(text_cleaner, text_vectorizer)
+        for texts in text_chunks:
+            yield _preprocess_chunk(texts)
+        return
+    
+    # Tokenizing and lemmatizing hold the GIL, so the pool uses processes
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=_initialize_preprocess_worker,
+        initargs=(text_cleaner, text_vectorizer)
+    ) as worker_pool:
+        pending_chunks = deque()
+        for texts in text_chunks:
+            pending_chunks.append(worker_pool.submit(_preprocess_chunk, texts))
+            if len(pending_chunks) >= 2 * workers:
+                yield pending_chunks.popleft().result()
+        while pending_chunks:
+            yield pending_chunks.popleft().result()
+
+def preprocess_reviews(reviews_path, vectorizer_path, output_dir, workers=None,
+                       chunk_texts=DEFAULT_CHUNK_TEXTS, text_cleaner=None):
+    # Streams the dataset in chunks, rewriting reviews_cleaned and persisting its TF-IDF rows
+    with open(vectorizer_path, 'rb') as file:
+        text_vectorizer = pickle.load(file)
+    os.makedirs(output_dir, exist_ok=True)
+    dataset_path = os.path.join(output_dir, 'cleaned_reviews_dataset.csv')
+    
+    review_chunks = []
+    
+    def text_chunks():
+        for review_chunk in pd.read_csv(reviews_path, chunksize=chunk_texts):
+            review_chunks.append(review_chunk)
+            yield review_texts(review_chunk).tolist()
+    
+    # Written beside the target and renamed, so the input may be the file being replaced
+    file_descriptor, staging_path = tempfile.mkstemp(prefix='.cleaned-', suffix='.csv', dir=output_dir)
+    feature_blocks = []
+    try:
+        with os.fdopen(file_descriptor, 'w', newline='', encoding='utf-8') as file:
+            for chunk_number, (cleaned_texts, text_features) in enumerate(iter_preprocessed_chunks(
+                text_chunks(), text_cleaner, text_vectorizer, workers
+            )):
+                review_chunk = review_chunks.pop(0)
+                review_chunk['combined_reviews'] = review_texts(review_chunk)
+                review_chunk['reviews_cleaned'] = cleaned_texts
+                review_chunk.to_csv(file, header=chunk_number == 0, index=False)
+                feature_blocks.append(text_features.tocsr())
+        os.replace(staging_path, dataset_path)
+    except Exception:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+    
+    review_features = sparse.vstack(feature_blocks, format='csr') if feature_blocks else sparse.csr_matrix(
+        (0, len(text_vectorizer.vocabulary_))
+    )
+    sparse.save_npz(os.path.join(output_dir, REVIEW_FEATURES_FILE), review_features)
+    # Serving only trusts the matrix while both of these files are unchanged
+    with open(os.path.join(output_dir, REVIEW_FEATURES_MANIFEST), 'w') as file:
+        json.dump({
+            'rows': review_features.shape[0],
+            'dataset_sha256': file_checksum(dataset_path),
+            'vectorizer_sha256': file_checksum(vectorizer_path)
+        }, file, indent=2)
+    return review_features.shape
+
+def load_review_features(artifact_dir, review_count):
+    # The persisted TF-IDF rows for cleaned_reviews_dataset.csv, or None when absent or stale
+    manifest_path = os.path.join(artifact_dir, REVIEW_FEATURES_MANIFEST)
+    features_path = os.path.join(artifact_dir, REVIEW_FEATURES_FILE)
+    if not (os.path.isfile(manifest_path) and os.path.isfile(features_path)):
+        return None
+    
+    with open(manifest_path) as file:
+        features_manifest = json.load(file)
+    if (
+        features_manifest.get('rows') != review_count
+        or features_manifest.get('dataset_sha256') != file_checksum(
+            os.path.join(artifact_dir, 'cleaned_reviews_dataset.csv')
+        )
+        or features_manifest.get('vectorizer_sha256') != file_checksum(
+            os.path.join(artifact_dir, 'tfidf_vectorizer.pkl')
+        )
+    ):
+        return None
+    return sparse.load_npz(features_path).tocsr()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Clean review texts and persist their TF-IDF features for serving'
+    )
+    parser.add_argument('--reviews', default='cleaned_reviews_dataset.csv')
+    parser.add_argument('--vectorizer', default='tfidf_vectorizer.pkl')
+    parser.add_argument('--output', default='.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-texts', type=int, default=DEFAULT_CHUNK_TEXTS)
+    arguments = parser.parse_args()
+    
+    feature_shape = preprocess_reviews(
+        arguments.reviews,
+        arguments.vectorizer,
+        arguments.output,
+        arguments.workers,
+        arguments.chunk_texts
+    )
+    print(f"Wrote {feature_shape[0]} cleaned reviews with {feature_shape[1]} TF-IDF features to {arguments.output}")
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import resource
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from candidates import (
+    DEFAULT_NEIGHBOUR_COUNT, DEFAULT_FACTOR_COUNT, SIMILARITY_BLOCK_CELLS, FactorModel, ItemNeighbourModel,
+    as_fixed_width
+)
+from text_preprocessing import preprocess_reviews
+
+RATING_COLUMNS = ['reviews_username', 'name', 'reviews_rating']
+TEST_SHARE = 0.2
+SPLIT_SEED = 42
+TEST_RATINGS_FILE = 'test_ratings.csv'
+OUTPUT_FORMATS = ('neighbours', 'factors', 'notebook')
+
+# Wall time and peak traced allocation per stage; numpy and scipy buffers are traced too
+class StageReport:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = []
+    
+    @contextmanager
+    def stage(self, stage_name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage_seconds = time.perf_counter() - started_at
+            peak_bytes = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            self.stages.append({
+                'stage': stage_name,
+                'seconds': stage_seconds,
+                'peak_mb': peak_bytes / (1 << 20) if peak_bytes is not None else None
+            })
+            peak_text = f"{peak_bytes / (1 << 20):10.1f} MB" if peak_bytes is not None else ''
+            print(f"{stage_name:<28}{stage_seconds:9.2f} s{peak_text}", file=sys.stderr)
+    
+    def summary(self):
+        return {
+            'stages': self.stages,
+            'total_seconds': sum(stage['seconds'] for stage in self.stages),
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        }
+
+def read_ratings(reviews_path):
+    rating_frame = pd.read_csv(reviews_path, usecols=RATING_COLUMNS)
+    return rating_frame.dropna(subset=['reviews_username']).reset_index(drop=True)
+
+def split_ratings(rating_frame, test_share=TEST_SHARE, seed=SPLIT_SEED):
+    # Same rows as the notebook's train_test_split_cf. Each user's records go through
+    # train_test_split(test_size=0.2, random_state=42), whose shuffle depends only on the
+    # record count, so one permutation per distinct count covers every user at once.
+    # Users with a single record stay in train
+    user_codes = pd.factorize(rating_frame['reviews_username'])[0]
+    group_sizes = np.bincount(user_codes)
+    record_sizes = group_sizes[user_codes]
+    
+    # Position of each record within its user's records, in file order
+    record_order = np.argsort(user_codes, kind='stable')
+    group_starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+    record_positions = np.empty(len(rating_frame), dtype=np.int64)
+    record_positions[record_order] = np.arange(len(rating_frame)) - np.repeat(group_starts, group_sizes)
+    
+    is_test = np.zeros(len(rating_frame), dtype=bool)
+    size_order = np.argsort(record_sizes, kind='stable')
+    sorted_sizes = record_sizes[size_order]
+    distinct_sizes, size_starts = np.unique(sorted_sizes, return_index=True)
+    size_stops = np.append(size_starts[1:], len(sorted_sizes))
+    
+    for record_count, size_start, size_stop in zip(distinct_sizes, size_starts, size_stops):
+        if record_count < 2:
+            continue
+        test_count = int(np.ceil(test_share * record_count))
+        test_positions = np.zeros(record_count, dtype=bool)
+        test_positions[np.random.RandomState(seed).permutation(record_count)[:test_count]] = True
+        
+        sized_records = size_order[size_start:size_stop]
+        is_test[sized_records] = test_positions[record_positions[sized_records]]
+    
+    return rating_frame[~is_test], rating_frame[is_test]
+
+def build_rating_matrix(rating_frame):
+    # Sparse equivalent of the notebook's pivot_table: users and products sorted by name,
+    # repeated ratings of a product by one user averaged
+    rated = rating_frame.dropna(subset=['reviews_rating'])
+    user_names = as_fixed_width(np.unique(rated['reviews_username'].astype(str).to_numpy()))
+    product_names = as_fixed_width(np.unique(rated['name'].astype(str).to_numpy()))
+    
+    user_rows = np.searchsorted(user_names, rated['reviews_username'].astype(str).to_numpy())
+    product_columns = np.searchsorted(product_names, rated['name'].astype(str).to_numpy())
+    cell_keys = user_rows.astype(np.int64) * len(product_names) + product_columns
+    unique_keys, cell_inverse = np.unique(cell_keys, return_inverse=True)
+    
+    rating_sums = np.bincount(cell_inverse, weights=rated['reviews_rating'].to_numpy(dtype=np.float64))
+    rating_counts = np.bincount(cell_inverse)
+    cell_rows = unique_keys // max(len(product_names), 1)
+    
+    rating_matrix = sparse.csr_matrix(
+        (
+            (rating_sums / rating_counts).astype(np.float32),
+            (unique_keys % max(len(product_names), 1)).astype(np.int32),
+            np.concatenate(([0], np.cumsum(np.bincount(cell_rows, minlength=len(user_names))))).astype(np.int64)
+        ),
+        shape=(len(user_names), len(product_names))
+    )
+    return user_names, product_names, rating_matrix
+
+def _block_rows(column_count):
+    return max(1, SIMILARITY_BLOCK_CELLS // max(column_count, 1))
+
+def _named_frame(values, row_names, column_names):
+    return pd.DataFrame(
+        values,
+        index=pd.Index(row_names, name='reviews_username'),
+        columns=pd.Index(column_names, name='name')
+    )
+
+def write_rating_table(table_path, user_names, product_names, rating_matrix):
+    # Same layout as the notebook's pivot_table(...).to_csv(), a block of users at a time
+    block_rows = _block_rows(len(product_names))
+    with open(table_path, 'w', newline='') as file:
+        for block_start in range(0, max(len(user_names), 1), block_rows):
+            rating_block = rating_matrix[block_start:block_start + block_rows]
+            block_values = np.full(rating_block.shape, np.nan)
+            block_values[
+                np.repeat(np.arange(rating_block.shape[0]), np.diff(rating_block.indptr)),
+                rating_block.indices
+            ] = rating_block.data
+            _named_frame(
+                block_values, user_names[block_start:block_start + block_rows], product_names
+            ).to_csv(file, header=block_start == 0)
+
+def item_based_predictions(neighbour_model):
+    # The notebook's train_table.fillna(0).dot(S) / |S|.sum(): with every neighbour kept,
+    # the neighbour model's sparse product is the dense item-item prediction
+    rating_matrix = neighbour_model.rating_matrix
+    predictions = np.empty(rating_matrix.shape, dtype=np.float64)
+    block_rows = _block_rows(rating_matrix.shape[1])
+    for block_start in range(0, rating_matrix.shape[0], block_rows):
+        block_scores = (rating_matrix[block_start:block_start + block_rows] @ neighbour_model.neighbour_matrix).toarray()
+        predictions[block_start:block_start + block_rows] = block_scores * neighbour_model.inverse_totals
+    return _named_frame(predictions, neighbour_model.user_names, neighbour_model.product_names)
+
+def user_based_predictions(user_names, product_names, rating_matrix):
+    # The notebook's user-user cosine prediction, one block of similarity rows at a time
+    user_norms = np.sqrt(np.asarray(rating_matrix.multiply(rating_matrix).sum(axis=1), dtype=np.float64)).ravel()
+    user_norms[user_norms == 0] = 1.0
+    normalized_users = sparse.csr_matrix(rating_matrix.multiply(1.0 / user_norms[:, None]), dtype=np.float64)
+    normalized_users_t = normalized_users.T.tocsr()
+    
+    predictions = np.empty(rating_matrix.shape, dtype=np.float64)
+    block_rows = _block_rows(max(len(user_names), len(product_names)))
+    for block_start in range(0, len(user_names), block_rows):
+        similarity_block = normalized_users[block_start:block_start + block_rows] @ normalized_users_t
+        similarity_totals = np.asarray(abs(similarity_block).sum(axis=1)).ravel()
+        block_scores = (similarity_block @ rating_matrix).toarray()
+        predictions[block_start:block_start + block_rows] = np.divide(
+            block_scores, similarity_totals[:, None],
+            out=np.zeros_like(block_scores), where=similarity_totals[:, None] > 0
+        )
+    return _named_frame(predictions, user_names, product_names)
+
+def _dump_pickle(output_dir, file_name, value):
+    with open(os.path.join(output_dir, file_name), 'wb') as file:
+        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def train(reviews_path, output_dir, output_formats=('neighbours',),
+          neighbour_count=DEFAULT_NEIGHBOUR_COUNT, trace_memory=True,
+          vectorizer_path=None, preprocess_workers=None, factor_count=DEFAULT_FACTOR_COUNT):
+    report = StageReport(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    os.makedirs(output_dir, exist_ok=True)
+    
+    try:
+        if vectorizer_path:
+            # Cleaned text and its TF-IDF rows, so serving never re-tokenizes the corpus
+            with report.stage('review_text'):
+                preprocess_reviews(reviews_path, vectorizer_path, output_dir, preprocess_workers)
+                reviews_path = os.path.join(output_dir, 'cleaned_reviews_dataset.csv')
+        
+        with report.stage('read_ratings'):
+            rating_frame = read_ratings(reviews_path)
+        
+        with report.stage('split_ratings'):
+            train_ratings, test_ratings = split_ratings(rating_frame)
+            test_ratings.to_csv(os.path.join(output_dir, TEST_RATINGS_FILE), index=False)
+        
+        with report.stage('rating_matrix'):
+            user_names, product_names, rating_matrix = build_rating_matrix(train_ratings)
+        
+        if 'neighbours' in output_formats:
+            # Arrays the engine's item_neighbours mode loads directly, in place of train_table.csv
+            with report.stage('item_neighbours'):
+                neighbour_model = ItemNeighbourModel.from_rating_matrix(
+                    user_names, product_names, rating_matrix, neighbour_count
+                )
+                neighbour_model.save(output_dir)
+        
+        if 'factors' in output_formats:
+            # Truncated SVD factors for the engine's factors mode
+            with report.stage('factors'):
+                FactorModel.from_rating_matrix(
+                    user_names, product_names, rating_matrix, factor_count
+                ).save(output_dir)
+        
+        if 'notebook' in output_formats:
+            with report.stage('train_test_tables'):
+                write_rating_table(
+                    os.path.join(output_dir, 'train_table.csv'), user_names, product_names, rating_matrix
+                )
+                write_rating_table(
+                    os.path.join(output_dir, 'test_table.csv'), *build_rating_matrix(test_ratings)
+                )
+            
+            with report.stage('item_based_predictions'):
+                full_neighbour_model = ItemNeighbourModel.from_rating_matrix(
+                    user_names, product_names, rating_matrix, len(product_names)
+                )
+                _dump_pickle(output_dir, 'item_based_predictions.pkl', item_based_predictions(full_neighbour_model))
+                del full_neighbour_model
+            
+            with report.stage('user_based_predictions'):
+                _dump_pickle(
+                    output_dir, 'user_based_predictions.pkl',
+                    user_based_predictions(user_names, product_names, rating_matrix)
+                )
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    
+    return {
+        'ratings': len(rating_frame),
+        'train_ratings': len(train_ratings),
+        'test_ratings': len(test_ratings),
+        'users': len(user_names),
+        'products': len(product_names),
+        **report.summary()
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build the collaborative filtering artifacts from cleaned_reviews_dataset.csv'
+    )
+    parser.add_argument('--reviews', default='cleaned_reviews_dataset.csv')
+    parser.add_argument('--output', default='.')
+    parser.add_argument('--format', nargs='+', choices=OUTPUT_FORMATS, default=['neighbours'])
+    parser.add_argument('--neighbours', type=int, default=DEFAULT_NEIGHBOUR_COUNT)
+    parser.add_argument('--factors', type=int, default=DEFAULT_FACTOR_COUNT)
+    parser.add_argument('--text-features', metavar='VECTORIZER', default=None,
+                        help='Also clean the review texts and persist their features with this TF-IDF vectorizer')
+    parser.add_argument('--workers', type=int, default=None, help='Processes for text cleaning')
+    parser.add_argument('--no-trace-memory', action='store_true')
+    parser.add_argument('--report', default=None, help='Write the stage timings as JSON to this file')
+    arguments = parser.parse_args()
+    
+    training_summary = train(
+        arguments.reviews,
+        arguments.output,
+        arguments.format,
+        arguments.neighbours,
+        not arguments.no_trace_memory,
+        arguments.text_features,
+        arguments.workers,
+        arguments.factors
+    )
+    print(json.dumps(training_summary, indent=2))
+    if arguments.report:
+        with open(arguments.report, 'w') as file:
+            json.dump(training_summary, file, indent=2)
@@ -0,0 +1,91 @@
+import threading
+import numpy as np
+
+MAX_GRAM_LENGTH = 3
+
+# Sorted username list with n-gram postings for case-insensitive type-ahead search
+class UserDirectory:
+    def __init__(self, usernames):
+        # usernames must already be sorted; positions double as pagination cursors
+        self.usernames = usernames
+        self.lowercase_names = None
+        self.gram_postings = None
+        self._build_lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.usernames)
+    
+    def build_index(self):
+        # Servers call this before forking workers (app.load_engine) so the postings are
+        # built once; otherwise the first search builds them
+        if self.gram_postings is not None:
+            return
+        with self._build_lock:
+            if self.gram_postings is not None:
+                return
+            
+            lowercase_names = [name.lower() for name in self.usernames.tolist()]
+            gram_positions = {}
+            for position, name in enumerate(lowercase_names):
+                name_grams = set()
+                for gram_length in range(1, MAX_GRAM_LENGTH + 1):
+                    for start in range(len(name) - gram_length + 1):
+                        name_grams.add(name[start:start + gram_length])
+                for gram in name_grams:
+                    gram_positions.setdefault(gram, []).append(position)
+            
+            self.lowercase_names = lowercase_names
+            self.gram_postings = {
+                gram: np.asarray(positions, dtype=np.int32)
+                for gram, positions in gram_positions.items()
+            }
+    
+    def _candidate_positions(self, normalized_query):
+        gram_length = min(len(normalized_query), MAX_GRAM_LENGTH)
+        query_grams = {
+            normalized_query[start:start + gram_length]
+            for start in range(len(normalized_query) - gram_length + 1)
+        }
+        
+        postings = []
+        for gram in query_grams:
+            gram_positions = self.gram_postings.get(gram)
+            if gram_positions is None:
+                return np.empty(0, dtype=np.int32)
+            postings.append(gram_positions)
+        
+        # Intersect the rarest grams first to keep intermediate arrays small
+        postings.sort(key=len)
+        candidates = postings[0]
+        for gram_positions in postings[1:]:
+            candidates = np.intersect1d(candidates, gram_positions, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+    
+    def search(self, query=None, limit=None, cursor=0):
+        # Returns matching usernames in sorted order and the cursor for the next page
+        normalized_query = (query or '').lower()
+        
+        if not normalized_query:
+            stop = len(self.usernames) if limit is None else min(cursor + limit, len(self.usernames))
+            next_cursor = stop if stop < len(self.usernames) else None
+            return self.usernames[cursor:stop].tolist(), next_cursor
+        
+        self.build_index()
+        candidates = self._candidate_positions(normalized_query)
+        candidates = candidates[np.searchsorted(candidates, cursor):]
+        
+        # Short queries match exactly through their postings; longer ones need a check
+        needs_check = len(normalized_query) > MAX_GRAM_LENGTH
+        matches = []
+        next_cursor = None
+        for position in candidates.tolist():
+            if needs_check and normalized_query not in self.lowercase_names[position]:
+                continue
+            if limit is not None and len(matches) == limit:
+                next_cursor = position
+                break
+            matches.append(position)
+        
+        return [str(self.usernames[position]) for position in matches], next_cursor
@@ -0,0 +1,7 @@
+from app import web_app, load_engine
+
+# Under gunicorn with preload_app the master imports this module once, so the engine
+# is loaded before the workers fork and its memory is shared copy-on-write
+load_engine()
+
+application = web_app